@@ -4,15 +4,20 @@ from config import load_config
 # Load all configuration from AWS at startup
 load_config()
 
-from fastapi import FastAPI, APIRouter
+from utils.tracing import instrument_boto3, start_span
+instrument_boto3() # Before the routers below create their AWS clients
+
+from fastapi import FastAPI, APIRouter, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
 import uvicorn
 
-from routers import filters, media, process, auth, pexels
-from routers.process import apply_filter_to_media
-from routers.process import apply_filter_to_media
+from routers import filters, media, process, auth, pexels, jobs
+from routers.process import apply_filter_to_media, apply_filter_to_media_bulk, request_preview
+from models.schemas import BulkProcessResponse, PreviewResponse
+from utils.cognito_auth import cognito_authenticator
+from utils.profiling import SamplingProfiler, should_profile, PROFILE_HEADER
 
 # --- App Initialization --- #
 app = FastAPI(
@@ -31,6 +36,41 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Records a span per request; DynamoDB, S3 and SQS calls made while handling it become its children."""
+    with start_span(f"{request.method} {request.url.path}", request.headers.get("traceparent"),
+                    **{"http.method": request.method, "http.path": request.url.path}) as span:
+        response = await call_next(request)
+        span.set(**{"http.status_code": response.status_code})
+        return response
+
+def _is_admin_profile_request(request: Request) -> bool:
+    """X-Profile: 1 is honoured for admins only. The route still authenticates the request as usual."""
+    authorization = request.headers.get("authorization", "")
+    if request.headers.get(PROFILE_HEADER) != "1" or not authorization.lower().startswith("bearer "):
+        return False
+    try:
+        claims = cognito_authenticator.verify_token(authorization.split(" ", 1)[1])
+    except HTTPException:
+        return False
+    return "admins" in claims.get("cognito:groups", [])
+
+@app.middleware("http")
+async def profile_requests(request: Request, call_next):
+    """Profiles sampled requests and those an admin asked for; see utils/profiling.py."""
+    requested = _is_admin_profile_request(request)
+    if not should_profile(requested):
+        return await call_next(request)
+    # Jobs submitted by an explicitly profiled request are profiled by the worker too
+    request.state.profile_requested = requested
+    with SamplingProfiler(f"{request.method} {request.url.path}") as profiler:
+        response = await call_next(request)
+        route = request.scope.get("route")
+        if route is not None:
+            profiler.tag = f"{request.method} {route.path}" # Group profiles by route, not by IDs in the path
+    return response
+
 
 
 # --- API Routers --- #
@@ -41,6 +81,7 @@ api_v1_router.include_router(auth.router)
 api_v1_router.include_router(media.router)
 api_v1_router.include_router(filters.router)
 api_v1_router.include_router(pexels.router)
+api_v1_router.include_router(jobs.router)
 
 
 # Manually add the process route to bypass the router object
@@ -50,6 +91,20 @@ api_v1_router.add_api_route(
     methods=["POST"], 
     tags=["Processing"]
 )
+api_v1_router.add_api_route(
+    "/process/bulk",
+    apply_filter_to_media_bulk,
+    methods=["POST"],
+    response_model=BulkProcessResponse,
+    tags=["Processing"]
+)
+api_v1_router.add_api_route(
+    "/process/preview",
+    request_preview,
+    methods=["POST"],
+    response_model=PreviewResponse,
+    tags=["Processing"]
+)
 
 
 app.include_router(api_v1_router) 
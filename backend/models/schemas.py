@@ -2,7 +2,7 @@
 from pydantic import BaseModel, Field
 from uuid import UUID, uuid4
 from datetime import datetime
-from typing import Optional, Dict
+from typing import Optional, Dict, List, Literal
 
 class User(BaseModel):
     id: UUID = Field(default_factory=uuid4)
@@ -15,12 +15,23 @@ class Token(BaseModel):
     access_token: str
     token_type: str
 
+class MediaInfo(BaseModel):
+    # Probed with ffprobe; duration and frame_rate are only set for videos
+    duration: Optional[float] = None
+    width: int
+    height: int
+    frame_rate: Optional[float] = None
+    codec: Optional[str] = None
+    pixel_count: int
+    estimated_cost: float # pixel-seconds
+
 class MediaItemBase(BaseModel):
     owner_id: UUID
     original_filename: str
     storage_path: str
     media_type: str
     upload_timestamp: datetime = Field(default_factory=datetime.utcnow)
+    media_info: Optional[MediaInfo] = None
 
 class MediaItemInDB(MediaItemBase):
     id: UUID = Field(default_factory=uuid4)
@@ -32,14 +43,91 @@ class FilterItemBase(BaseModel):
     storage_path: str
     filter_type: str = "default"
     owner_id: Optional[UUID] = None
+    content_hash: Optional[str] = None # SHA-256 of the .cube file, lets workers verify cached copies
+    grid_size: Optional[int] = None # LUT_3D_SIZE, validated at upload
+    compiled_path: Optional[str] = None # S3 key of the pre-compiled binary sidecar
+    lut_class: Optional[str] = None # "identity", "separable" or "3d", analyzed at upload
 
 class FilterItemInDB(FilterItemBase):
     id: UUID = Field(default_factory=uuid4)
 
+OutputFormat = Literal["original", "jpeg", "png", "webp", "avif", "auto"]
+VideoOutput = Literal["mp4", "hls"]
+# "low" submissions are turned away first when the processing queue is backed up
+Priority = Literal["normal", "low"]
+
 class ProcessRequest(BaseModel):
     media_id: UUID
     filter_id: UUID
+    # Further looks stacked after filter_id, in order; the worker folds them into one LUT
+    filter_chain: List[UUID] = Field(default_factory=list, max_length=4)
+    # Strength of the (combined) look: 0 leaves the media unchanged, 1 applies it fully
+    intensity: float = Field(1.0, ge=0.0, le=1.0)
+    # Images only: "original" keeps the upload's format, "auto" picks the smallest format the client accepts
+    output_format: OutputFormat = "original"
+    # 1-100, higher is better; each format's default is used when omitted (ignored for PNG)
+    output_quality: Optional[int] = Field(None, ge=1, le=100)
+    # Videos only: "hls" streams fragmented-MP4 HLS renditions to S3 while encoding, so playback can start early
+    video_output: VideoOutput = "mp4"
+    priority: Priority = "normal"
 
 class ProcessResponse(BaseModel):
     message: str
-    task_id: str # Changed to task_id
+    task_id: str # The job's ID: follow it with GET /jobs/{task_id} or /jobs/{task_id}/events
+    estimated_seconds: Optional[float] = None # Processing time once a worker starts the job
+    estimated_wait_seconds: Optional[float] = None # Time queued behind the current backlog
+    estimated_completion_at: Optional[datetime] = None
+
+
+class PreviewRequest(BaseModel):
+    media_id: UUID
+    filter_id: UUID
+    # "frames": a strip of frames sampled evenly across the video; "window": a short clip from `start`.
+    # Images always get a reduced-size graded still.
+    mode: Literal["frames", "window"] = "frames"
+    start: float = Field(0.0, ge=0.0)
+
+class PreviewResponse(BaseModel):
+    # "pending" until the worker has rendered it; poll the same request until it is "ready"
+    status: Literal["ready", "pending"]
+    url: Optional[str] = None
+    task_id: Optional[str] = None # The render's job ID while pending: follow it with GET /jobs/{task_id}
+
+
+class BulkProcessRequest(BaseModel):
+    # Every media item is processed with every filter (media_ids x filter_ids)
+    media_ids: List[UUID] = Field(..., min_length=1)
+    filter_ids: List[UUID] = Field(..., min_length=1)
+    output_format: OutputFormat = "original"
+    output_quality: Optional[int] = Field(None, ge=1, le=100)
+    video_output: VideoOutput = "mp4"
+
+class BulkProcessItemResult(BaseModel):
+    media_id: UUID
+    filter_id: UUID
+    task_id: Optional[str] = None
+    error: Optional[str] = None
+
+class BulkProcessResponse(BaseModel):
+    message: str
+    submitted: int
+    failed: int
+    results: List[BulkProcessItemResult]
+
+
+JobStatus = Literal["queued", "downloading", "encoding", "uploading", "completed", "retrying", "failed"]
+
+class JobItemInDB(BaseModel):
+    id: UUID
+    owner_id: UUID
+    media_id: UUID
+    filter_id: UUID
+    # Moved through its stages by the worker; "retrying" means SQS will offer the job again,
+    # "failed" that it was dead-lettered (see `error`)
+    status: JobStatus = "queued"
+    progress: int = 0 # Percent of the encode done
+    output_media_id: Optional[UUID] = None # The processed media item, once completed
+    error: Optional[str] = None # Why the last attempt failed
+    attempts: int = 0 # Processing attempts the worker has started
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -1,5 +1,6 @@
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, status, Query
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, status, Query, Request
 from typing import Dict, Any, List
+import io
 import uuid
 from pathlib import Path
 
@@ -8,7 +9,9 @@ from routers.auth import get_current_user
 # Import the new DynamoDB-based functions
 from utils.database import add_filter_item, get_filters_for_user, get_filter_by_id
 from utils.s3_client import upload_file_to_s3
-from utils.cache_client import get_from_cache, set_to_cache
+from utils.cache_client import get_from_cache, set_to_cache, delete_from_cache
+from utils.listing import lean_items, listing_response, not_modified, invalidate_listing
+from utils.lut_utils import parse_cube_stream, compile_lut, classify_lut, LutValidationError, COMPILED_LUT_SUFFIX
 
 # --- Router --- #
 router = APIRouter(
@@ -17,15 +20,25 @@ router = APIRouter(
     dependencies=[Depends(get_current_user)]
 )
 
+# Name of the filter listing's ETags (see utils/listing.py)
+FILTERS_LISTING = "filters"
+
 @router.post("/upload", response_model=FilterItemInDB, status_code=status.HTTP_201_CREATED)
 async def upload_filter(user_claims: Dict = Depends(get_current_user), file: UploadFile = File(...)):
     """
     Handles the upload of a custom filter file (e.g., a .cube LUT file) to S3.
-    Saves the file to the appropriate S3 path and its metadata to DynamoDB.
+    The LUT is validated while it is streamed, so malformed files are rejected here instead of
+    failing inside a worker. Saves the file, a compiled binary sidecar and its metadata.
     """
     if not file.filename.endswith('.cube'):
         raise HTTPException(status_code=400, detail="Invalid file type. Only .cube files are accepted.")
 
+    try:
+        parsed_lut = parse_cube_stream(file.file)
+    except LutValidationError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid LUT file: {e}")
+    file.file.seek(0)
+
     user_id = user_claims.get("sub")
     user_groups = user_claims.get("cognito:groups", [])
     print(user_groups)
@@ -39,33 +52,48 @@ async def upload_filter(user_claims: Dict = Depends(get_current_user), file: Upl
         filter_type = "custom"
         owner_id = user_id
 
-    # Upload file to S3
+    # Upload file and its compiled sidecar to S3
     upload_file_to_s3(file.file, object_key, file.content_type)
+    compiled_key = f"{object_key}{COMPILED_LUT_SUFFIX}"
+    upload_file_to_s3(io.BytesIO(compile_lut(parsed_lut)), compiled_key, "application/octet-stream")
 
     # Create metadata record for the filter
     filter_item = FilterItemInDB(
         name=Path(file.filename).stem,
         storage_path=object_key,
         filter_type=filter_type,
-        owner_id=owner_id
+        owner_id=owner_id,
+        content_hash=parsed_lut.content_hash,
+        grid_size=parsed_lut.size,
+        compiled_path=compiled_key,
+        lut_class=classify_lut(parsed_lut)
     )
 
     # Add the new filter item to DynamoDB
     add_filter_item(filter_item.model_dump())
+    # The uploader sees the new filter right away; other users' listings catch up as their caches expire
+    delete_from_cache(f"filters_list_{user_id}")
+    invalidate_listing(user_id, FILTERS_LISTING)
 
     return filter_item
 
 @router.get("/", response_model=Dict[str, Any])
 async def list_available_filters(
+    request: Request,
     user_claims: Dict = Depends(get_current_user),
     page: int = Query(1, ge=1, description="Page number to retrieve"),
     limit: int = Query(10, ge=1, le=100, description="Number of items per page")
 ):
     """
     Retrieves a paginated list of filters available to the current user.
-    This endpoint uses a cache-aside strategy to reduce database load.
+    This endpoint uses a cache-aside strategy to reduce database load, and answers 304 when the
+    client's If-None-Match is still current.
     """
     user_id = user_claims.get("sub")
+    page_variant = f"{page}:{limit}"
+    unchanged = not_modified(request, user_id, FILTERS_LISTING, page_variant)
+    if unchanged is not None:
+        return unchanged
     cache_key = f"filters_list_{user_id}"
 
     # 1. Try to get the full list of filters from cache
@@ -86,12 +114,12 @@ async def list_available_filters(
     end_index = start_index + limit
     paginated_items = all_user_filters[start_index:end_index]
 
-    return {
+    return listing_response(request, user_id, FILTERS_LISTING, {
         "total_items": total_items,
-        "items": [FilterItemInDB(**item) for item in paginated_items],
+        "items": lean_items(paginated_items, FilterItemInDB),
         "page": page,
         "limit": limit
-    }
+    }, page_variant)
 
 @router.get("/{filter_id}", response_model=FilterItemInDB)
 async def get_single_filter(filter_id: uuid.UUID, user_claims: Dict = Depends(get_current_user)):
@@ -0,0 +1,72 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+from typing import Dict
+import asyncio
+import uuid
+
+from models.schemas import JobItemInDB
+from routers.auth import get_current_user
+from utils.database import get_job_by_id
+from utils.job_events import job_watcher, TERMINAL_JOB_STATUSES
+
+# --- Router --- #
+router = APIRouter(
+    prefix="/jobs",
+    tags=["Jobs"],
+    dependencies=[Depends(get_current_user)]
+)
+
+# A comment line is sent this often on an idle stream so proxies don't close it
+KEEPALIVE_SECONDS = 15
+
+
+def _get_own_job(job_id: uuid.UUID, user_id: str) -> Dict:
+    job = get_job_by_id(job_id)
+    if not job or job["owner_id"] != str(user_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found or access denied.")
+    return job
+
+
+def _job_event(job: Dict) -> str:
+    return f"event: job\ndata: {JobItemInDB(**job).model_dump_json()}\n\n"
+
+
+@router.get("/{job_id}", response_model=JobItemInDB)
+async def get_job(job_id: uuid.UUID, user_claims: Dict = Depends(get_current_user)):
+    """
+    Returns the current status and progress of a processing job (the task_id returned by /process).
+    """
+    return _get_own_job(job_id, user_claims.get("sub"))
+
+
+@router.get("/{job_id}/events")
+async def stream_job_events(job_id: uuid.UUID, request: Request, user_claims: Dict = Depends(get_current_user)):
+    """
+    Streams a job's status changes as Server-Sent Events ("job" events carrying the job),
+    starting with its current state and ending once it has completed or failed.
+    """
+    job = _get_own_job(job_id, user_claims.get("sub"))
+
+    async def events():
+        yield _job_event(job)
+        if job["status"] in TERMINAL_JOB_STATUSES:
+            return
+        queue = job_watcher.subscribe(str(job_id), job)
+        try:
+            while not await request.is_disconnected():
+                try:
+                    changed = await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield _job_event(changed)
+                if changed["status"] in TERMINAL_JOB_STATUSES:
+                    break
+        finally:
+            job_watcher.unsubscribe(str(job_id), queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
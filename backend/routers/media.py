@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, status, Response
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, status, Response, Request
 from fastapi.responses import RedirectResponse
 from typing import List, Dict
 import uuid
@@ -9,6 +9,10 @@ from routers.auth import get_current_user
 # Import the new DynamoDB-based functions
 from utils.database import add_media_item, get_user_media, get_media_by_id, delete_user_media
 from utils.s3_client import upload_file_to_s3, create_presigned_url, delete_file_from_s3
+from utils.s3_client import read_text_from_s3, delete_prefix_from_s3
+from utils.hls import HLS_MEDIA_TYPE, is_hls_media, hls_prefix, resolve_playlist_key, rewrite_playlist, PLAYLIST_SUFFIX
+from utils.media_probe import probe_media_bytes, PROBE_BYTES
+from utils.listing import lean_items, listing_response, not_modified, invalidate_listing
 
 # --- Router --- #
 router = APIRouter(
@@ -17,16 +21,25 @@ router = APIRouter(
     dependencies=[Depends(get_current_user)]
 )
 
+# Name of the media listing's ETags (see utils/listing.py)
+MEDIA_LISTING = "media"
+
 @router.post("/upload", response_model=MediaItemInDB, status_code=status.HTTP_201_CREATED)
-async def upload_media(user_claims: Dict = Depends(get_current_user), file: UploadFile = File(...)):
+def upload_media(user_claims: Dict = Depends(get_current_user), file: UploadFile = File(...)):
     """
     Handles the upload of a media file (photo or video) to S3 and saves metadata to DynamoDB.
+    A plain `def`, so FastAPI runs the blocking probe and S3 upload in its threadpool.
     """
     user_id = user_claims.get("sub")
     file_extension = Path(file.filename).suffix
     
     object_key = f"uploads/{user_id}/{uuid.uuid4()}{file_extension}"
 
+    # Probe the head of the file for duration/resolution before it is streamed to S3
+    header_bytes = file.file.read(PROBE_BYTES)
+    file.file.seek(0)
+    media_info = probe_media_bytes(header_bytes, file.content_type or "")
+
     # Upload file to S3
     upload_file_to_s3(file.file, object_key, file.content_type)
 
@@ -36,21 +49,27 @@ async def upload_media(user_claims: Dict = Depends(get_current_user), file: Uplo
         original_filename=file.filename,
         storage_path=object_key,
         media_type=file.content_type,
+        media_info=media_info,
     )
 
     # Add the new media item to DynamoDB
     add_media_item(media_item.model_dump())
+    invalidate_listing(user_id, MEDIA_LISTING)
 
     return media_item
 
 @router.get("/", response_model=List[MediaItemInDB])
-async def list_user_media(user_claims: Dict = Depends(get_current_user)):
+async def list_user_media(request: Request, user_claims: Dict = Depends(get_current_user)):
     """
     Retrieves a list of all media items uploaded by the current user from DynamoDB.
+    Answers 304 without reading DynamoDB when the client's If-None-Match is still current.
     """
     user_id = user_claims.get("sub")
+    unchanged = not_modified(request, user_id, MEDIA_LISTING)
+    if unchanged is not None:
+        return unchanged
     media_items_data = get_user_media(user_id)
-    return [MediaItemInDB(**item) for item in media_items_data]
+    return listing_response(request, user_id, MEDIA_LISTING, lean_items(media_items_data, MediaItemInDB))
 
 @router.delete("/all", status_code=status.HTTP_204_NO_CONTENT)
 async def clear_all_user_media(user_claims: Dict = Depends(get_current_user)):
@@ -61,11 +80,16 @@ async def clear_all_user_media(user_claims: Dict = Depends(get_current_user)):
     
     # This function now gets paths from DynamoDB and deletes the DB entries
     object_keys_to_delete = delete_user_media(user_id)
+    invalidate_listing(user_id, MEDIA_LISTING)
     
     # Delete corresponding files from S3
     for object_key in object_keys_to_delete:
         try:
-            delete_file_from_s3(object_key)
+            if object_key.endswith(PLAYLIST_SUFFIX):
+                # HLS output: the playlist shares a prefix with its renditions and segments
+                delete_prefix_from_s3(hls_prefix(object_key))
+            else:
+                delete_file_from_s3(object_key)
         except HTTPException as e:
             print(f"Error deleting S3 object {object_key}: {e.detail}")
             # Continue with other deletions even if one fails
@@ -94,6 +118,29 @@ async def download_media_file(media_id: uuid.UUID, user_claims: Dict = Depends(g
 
     return RedirectResponse(url=presigned_url)
 
+@router.get("/stream/{media_id}/{playlist_path:path}")
+async def stream_media_playlist(media_id: uuid.UUID, playlist_path: str, user_claims: Dict = Depends(get_current_user)):
+    """
+    Serves a playlist of a processed video written as HLS, starting with master.m3u8.
+    Segments are pointed at pre-signed S3 URLs; the playlist may still be growing while the worker encodes.
+    """
+    user_id = user_claims.get("sub")
+    media_item = get_media_by_id(media_id)
+
+    if not media_item or not is_hls_media(media_item):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="HLS media not found.")
+
+    if media_item["owner_id"] != str(user_id):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to stream this file.")
+
+    playlist_key = resolve_playlist_key(media_item["storage_path"], playlist_path)
+    if not playlist_key:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Playlist not found.")
+
+    playlist = rewrite_playlist(read_text_from_s3(playlist_key), playlist_key, create_presigned_url)
+    # Event playlists grow until the encode finishes, so players must not cache them
+    return Response(content=playlist, media_type=HLS_MEDIA_TYPE, headers={"Cache-Control": "no-cache"})
+
 @router.get("/{media_id}", response_model=MediaItemInDB)
 async def get_single_media(media_id: uuid.UUID, user_claims: Dict = Depends(get_current_user)):
     """
@@ -1,9 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import Dict
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from typing import Dict, List, Optional
 from pathlib import Path
 import uuid
 import tempfile
+import time
 import os
+from datetime import datetime, timedelta, timezone
 
 # App-specific imports
 from models.schemas import ProcessRequest, ProcessResponse, MediaItemInDB
@@ -11,15 +13,27 @@ from routers.auth import get_current_user
 # Import the new DynamoDB-based functions
 from utils.database import get_media_by_id, get_filter_by_id, add_media_item
 import json # Added for SQS message body
+import hashlib
 import boto3 # Added for SQS interaction
 
 # App-specific imports
 from models.schemas import ProcessRequest, ProcessResponse, MediaItemInDB
+from models.schemas import BulkProcessRequest, BulkProcessResponse, BulkProcessItemResult
+from models.schemas import PreviewRequest, PreviewResponse, JobItemInDB
 from routers.auth import get_current_user
 from utils.database import get_media_by_id, get_filter_by_id, add_media_item
+from utils.database import batch_get_media_items, batch_get_filter_items, update_media_info, add_job_items
+from utils.database import fail_queued_job
+from utils.media_probe import probe_s3_object, estimate_processing_seconds
 # Removed direct import of process_media service
 # from services.process_media import apply_lut_to_image, apply_lut_to_video
 from utils.s3_client import s3_client, S3_BUCKET_NAME, upload_file_to_s3
+from utils.s3_client import s3_object_exists, create_presigned_url
+from utils.cache_client import get_from_cache, set_to_cache
+from utils.tracing import sqs_message_attributes
+from utils.queue_load import get_queue_load, estimate_wait_seconds, retry_after_seconds
+from utils.job_registry import request_fingerprint, claim_job, claim_in_flight, release_claims
+from utils.job_registry import IdempotencyKeyReused, IDEMPOTENCY_HEADER
 
 # --- Router --- #
 router = APIRouter(
@@ -35,14 +49,165 @@ SQS_QUEUE_URL = os.environ.get('SQS_QUEUE_URL')
 if not SQS_QUEUE_URL:
     raise RuntimeError("SQS_QUEUE_URL environment variable not set for backend API.")
 
+# Optional fast lane for short jobs (images). Videos stay on SQS_QUEUE_URL so a burst of
+# long encodes cannot hold up interactive image jobs. Without it, everything uses one queue.
+SQS_FAST_QUEUE_URL = os.environ.get('SQS_FAST_QUEUE_URL')
+# Probed jobs at or below this cost (pixel-seconds) go to the fast lane, whatever their media type.
+# The default admits stills and a few seconds of 1080p video.
+FAST_LANE_MAX_COST = float(os.environ.get('FAST_LANE_MAX_COST', '10000000'))
+
+# SendMessageBatch accepts at most 10 entries per call
+SQS_BATCH_SIZE = 10
+# Upper bound on media x filter combinations accepted by a single bulk request
+MAX_BULK_JOBS = int(os.environ.get('MAX_BULK_JOBS', '500'))
+# Previews are cached in S3 per (media, filter contents, mode, start) under this prefix.
+# Bump PREVIEW_VERSION when the worker's preview rendering changes to stop serving old renders.
+PREVIEW_PREFIX = "previews"
+PREVIEW_VERSION = 1
+# A requested preview counts as pending (not re-enqueued) for this long
+PREVIEW_PENDING_SECONDS = 60
+# Scheduling cost of a preview job in pixel-seconds: a few reduced-resolution frames
+PREVIEW_ESTIMATED_COST = 1000000.0
+# Formats "auto" may pick when the client's Accept header lists them, smallest output first
+MODERN_IMAGE_FORMATS = ("avif", "webp")
+# Detail of the 429 returned while a queue is over its backpressure limit (see utils/queue_load.py)
+QUEUE_BUSY_DETAIL = "The processing queue is busy. Please retry later."
+# Job records are removed by DynamoDB's TTL (the `expires_at` attribute) this long after submission
+JOB_TTL_SECONDS = int(os.environ.get('JOB_TTL_SECONDS', str(7 * 24 * 3600)))
+# Media that could not be probed is not probed again for this long
+PROBE_FAILURE_TTL_SECONDS = int(os.environ.get('PROBE_FAILURE_TTL_SECONDS', '3600'))
+
+
+def _check_filter_access(filter_item: Dict, user_id: str) -> bool:
+    """Returns True if the user may apply this filter (default filters or their own custom ones)."""
+    is_default_filter = filter_item.get("filter_type") == "default"
+    is_filter_owner = str(user_id) == filter_item.get("owner_id")
+    return is_default_filter or is_filter_owner
+
+
+def _lut_spec(filter_item: Dict) -> Dict:
+    """Describes one LUT for the worker: where to find it and what is known about it."""
+    s3_filter_key = filter_item["storage_path"]
+    return {
+        # Extract LUT filename from s3_filter_key
+        "lut_filename": Path(s3_filter_key).name,
+        # Lets the worker fetch LUTs it does not bundle (custom filters) and verify its cached copy
+        "s3_filter_key": s3_filter_key,
+        "filter_checksum": filter_item.get("content_hash"),
+        "s3_compiled_key": filter_item.get("compiled_path"),
+        "lut_class": filter_item.get("lut_class"),
+    }
+
+
+def _build_message_body(user_id: str, media_item: Dict, filter_item: Dict) -> Dict:
+    """Builds the SQS message body the media worker expects for one (media, filter) job."""
+    s3_input_key = media_item["storage_path"]
+    file_suffix = Path(media_item["original_filename"]).suffix
+
+    # Generate a unique output key for the processed media
+    s3_output_key = f"processed/{user_id}/{uuid.uuid4().hex}{file_suffix}"
+
+    return {
+        "user_id": str(user_id),
+        "media_id": str(media_item["id"]),
+        "filter_id": str(filter_item["id"]),
+        "s3_input_key": s3_input_key,
+        "s3_output_key": s3_output_key,
+        **_lut_spec(filter_item),
+        "media_type": media_item.get("media_type", ""),
+        "original_filename": media_item["original_filename"],
+        "estimated_cost": _estimated_cost(media_item)
+        # Add other parameters like crf, quality if needed and available in request
+    }
+
+
+def _new_job(user_id: str, message_body: Dict) -> Dict:
+    """
+    Creates the job record for a message and tags the message with its ID, so the worker
+    can report the job's stages and progress to the jobs table.
+    """
+    job = JobItemInDB(
+        id=uuid.uuid4(),
+        owner_id=user_id,
+        media_id=message_body["media_id"],
+        filter_id=message_body["filter_id"],
+    )
+    message_body["job_id"] = str(job.id)
+    return dict(job.model_dump(), expires_at=int(time.time()) + JOB_TTL_SECONDS)
+
+
+def _output_options(media_item: Dict, output_format: str, output_quality: Optional[int], video_output: str,
+                    accept_header: str) -> Dict:
+    """
+    Output format fields of a job's message. Empty when the default output is kept.
+    For "auto" the worker gets the modern formats the client accepts and makes the final choice,
+    since it knows whether the image has transparency and what its ffmpeg can encode.
+    """
+    if "video" in media_item.get("media_type", ""):
+        return {"video_output": video_output} if video_output != "mp4" else {}
+    if output_format == "original" or "image" not in media_item.get("media_type", ""):
+        return {}
+    options = {"output_format": output_format, "output_quality": output_quality}
+    if output_format == "auto":
+        options["accepted_formats"] = [fmt for fmt in MODERN_IMAGE_FORMATS if f"image/{fmt}" in accept_header]
+    return options
+
+
+def _estimated_cost(media_item: Dict):
+    media_info = media_item.get("media_info") or {}
+    cost = media_info.get("estimated_cost")
+    return float(cost) if cost is not None else None
+
+
+def _is_supported_media_type(media_type: str) -> bool:
+    return "video" in media_type or "image" in media_type
+
+
+def _select_queue_url(media_item: Dict) -> str:
+    """
+    Routes cheap jobs to the fast lane (when configured) and everything else to the main queue.
+    Uses the probed cost when the media has been probed, otherwise the media type.
+    """
+    if not SQS_FAST_QUEUE_URL:
+        return SQS_QUEUE_URL
+    media_info = media_item.get("media_info")
+    if media_info and media_info.get("estimated_cost") is not None:
+        is_cheap = float(media_info["estimated_cost"]) <= FAST_LANE_MAX_COST
+    else:
+        is_cheap = "image" in media_item.get("media_type", "")
+    return SQS_FAST_QUEUE_URL if is_cheap else SQS_QUEUE_URL
+
+
+def _ensure_media_info(media_item: Dict) -> Dict:
+    """
+    Probes media that was not probed at upload time and stores the result on the item.
+    Media that cannot be probed is remembered for PROBE_FAILURE_TTL_SECONDS instead of being
+    fetched from S3 again on every request. Blocks on S3 and ffprobe: call it from plain `def` handlers.
+    """
+    if media_item.get("media_info"):
+        return media_item
+    failure_key = f"media-probe-failed:{media_item['id']}"
+    if get_from_cache(failure_key):
+        return media_item
+    media_info = probe_s3_object(media_item["storage_path"], media_item.get("media_type", ""))
+    if media_info:
+        update_media_info(media_item["id"], media_info)
+        media_item["media_info"] = media_info
+    else:
+        set_to_cache(failure_key, True, expire=PROBE_FAILURE_TTL_SECONDS)
+    return media_item
+
+
 @router.post("/", response_model=ProcessResponse)
-async def apply_filter_to_media(
+def apply_filter_to_media(
     request: ProcessRequest,
+    http_request: Request,
     user_claims: Dict = Depends(get_current_user)
 ):
     """
     Submits a request to apply a LUT filter to a media file to an SQS queue.
     The actual processing will be handled by a separate worker.
+    A plain `def`, so FastAPI runs the blocking DynamoDB, SQS and CloudWatch calls in its threadpool.
     """
     user_id = user_claims.get("sub")
 
@@ -55,56 +220,328 @@ async def apply_filter_to_media(
     if not filter_item:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Filter item not found.")
 
-    is_default_filter = filter_item.get("filter_type") == "default"
-    is_filter_owner = str(user_id) == filter_item.get("owner_id")
-    if not is_default_filter and not is_filter_owner:
+    if not _check_filter_access(filter_item, user_id):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to use this filter.")
 
+    chain_items = []
+    if request.filter_chain:
+        chain_filters = batch_get_filter_items(request.filter_chain)
+        for chain_filter_id in request.filter_chain:
+            chain_item = chain_filters.get(str(chain_filter_id))
+            if not chain_item:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Filter item {chain_filter_id} not found.")
+            if not _check_filter_access(chain_item, user_id):
+                raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=f"Not authorized to use filter {chain_filter_id}.")
+            chain_items.append(chain_item)
+
     # --- Prepare data for SQS message ---
-    s3_input_key = media_item["storage_path"]
-    s3_filter_key = filter_item["storage_path"]
-    file_suffix = Path(media_item["original_filename"]).suffix
     media_type = media_item.get("media_type", "")
-
-    if "video" not in media_type and "image" not in media_type:
+    if not _is_supported_media_type(media_type):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unsupported media type: {media_type}")
 
-    # Extract LUT filename from s3_filter_key
-    lut_filename = Path(s3_filter_key).name
+    media_item = _ensure_media_info(media_item)
+    message_body = _build_message_body(user_id, media_item, filter_item)
+    if chain_items or request.intensity < 1.0:
+        message_body["lut_chain"] = [_lut_spec(item) for item in [filter_item] + chain_items]
+        message_body["intensity"] = request.intensity
+    message_body.update(_output_options(
+        media_item, request.output_format, request.output_quality, request.video_output,
+        http_request.headers.get("accept", "")
+    ))
+    if getattr(http_request.state, "profile_requested", False):
+        message_body["profile"] = True
+    s3_input_key = message_body["s3_input_key"]
+    job = _new_job(user_id, message_body)
 
-    # Generate a unique output key for the processed media
-    s3_output_key = f"processed/{user_id}/{uuid.uuid4().hex}{file_suffix}"
+    # --- Coalesce duplicate submissions into the job already in flight ---
+    fingerprint = request_fingerprint(message_body)
+    idempotency_key = http_request.headers.get(IDEMPOTENCY_HEADER)
+    try:
+        existing_job_id = claim_job(fingerprint, message_body["job_id"], user_id, idempotency_key)
+    except IdempotencyKeyReused as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    if existing_job_id:
+        print(f"[JOB COALESCED] Duplicate request for {s3_input_key} joined job {existing_job_id}")
+        return ProcessResponse(message="An identical request is already being processed.", task_id=existing_job_id)
 
-    message_body = {
-        "user_id": str(user_id),
-        "media_id": str(request.media_id),  # Explicitly convert to string
-        "filter_id": str(request.filter_id), # Explicitly convert to string
-        "s3_input_key": s3_input_key,
-        "s3_output_key": s3_output_key,
-        "lut_filename": lut_filename,
-        "media_type": media_type,
-        "original_filename": media_item["original_filename"]
-        # Add other parameters like crf, quality if needed and available in request
-    }
+    queue_url = _select_queue_url(media_item)
+    queue_load = get_queue_load(queue_url)
+    retry_after = retry_after_seconds(queue_load, request.priority)
+    if retry_after is not None:
+        release_claims(fingerprint, user_id, idempotency_key)
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=QUEUE_BUSY_DETAIL,
+            headers={"Retry-After": str(retry_after)}
+        )
 
     try:
+        # The job exists before the worker can pick up its message
+        add_job_items([job])
+
         # --- Send message to SQS ---
         response = sqs_client.send_message(
-            QueueUrl=SQS_QUEUE_URL,
-            MessageBody=json.dumps(message_body)
+            QueueUrl=queue_url,
+            MessageBody=json.dumps(message_body),
+            MessageAttributes=sqs_message_attributes() # Lets the worker continue this request's trace
         )
         message_id = response['MessageId']
         print(f"[SQS MESSAGE SENT] MessageId: {message_id} for processing {s3_input_key}")
 
         # --- Return 202 Accepted response ---
+        estimated_seconds = estimate_processing_seconds(media_item.get("media_info"))
+        estimated_wait_seconds = estimate_wait_seconds(queue_load)
+        estimated_completion_at = None
+        if estimated_wait_seconds is not None:
+            estimated_completion_at = datetime.now(timezone.utc) + timedelta(seconds=estimated_wait_seconds + (estimated_seconds or 0))
         return ProcessResponse(
             message="Media processing request submitted successfully.",
-            task_id=message_id # Use SQS MessageId as task_id for tracking
+            task_id=message_body["job_id"],
+            estimated_seconds=estimated_seconds,
+            estimated_wait_seconds=estimated_wait_seconds,
+            estimated_completion_at=estimated_completion_at
         )
 
     except Exception as e:
         print(f"Error sending message to SQS: {e}")
+        release_claims(fingerprint, user_id, idempotency_key)
+        fail_queued_job(message_body["job_id"], f"Failed to submit processing request: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to submit processing request: {e}")
 
     # Removed all local file operations, direct processing calls, S3 uploads, and DynamoDB updates
-    # These are now handled by the media_worker
\ No newline at end of file
+    # These are now handled by the media_worker
+
+
+def _send_message_batches(queue_url: str, pending: List, results: List[BulkProcessItemResult]):
+    """
+    Sends (result index, message body) pairs to one queue in groups of 10, recording job IDs and errors.
+    The job record of a message that could not be sent is marked failed.
+    """
+    for start in range(0, len(pending), SQS_BATCH_SIZE):
+        chunk = pending[start:start + SQS_BATCH_SIZE]
+        message_bodies = dict(chunk)
+        entries = [
+            {"Id": str(result_index), "MessageBody": json.dumps(message_body), "MessageAttributes": sqs_message_attributes()}
+            for result_index, message_body in chunk
+        ]
+        try:
+            response = sqs_client.send_message_batch(QueueUrl=queue_url, Entries=entries)
+        except Exception as e:
+            print(f"Error sending message batch to SQS: {e}")
+            for result_index, message_body in chunk:
+                results[result_index].error = f"Failed to submit processing request: {e}"
+                release_claims(request_fingerprint(message_body))
+                fail_queued_job(message_body["job_id"], results[result_index].error)
+            continue
+
+        for entry in response.get('Successful', []):
+            results[int(entry['Id'])].task_id = message_bodies[int(entry['Id'])]["job_id"]
+        for entry in response.get('Failed', []):
+            message_body = message_bodies[int(entry['Id'])]
+            results[int(entry['Id'])].error = f"Failed to submit processing request: {entry.get('Message', entry.get('Code'))}"
+            release_claims(request_fingerprint(message_body))
+            fail_queued_job(message_body["job_id"], results[int(entry['Id'])].error)
+
+
+def apply_filter_to_media_bulk(
+    request: BulkProcessRequest,
+    http_request: Request,
+    user_claims: Dict = Depends(get_current_user)
+):
+    """
+    Submits one processing job per (media, filter) combination in a single call.
+    Items are validated with BatchGetItem and jobs are enqueued with SendMessageBatch.
+    Failures are reported per item instead of failing the whole request.
+    Media that was never probed is routed by its media type rather than probed here.
+    Combinations identical to a job still in flight get that job's ID instead of a new job.
+    Bulk jobs are low priority: combinations bound for a backed-up queue are turned away first,
+    and the whole request gets a 429 when none could be queued for that reason.
+    A plain `def` like apply_filter_to_media, as every step blocks on AWS.
+    """
+    user_id = user_claims.get("sub")
+
+    media_ids = list(dict.fromkeys(request.media_ids))
+    filter_ids = list(dict.fromkeys(request.filter_ids))
+    if len(media_ids) * len(filter_ids) > MAX_BULK_JOBS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Too many jobs in one request. At most {MAX_BULK_JOBS} media/filter combinations are allowed."
+        )
+
+    # --- 1. Validate Inputs from DynamoDB in batches ---
+    media_items = batch_get_media_items(media_ids)
+    filter_items = batch_get_filter_items(filter_ids)
+
+    media_errors = {}
+    for media_id in media_ids:
+        media_item = media_items.get(str(media_id))
+        if not media_item or media_item["owner_id"] != str(user_id):
+            media_errors[media_id] = "Media item not found or access denied."
+        elif not _is_supported_media_type(media_item.get("media_type", "")):
+            media_errors[media_id] = f"Unsupported media type: {media_item.get('media_type', '')}"
+
+    filter_errors = {}
+    for filter_id in filter_ids:
+        filter_item = filter_items.get(str(filter_id))
+        if not filter_item:
+            filter_errors[filter_id] = "Filter item not found."
+        elif not _check_filter_access(filter_item, user_id):
+            filter_errors[filter_id] = "Not authorized to use this filter."
+
+    # --- 2. Build one result slot per combination, and a message for each valid one ---
+    accept_header = http_request.headers.get("accept", "")
+    results = []
+    pending = {}  # queue url -> [(result index, message body)]
+    for media_id in media_ids:
+        for filter_id in filter_ids:
+            result = BulkProcessItemResult(media_id=media_id, filter_id=filter_id)
+            error = media_errors.get(media_id) or filter_errors.get(filter_id)
+            if error:
+                result.error = error
+            else:
+                message_body = _build_message_body(user_id, media_items[str(media_id)], filter_items[str(filter_id)])
+                message_body.update(_output_options(
+                    media_items[str(media_id)], request.output_format, request.output_quality, request.video_output,
+                    accept_header
+                ))
+                if getattr(http_request.state, "profile_requested", False):
+                    message_body["profile"] = True
+                queue_url = _select_queue_url(media_items[str(media_id)])
+                pending.setdefault(queue_url, []).append((len(results), message_body))
+            results.append(result)
+
+    # --- 3. Coalesce combinations whose identical job is still in flight ---
+    jobs = {}  # result index -> new job record
+    for queue_url in list(pending):
+        queue_pending = []
+        for result_index, message_body in pending[queue_url]:
+            job = _new_job(user_id, message_body)
+            existing_job_id = claim_in_flight(request_fingerprint(message_body), message_body["job_id"])
+            if existing_job_id:
+                results[result_index].task_id = existing_job_id
+            else:
+                jobs[result_index] = job
+                queue_pending.append((result_index, message_body))
+        if queue_pending:
+            pending[queue_url] = queue_pending
+        else:
+            del pending[queue_url]
+
+    # --- 4. Hold back jobs for queues over the low-priority backpressure limit ---
+    retry_afters = []
+    for queue_url in list(pending):
+        retry_after = retry_after_seconds(get_queue_load(queue_url), "low")
+        if retry_after is not None:
+            retry_afters.append(retry_after)
+            for result_index, message_body in pending.pop(queue_url):
+                results[result_index].error = QUEUE_BUSY_DETAIL
+                release_claims(request_fingerprint(message_body))
+                del jobs[result_index]
+    if retry_afters and not pending:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=QUEUE_BUSY_DETAIL,
+            headers={"Retry-After": str(min(retry_afters))}
+        )
+
+    # --- 5. Create the job records, then send messages to SQS in groups of 10 ---
+    try:
+        add_job_items(list(jobs.values()))
+    except Exception as e:
+        for queue_pending in pending.values():
+            for _, message_body in queue_pending:
+                release_claims(request_fingerprint(message_body))
+                # Some records may have been written before the batch write failed
+                fail_queued_job(message_body["job_id"], f"Failed to submit processing request: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to submit processing request: {e}")
+    for queue_url, queue_pending in pending.items():
+        _send_message_batches(queue_url, queue_pending, results)
+
+    submitted = sum(1 for result in results if result.task_id)
+    print(f"[SQS BATCH SENT] {submitted}/{len(results)} jobs submitted for user {user_id}")
+
+    return BulkProcessResponse(
+        message="Bulk processing request handled.",
+        submitted=submitted,
+        failed=len(results) - submitted,
+        results=results
+    )
+
+
+def _preview_key(user_id: str, media_item: Dict, filter_item: Dict, mode: str, start: float) -> str:
+    """Deterministic S3 key of a preview, so repeated requests for the same look reuse one render."""
+    is_video = "video" in media_item.get("media_type", "")
+    if not is_video:
+        mode, start = "still", 0.0
+    filter_identity = filter_item.get("content_hash") or filter_item["storage_path"]
+    digest = hashlib.sha256(
+        json.dumps([filter_identity, mode, round(start, 1), PREVIEW_VERSION]).encode("utf-8")
+    ).hexdigest()[:32]
+    extension = ".mp4" if mode == "window" else ".jpg"
+    return f"{PREVIEW_PREFIX}/{user_id}/{media_item['id']}/{digest}{extension}"
+
+
+def request_preview(
+    request: PreviewRequest,
+    user_claims: Dict = Depends(get_current_user)
+):
+    """
+    Returns a quick preview of a filter on a media file: a reduced-resolution strip of frames sampled
+    across the video, or a short clip. The worker seeks within the input, so only the previewed
+    parts are ever read. Returns the cached preview when one exists; otherwise queues the render on
+    the fast lane and reports "pending". Clients poll with the same request.
+    A plain `def` like apply_filter_to_media, as every step blocks on AWS.
+    """
+    user_id = user_claims.get("sub")
+
+    media_item = get_media_by_id(request.media_id)
+    if not media_item or media_item["owner_id"] != str(user_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Media item not found or access denied.")
+
+    filter_item = get_filter_by_id(request.filter_id)
+    if not filter_item:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Filter item not found.")
+
+    if not _check_filter_access(filter_item, user_id):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to use this filter.")
+
+    media_type = media_item.get("media_type", "")
+    if not _is_supported_media_type(media_type):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unsupported media type: {media_type}")
+
+    preview_key = _preview_key(user_id, media_item, filter_item, request.mode, request.start)
+    if s3_object_exists(preview_key):
+        return PreviewResponse(status="ready", url=create_presigned_url(preview_key))
+
+    pending_cache_key = f"preview-pending:{preview_key}"
+    pending_task_id = get_from_cache(pending_cache_key)
+    if pending_task_id:
+        return PreviewResponse(status="pending", task_id=pending_task_id)
+
+    media_info = media_item.get("media_info") or {}
+    # Stored media info holds Decimals when it was read from DynamoDB
+    duration = media_info.get("duration")
+    message_body = _build_message_body(user_id, media_item, filter_item)
+    message_body.update({
+        "job_type": "preview",
+        "s3_output_key": preview_key,
+        "preview_mode": request.mode if "video" in media_type else "still",
+        "preview_start": request.start,
+        "duration": float(duration) if duration is not None else None,
+        "estimated_cost": PREVIEW_ESTIMATED_COST,
+    })
+    job = _new_job(user_id, message_body)
+
+    try:
+        # Like processing jobs, a preview can be followed with GET /jobs/{task_id}
+        add_job_items([job])
+        sqs_client.send_message(
+            QueueUrl=SQS_FAST_QUEUE_URL or SQS_QUEUE_URL,
+            MessageBody=json.dumps(message_body),
+            MessageAttributes=sqs_message_attributes()
+        )
+    except Exception as e:
+        print(f"Error sending preview message to SQS: {e}")
+        fail_queued_job(message_body["job_id"], f"Failed to submit preview request: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to submit preview request: {e}")
+
+    set_to_cache(pending_cache_key, message_body["job_id"], expire=PREVIEW_PENDING_SECONDS)
+    return PreviewResponse(status="pending", task_id=message_body["job_id"])
@@ -15,3 +15,13 @@ def auth_token(test_client):
     response = test_client.post("/auth/token", data={"username": "user1", "password": "fake_password_1"})
     assert response.status_code == 200
     return response.json()["access_token"]
+
+@pytest.fixture(scope="session")
+def cube_file_content():
+    """A minimal valid 3D LUT (identity, LUT_3D_SIZE 2) for upload tests."""
+    lines = ["TITLE \"identity\"", "LUT_3D_SIZE 2"]
+    for b in (0.0, 1.0):
+        for g in (0.0, 1.0):
+            for r in (0.0, 1.0):
+                lines.append(f"{r} {g} {b}")
+    return ("\n".join(lines) + "\n").encode("utf-8")
@@ -2,11 +2,10 @@
 from fastapi.testclient import TestClient
 import io
 
-def test_upload_filter(test_client: TestClient, auth_token: str):
+def test_upload_filter(test_client: TestClient, auth_token: str, cube_file_content: bytes):
     """Test successful filter file upload."""
     headers = {"Authorization": f"Bearer {auth_token}"}
-    file_content = b"dummy filter content"
-    files = {"file": ("test_filter.cube", io.BytesIO(file_content), "application/octet-stream")}
+    files = {"file": ("test_filter.cube", io.BytesIO(cube_file_content), "application/octet-stream")}
     
     response = test_client.post("/filters/upload", headers=headers, files=files)
     
@@ -14,6 +13,19 @@ def test_upload_filter(test_client: TestClient, auth_token: str):
     json_response = response.json()
     assert json_response["filter_name"] == "test_filter"
     assert json_response["storage_path"].endswith(".cube")
+    assert json_response["grid_size"] == 2
+    assert json_response["compiled_path"].startswith(json_response["storage_path"])
+    assert json_response["lut_class"] == "identity"
+
+def test_upload_filter_malformed_lut(test_client: TestClient, auth_token: str):
+    """Test that a .cube file with missing entries is rejected at upload."""
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    file_content = b"LUT_3D_SIZE 2\n0 0 0\n1 1 1\n"
+    files = {"file": ("broken.cube", io.BytesIO(file_content), "application/octet-stream")}
+
+    response = test_client.post("/filters/upload", headers=headers, files=files)
+    assert response.status_code == 400
+    assert "Invalid LUT file" in response.json()["detail"]
 
 def test_upload_filter_invalid_extension(test_client: TestClient, auth_token: str):
     """Test that uploading a file with an invalid extension is rejected."""
@@ -24,11 +36,11 @@ def test_upload_filter_invalid_extension(test_client: TestClient, auth_token: st
     assert response.status_code == 400
     assert "Invalid file type" in response.json()["detail"]
 
-def test_list_user_filters(test_client: TestClient, auth_token: str):
+def test_list_user_filters(test_client: TestClient, auth_token: str, cube_file_content: bytes):
     """Test listing filters for the authenticated user."""
     headers = {"Authorization": f"Bearer {auth_token}"}
     # Ensure a filter is uploaded first
-    files = {"file": ("list_test.cube", io.BytesIO(b"filter"), "application/octet-stream")}
+    files = {"file": ("list_test.cube", io.BytesIO(cube_file_content), "application/octet-stream")}
     test_client.post("/filters/upload", headers=headers, files=files)
 
     # List the filters
@@ -0,0 +1,67 @@
+import pytest
+
+from utils import database
+from utils.database import get_media_by_id, batch_get_media_items, get_user_media, delete_user_media
+
+MEDIA_ID = "a1b2c3d4-e5f6-7890-1234-567890abcdef"
+OWNER_ID = "0f0e0d0c-0b0a-0908-0706-050403020100"
+
+class CountingTable:
+    """A media table holding one item that counts the reads reaching it."""
+    name = "media_items"
+
+    def __init__(self):
+        self.item = {"id": MEDIA_ID, "owner_id": OWNER_ID, "storage_path": "uploads/a.jpg"}
+        self.reads = 0
+
+    def get_item(self, Key):
+        self.reads += 1
+        return {"Item": dict(self.item)} if Key["id"] == self.item["id"] else {}
+
+    def query(self, **kwargs):
+        self.reads += 1
+        return {"Items": [dict(self.item)]}
+
+    def batch_writer(self):
+        table = self
+        class Writer:
+            def __enter__(self): return self
+            def __exit__(self, *exc_info): return False
+            def delete_item(self, Key): table.item = {"id": None}
+        return Writer()
+
+@pytest.fixture
+def table(monkeypatch):
+    """The media table and an in-memory stand-in for Memcached."""
+    entries = {}
+    monkeypatch.setattr(database, "get_from_cache", entries.get)
+    monkeypatch.setattr(database, "get_many_from_cache", lambda keys: {key: entries[key] for key in keys if key in entries})
+    monkeypatch.setattr(database, "set_many_to_cache", lambda values, expire: entries.update(values))
+    monkeypatch.setattr(database, "delete_from_cache", lambda key: entries.pop(key, None))
+    monkeypatch.setattr(database, "delete_many_from_cache", lambda keys: [entries.pop(key, None) for key in keys])
+    counting_table = CountingTable()
+    monkeypatch.setattr(database, "MEDIA_ITEMS_TABLE", counting_table)
+    return counting_table
+
+def test_lookup_reads_through_cache(table):
+    """Test that repeated lookups of an item reach DynamoDB once, and batch lookups not at all."""
+    assert get_media_by_id(MEDIA_ID)["storage_path"] == "uploads/a.jpg"
+    assert get_media_by_id(MEDIA_ID)["storage_path"] == "uploads/a.jpg"
+    assert batch_get_media_items([MEDIA_ID]) == {MEDIA_ID: table.item}
+    assert table.reads == 1
+
+def test_missing_item_is_not_cached(table):
+    """Test that a lookup of an item that does not exist yet is retried against DynamoDB."""
+    other_id = "ffffffff-ffff-ffff-ffff-ffffffffffff"
+    assert get_media_by_id(other_id) is None
+    assert get_media_by_id(other_id) is None
+    assert table.reads == 2
+
+def test_listing_populates_and_delete_invalidates(table):
+    """Test that listed items are served from the cache until they are deleted."""
+    get_user_media(OWNER_ID)
+    get_media_by_id(MEDIA_ID)
+    assert table.reads == 1
+
+    delete_user_media(OWNER_ID)
+    assert get_media_by_id(MEDIA_ID) is None
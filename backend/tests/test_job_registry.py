@@ -0,0 +1,57 @@
+import pytest
+
+from utils import job_registry
+from utils.job_registry import request_fingerprint, claim_job, release_claims, IdempotencyKeyReused
+
+@pytest.fixture
+def cache(monkeypatch):
+    """An in-memory stand-in for Memcached, with every job still queued."""
+    entries = {}
+    monkeypatch.setattr(job_registry, "add_to_cache", lambda key, value, expire: entries.setdefault(key, value) is value)
+    monkeypatch.setattr(job_registry, "get_from_cache", entries.get)
+    monkeypatch.setattr(job_registry, "set_to_cache", lambda key, value, expire: entries.__setitem__(key, value))
+    monkeypatch.setattr(job_registry, "delete_from_cache", lambda key: entries.pop(key, None))
+    # The value itself serves as the CAS token: it changes whenever the item is replaced
+    monkeypatch.setattr(job_registry, "gets_from_cache", lambda key: (entries.get(key), entries.get(key)))
+    monkeypatch.setattr(job_registry, "cas_to_cache", lambda key, value, token, expire:
+                        entries.get(key) is token and entries.__setitem__(key, value) is None)
+    monkeypatch.setattr(job_registry, "get_job_by_id", lambda job_id: {"id": job_id, "status": "queued"})
+    return entries
+
+def test_fingerprint_ignores_per_submission_fields():
+    """Test that two submissions of the same job share a fingerprint despite their own output key and job ID."""
+    first = {"user_id": "u", "media_id": "m", "filter_id": "f", "s3_output_key": "processed/u/1.mp4", "job_id": "1"}
+    second = dict(first, s3_output_key="processed/u/2.mp4", job_id="2")
+    assert request_fingerprint(first) == request_fingerprint(second)
+    assert request_fingerprint(first) != request_fingerprint(dict(first, filter_id="g"))
+
+def test_duplicate_submission_joins_job_in_flight(cache):
+    """Test that an identical submission gets the first job's ID until the claim is released."""
+    assert claim_job("fp", "job-1", "user") is None
+    assert claim_job("fp", "job-2", "user") == "job-1"
+
+    release_claims("fp")
+    assert claim_job("fp", "job-3", "user") is None
+
+def test_finished_job_is_not_joined(cache, monkeypatch):
+    """Test that once the claiming job is finished a new submission starts a new job."""
+    claim_job("fp", "job-1", "user")
+    monkeypatch.setattr(job_registry, "get_job_by_id", lambda job_id: {"id": job_id, "status": "completed"})
+    assert claim_job("fp", "job-2", "user") is None
+
+def test_claim_without_job_record_is_joined_while_submitting(cache, monkeypatch):
+    """Test that a claim whose job record is not written yet is joined, and taken over once it is stale."""
+    monkeypatch.setattr(job_registry, "get_job_by_id", lambda job_id: None)
+    assert claim_job("fp", "job-1", "user") is None
+    assert claim_job("fp", "job-2", "user") == "job-1"
+
+    cache[job_registry._in_flight_key("fp")]["claimed_at"] -= job_registry.CLAIM_SUBMIT_GRACE_SECONDS
+    assert claim_job("fp", "job-3", "user") is None
+    assert claim_job("fp", "job-4", "user") == "job-3"
+
+def test_idempotency_key_replays_and_rejects_reuse(cache):
+    """Test that an idempotency key replays its job and cannot be reused for another request."""
+    assert claim_job("fp", "job-1", "user", "key-1") is None
+    assert claim_job("fp", "job-2", "user", "key-1") == "job-1"
+    with pytest.raises(IdempotencyKeyReused):
+        claim_job("other-fp", "job-3", "user", "key-1")
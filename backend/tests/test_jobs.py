@@ -0,0 +1,38 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from utils import job_events
+
+def test_get_unknown_job(test_client: TestClient, auth_token: str):
+    """Test that looking up a job that does not exist returns 404."""
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    response = test_client.get("/jobs/a1b2c3d4-e5f6-7890-1234-567890abcdef", headers=headers)
+
+    assert response.status_code == 404
+    assert "Job not found" in response.json()["detail"]
+
+def test_job_events_unknown_job(test_client: TestClient, auth_token: str):
+    """Test that the event stream of a job that does not exist returns 404 instead of an empty stream."""
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    response = test_client.get("/jobs/a1b2c3d4-e5f6-7890-1234-567890abcdef/events", headers=headers)
+
+    assert response.status_code == 404
+
+def test_job_watcher_does_not_repeat_the_subscribed_snapshot(monkeypatch):
+    """Test that a job the subscriber already has is not pushed again, but its next change is."""
+    job = {"id": "job-1", "status": "encoding", "progress": 10, "updated_at": "2024-01-01T00:00:00"}
+    changed = dict(job, progress=50, updated_at="2024-01-01T00:00:05")
+    reads = [job] # The first poll still sees the snapshot, later ones the change
+    monkeypatch.setattr(job_events, "batch_get_job_items", lambda job_ids: {"job-1": reads.pop() if reads else changed})
+    monkeypatch.setattr(job_events, "JOB_EVENTS_POLL_SECONDS", 0.01)
+
+    async def first_event():
+        watcher = job_events.JobWatcher()
+        queue = watcher.subscribe("job-1", job)
+        try:
+            return await asyncio.wait_for(queue.get(), timeout=1)
+        finally:
+            watcher.unsubscribe("job-1", queue)
+
+    assert asyncio.run(first_event())["progress"] == 50
@@ -0,0 +1,92 @@
+from decimal import Decimal
+
+import orjson
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from models.schemas import FilterItemInDB, MediaItemInDB
+from utils.cache_client import _encode_default
+from utils import listing
+from utils.listing import lean_items, listing_response, not_modified
+
+USER_ID = "0f0e0d0c-0b0a-0908-0706-050403020100"
+MEDIA_ITEM = {
+    "id": "a1b2c3d4-e5f6-7890-1234-567890abcdef",
+    "owner_id": USER_ID,
+    "original_filename": "clip.mp4",
+    "storage_path": "uploads/clip.mp4",
+    "media_type": "video/mp4",
+    "upload_timestamp": "2024-05-01T10:00:00.123456",
+    "media_info": {"duration": Decimal("12.5"), "width": Decimal("1920"), "height": Decimal("1080"),
+                   "frame_rate": Decimal("30"), "codec": "h264", "pixel_count": Decimal("2073600"),
+                   "estimated_cost": Decimal("25920000")},
+    "is_processed": False, # Stored by the worker, not part of the response model
+}
+
+@pytest.fixture
+def client(monkeypatch):
+    """An app serving one listing, with an in-memory stand-in for Memcached."""
+    entries = {}
+    monkeypatch.setattr(listing, "get_from_cache", entries.get)
+    monkeypatch.setattr(listing, "set_to_cache", lambda key, value, expire: entries.__setitem__(key, value))
+    monkeypatch.setattr(listing, "LISTING_COMPRESS_MIN_BYTES", 100)
+    app = FastAPI()
+    app.state.builds = 0
+
+    @app.get("/media")
+    async def list_media(request: Request):
+        unchanged = not_modified(request, USER_ID, "media")
+        if unchanged is not None:
+            return unchanged
+        app.state.builds += 1
+        return listing_response(request, USER_ID, "media", lean_items([MEDIA_ITEM] * 3, MediaItemInDB))
+
+    test_client = TestClient(app)
+    test_client.app_state = app.state
+    return test_client
+
+def test_lean_items_match_model_serialization():
+    """Test that lean listing rows carry the same JSON as serializing each item's model."""
+    filter_item = {"id": "a1b2c3d4-e5f6-7890-1234-567890abcdef", "name": "Teal", "storage_path": "filters/public/teal.cube",
+                   "filter_type": "default", "grid_size": Decimal("33")}
+    for item, model in ((MEDIA_ITEM, MediaItemInDB), (filter_item, FilterItemInDB)):
+        expected = model(**item).model_dump(mode="json", by_alias=True)
+        lean = orjson.loads(orjson.dumps(lean_items([item], model), default=_encode_default))[0]
+        assert lean == expected # 30 == 30.0: numbers keep their value, not always their int/float form
+
+def test_lean_items_leave_out_missing_factory_defaults():
+    """Test that a missing field whose default comes from a factory is left out instead of changing per call."""
+    item = {key: value for key, value in MEDIA_ITEM.items() if key != "upload_timestamp"}
+    rows = lean_items([item], MediaItemInDB)
+    assert "upload_timestamp" not in rows[0]
+    assert rows == lean_items([item], MediaItemInDB)
+
+def test_gzip_and_identity_share_a_weak_etag(client):
+    """Test that both encodings of a listing carry the same weak ETag and revalidate each other."""
+    compressed = client.get("/media", headers={"Accept-Encoding": "gzip"})
+    identity = client.get("/media", headers={"Accept-Encoding": "identity"})
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert "content-encoding" not in identity.headers
+    assert compressed.headers["etag"] == identity.headers["etag"]
+    assert compressed.headers["etag"].startswith('W/"')
+    assert "Accept-Encoding" in identity.headers["vary"]
+
+    strong = compressed.headers["etag"][2:]
+    revalidated = client.get("/media", headers={"If-None-Match": strong, "Accept-Encoding": "identity"})
+    assert revalidated.status_code == 304
+
+def test_revalidation_returns_304_without_rebuilding(client):
+    """Test that a request with a current If-None-Match gets a 304 before the listing is built."""
+    response = client.get("/media", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert len(response.json()) == 3
+
+    revalidated = client.get("/media", headers={"If-None-Match": response.headers["etag"]})
+    assert revalidated.status_code == 304
+    assert client.app_state.builds == 1
+
+    stale = client.get("/media", headers={"If-None-Match": '"outdated"'})
+    assert stale.status_code == 200
+    assert client.app_state.builds == 2
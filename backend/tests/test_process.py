@@ -2,7 +2,7 @@
 from fastapi.testclient import TestClient
 import io
 
-def test_apply_filter_to_media(test_client: TestClient, auth_token: str):
+def test_apply_filter_to_media(test_client: TestClient, auth_token: str, cube_file_content: bytes):
     """Test the processing endpoint which simulates a long-running task."""
     headers = {"Authorization": f"Bearer {auth_token}"}
 
@@ -13,7 +13,7 @@ def test_apply_filter_to_media(test_client: TestClient, auth_token: str):
     media_id = media_response.json()["id"]
 
     # 2. Upload a filter to get a filter_id
-    filter_files = {"file": ("filter.cube", io.BytesIO(b"filter"), "application/octet-stream")}
+    filter_files = {"file": ("filter.cube", io.BytesIO(cube_file_content), "application/octet-stream")}
     filter_response = test_client.post("/filters/upload", headers=headers, files=filter_files)
     assert filter_response.status_code == 201
     filter_id = filter_response.json()["id"]
@@ -28,11 +28,11 @@ def test_apply_filter_to_media(test_client: TestClient, auth_token: str):
     assert "output_path" in json_response
     assert json_response["output_path"].startswith("storage/processed_output/")
 
-def test_process_invalid_media_id(test_client: TestClient, auth_token: str):
+def test_process_invalid_media_id(test_client: TestClient, auth_token: str, cube_file_content: bytes):
     """Test the process endpoint with a non-existent media ID."""
     headers = {"Authorization": f"Bearer {auth_token}"}
     # Upload a filter to get a valid filter_id
-    filter_files = {"file": ("filter.cube", io.BytesIO(b"filter"), "application/octet-stream")}
+    filter_files = {"file": ("filter.cube", io.BytesIO(cube_file_content), "application/octet-stream")}
     filter_response = test_client.post("/filters/upload", headers=headers, files=filter_files)
     filter_id = filter_response.json()["id"]
 
@@ -42,3 +42,57 @@ def test_process_invalid_media_id(test_client: TestClient, auth_token: str):
 
     assert response.status_code == 404
     assert "Media item not found" in response.json()["detail"]
+
+def test_apply_filter_to_media_bulk(test_client: TestClient, auth_token: str, cube_file_content: bytes):
+    """Test that the bulk endpoint returns one result per media/filter combination."""
+    headers = {"Authorization": f"Bearer {auth_token}"}
+
+    media_ids = []
+    for name in ("bulk_1.mp4", "bulk_2.mp4"):
+        media_files = {"file": (name, io.BytesIO(b"media"), "video/mp4")}
+        media_response = test_client.post("/media/upload", headers=headers, files=media_files)
+        assert media_response.status_code == 201
+        media_ids.append(media_response.json()["id"])
+
+    filter_files = {"file": ("filter.cube", io.BytesIO(cube_file_content), "application/octet-stream")}
+    filter_response = test_client.post("/filters/upload", headers=headers, files=filter_files)
+    filter_id = filter_response.json()["id"]
+
+    invalid_media_id = "a1b2c3d4-e5f6-7890-1234-567890abcdef"
+    process_payload = {"media_ids": media_ids + [invalid_media_id], "filter_ids": [filter_id]}
+    response = test_client.post("/process/bulk", headers=headers, json=process_payload)
+
+    assert response.status_code == 200
+    json_response = response.json()
+    assert len(json_response["results"]) == 3
+    assert json_response["submitted"] == 2
+    assert json_response["failed"] == 1
+    failed = [r for r in json_response["results"] if r["error"]]
+    assert failed[0]["media_id"] == invalid_media_id
+    assert "Media item not found" in failed[0]["error"]
+
+def test_process_invalid_output_format(test_client: TestClient, auth_token: str):
+    """Test that unknown output formats are rejected before any lookup."""
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    process_payload = {
+        "media_id": "a1b2c3d4-e5f6-7890-1234-567890abcdef",
+        "filter_id": "a1b2c3d4-e5f6-7890-1234-567890abcdef",
+        "output_format": "bmp",
+    }
+    response = test_client.post("/process/", headers=headers, json=process_payload)
+
+    assert response.status_code == 422
+
+def test_preview_invalid_media_id(test_client: TestClient, auth_token: str, cube_file_content: bytes):
+    """Test the preview endpoint with a non-existent media ID."""
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    filter_files = {"file": ("filter.cube", io.BytesIO(cube_file_content), "application/octet-stream")}
+    filter_response = test_client.post("/filters/upload", headers=headers, files=filter_files)
+    filter_id = filter_response.json()["id"]
+
+    invalid_media_id = "a1b2c3d4-e5f6-7890-1234-567890abcdef"
+    preview_payload = {"media_id": invalid_media_id, "filter_id": filter_id, "mode": "frames"}
+    response = test_client.post("/process/preview", headers=headers, json=preview_payload)
+
+    assert response.status_code == 404
+    assert "Media item not found" in response.json()["detail"]
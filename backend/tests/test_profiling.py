@@ -0,0 +1,21 @@
+import time
+
+from utils import profiling
+from utils.profiling import SamplingProfiler, should_profile
+
+def test_should_profile_only_when_requested_by_default():
+    """Test that without a sample rate only explicitly requested profiles are taken."""
+    assert should_profile(requested=True)
+    assert not should_profile()
+
+def test_sampling_profiler_writes_folded_stacks(tmp_path, monkeypatch):
+    """Test that a profiled block is written as folded stacks tagged with its route."""
+    monkeypatch.setattr(profiling, "PROFILE_OUTPUT_DIR", str(tmp_path))
+    with SamplingProfiler("GET /api/v1/media/", interval=0.001) as profiler:
+        deadline = time.time() + 0.1
+        while time.time() < deadline:
+            pass
+
+    assert profiler.output_path.startswith(str(tmp_path / "GET_api_v1_media"))
+    lines = open(profiler.output_path).read().splitlines()
+    assert lines and all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
@@ -0,0 +1,21 @@
+from utils import queue_load
+from utils.queue_load import estimate_wait_seconds, retry_after_seconds
+
+def test_estimate_wait_from_depth_and_throughput():
+    """Test that the wait is the backlog divided by recent throughput."""
+    assert estimate_wait_seconds({"depth": 30, "jobs_per_minute": 10.0}) == 180.0
+    assert estimate_wait_seconds(None) is None
+
+def test_backpressure_rejects_low_priority_first(monkeypatch):
+    """Test that low-priority submissions are turned away at the lower limit and get a Retry-After."""
+    monkeypatch.setattr(queue_load, "QUEUE_DEPTH_LIMIT", 100)
+    monkeypatch.setattr(queue_load, "LOW_PRIORITY_DEPTH_LIMIT", 50)
+    load = {"depth": 59, "jobs_per_minute": 60.0}
+
+    assert retry_after_seconds(load, "normal") is None
+    assert retry_after_seconds(load, "low") == 10
+    assert retry_after_seconds(None, "low") is None
+
+def test_backpressure_disabled_by_default():
+    """Test that without QUEUE_DEPTH_LIMIT every submission is accepted."""
+    assert retry_after_seconds({"depth": 10000, "jobs_per_minute": 1.0}, "low") is None
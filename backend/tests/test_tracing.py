@@ -0,0 +1,12 @@
+from utils.tracing import parse_traceparent, sqs_message_attributes
+
+def test_parse_traceparent():
+    """Test that valid W3C traceparent values are parsed and malformed ones are ignored."""
+    trace_id, span_id = "4bf92f3577b34da6a3ce929d0e0e4736", "00f067aa0ba902b7"
+    assert parse_traceparent(f"00-{trace_id}-{span_id}-01") == (trace_id, span_id)
+    assert parse_traceparent("00-not-a-trace-01") is None
+    assert parse_traceparent(None) is None
+
+def test_no_message_attributes_outside_a_trace():
+    """Test that messages sent outside a trace carry no trace context."""
+    assert sqs_message_attributes() == {}
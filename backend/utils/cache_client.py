@@ -1,8 +1,9 @@
 import os
 import json
+from decimal import Decimal
 from pymemcache.client.base import Client
 from pymemcache.exceptions import MemcacheError
-from typing import Optional, Any
+from typing import Optional, Any, Dict, List, Tuple
 
 # --- Lazy-Initialized Memcached Client ---
 
@@ -41,6 +42,12 @@ def _get_client() -> Optional[Client]:
     _memcache_client_initialized = True
     return _memcache_client
 
+def _encode_default(obj: Any) -> Any:
+    """JSON encoding of values DynamoDB returns that json cannot encode itself (numbers come back as Decimal)."""
+    if isinstance(obj, Decimal):
+        return int(obj) if obj == obj.to_integral_value() else float(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
 def set_to_cache(key: str, value: Any, expire: int = 60):
     """
     Serializes a Python object to JSON and stores it in the cache.
@@ -55,7 +62,7 @@ def set_to_cache(key: str, value: Any, expire: int = 60):
 
     try:
         # Serialize the Python dict/list to a JSON string, then encode to bytes
-        serialized_value = json.dumps(value).encode('utf-8')
+        serialized_value = json.dumps(value, default=_encode_default).encode('utf-8')
         client.set(key, serialized_value, expire=expire)
     except (TypeError, MemcacheError) as e:
         # TypeError for non-serializable objects, MemcacheError for connection issues
@@ -81,3 +88,105 @@ def get_from_cache(key: str) -> Optional[Any]:
     except (json.JSONDecodeError, MemcacheError) as e:
         print(f"\033[91mError getting or decoding cache for key '{key}': {e}\033[0m")
         return None
+
+def add_to_cache(key: str, value: Any, expire: int = 60) -> bool:
+    """
+    Stores a value only if the key is not already cached (an atomic claim across API instances).
+
+    :return: True if the value was stored, or if caching is disabled; False if the key already exists.
+    """
+    client = _get_client()
+    if not client:
+        return True
+
+    try:
+        serialized_value = json.dumps(value, default=_encode_default).encode('utf-8')
+        return client.add(key, serialized_value, expire=expire, noreply=False)
+    except (TypeError, MemcacheError) as e:
+        print(f"\033[91mError adding cache key '{key}': {e}\033[0m")
+        return True
+
+def gets_from_cache(key: str) -> Tuple[Optional[Any], Optional[bytes]]:
+    """
+    Retrieves an item together with its CAS token, for a later `cas_to_cache`.
+
+    :return: (value, token), or (None, None) if not found, on error, or if caching is disabled.
+    """
+    client = _get_client()
+    if not client:
+        return None, None
+
+    try:
+        cached_value, token = client.gets(key)
+        if cached_value:
+            return json.loads(cached_value.decode('utf-8')), token
+        return None, None
+    except (json.JSONDecodeError, MemcacheError) as e:
+        print(f"\033[91mError getting or decoding cache for key '{key}': {e}\033[0m")
+        return None, None
+
+def cas_to_cache(key: str, value: Any, token: bytes, expire: int = 60) -> bool:
+    """
+    Replaces an item only if it is unchanged since `gets_from_cache` returned `token` (check-and-set).
+
+    :return: True if the value was stored; False if the item changed, expired, or could not be written.
+    """
+    client = _get_client()
+    if not client:
+        return False
+
+    try:
+        serialized_value = json.dumps(value, default=_encode_default).encode('utf-8')
+        return bool(client.cas(key, serialized_value, token, expire=expire, noreply=False))
+    except (TypeError, MemcacheError) as e:
+        print(f"\033[91mError replacing cache key '{key}': {e}\033[0m")
+        return False
+
+def delete_from_cache(key: str):
+    """Removes a key from the cache, if present."""
+    client = _get_client()
+    if not client:
+        return
+
+    try:
+        client.delete(key, noreply=False)
+    except MemcacheError as e:
+        print(f"\033[91mError deleting cache key '{key}': {e}\033[0m")
+
+def get_many_from_cache(keys: List[str]) -> Dict[str, Any]:
+    """Retrieves several items in one round trip. Keys that are not cached are absent from the result."""
+    client = _get_client()
+    if not client or not keys:
+        return {}
+
+    try:
+        cached_values = client.get_many(keys)
+        return {key: json.loads(value.decode('utf-8')) for key, value in cached_values.items() if value}
+    except (json.JSONDecodeError, MemcacheError) as e:
+        print(f"\033[91mError getting or decoding {len(keys)} cache keys: {e}\033[0m")
+        return {}
+
+def set_many_to_cache(values: Dict[str, Any], expire: int = 60):
+    """Stores several items in one round trip."""
+    client = _get_client()
+    if not client or not values:
+        return
+
+    try:
+        serialized_values = {
+            key: json.dumps(value, default=_encode_default).encode('utf-8') for key, value in values.items()
+        }
+        client.set_many(serialized_values, expire=expire)
+    except (TypeError, MemcacheError) as e:
+        print(f"\033[91mError setting {len(values)} cache keys: {e}\033[0m")
+
+def delete_many_from_cache(keys: List[str]):
+    """Removes several keys from the cache, if present."""
+    client = _get_client()
+    if not client or not keys:
+        return
+
+    try:
+        client.delete_many(keys, noreply=False)
+    except MemcacheError as e:
+        print(f"\033[91mError deleting {len(keys)} cache keys: {e}\033[0m")
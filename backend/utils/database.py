@@ -2,8 +2,13 @@
 import os
 import boto3
 from boto3.dynamodb.conditions import Key, Attr
+from botocore.exceptions import ClientError
 from typing import Dict, Any, Union, List
 from uuid import UUID
+from decimal import Decimal
+
+from utils.cache_client import get_from_cache, get_many_from_cache, set_many_to_cache
+from utils.cache_client import delete_from_cache, delete_many_from_cache
 
 # --- DynamoDB Setup ---
 # Using an environment variable for the prefix is a good practice for production
@@ -15,6 +20,19 @@ dynamodb = boto3.resource('dynamodb', region_name=AWS_REGION)
 USERS_TABLE = dynamodb.Table(f"{STUDENT_ID_PREFIX}users")
 MEDIA_ITEMS_TABLE = dynamodb.Table(f"{STUDENT_ID_PREFIX}media_items")
 FILTER_ITEMS_TABLE = dynamodb.Table(f"{STUDENT_ID_PREFIX}filter_items")
+JOBS_TABLE = dynamodb.Table(f"{STUDENT_ID_PREFIX}jobs")
+
+# --- Item Cache ---
+# Media and filter items hardly change once written, so lookups by ID read through Memcached and only
+# go to DynamoDB on a miss. Entries are refreshed whenever an item is written or listed, and dropped
+# when it is updated or deleted. Missing items are not cached: the worker creates processed items.
+ITEM_CACHE_TTL_SECONDS = int(os.getenv("ITEM_CACHE_TTL_SECONDS", "3600"))
+MEDIA_CACHE_PREFIX = "media-item:"
+FILTER_CACHE_PREFIX = "filter-item:"
+
+def _cache_items(cache_prefix: str, items: List[Dict[str, Any]]):
+    """Stores items in the item cache under their IDs."""
+    set_many_to_cache({f"{cache_prefix}{item['id']}": item for item in items}, expire=ITEM_CACHE_TTL_SECONDS)
 
 # --- User Functions ---
 
@@ -41,13 +59,57 @@ def get_user_by_username(username: str) -> Union[Dict[str, Any], None]:
 # --- Media Item Functions ---
 
 def get_media_by_id(media_id: UUID) -> Union[Dict[str, Any], None]:
-    """Retrieves a single media item by its ID from DynamoDB."""
+    """Retrieves a single media item by its ID, from the item cache or else DynamoDB."""
+    cached_item = get_from_cache(f"{MEDIA_CACHE_PREFIX}{media_id}")
+    if cached_item is not None:
+        return cached_item
     try:
         response = MEDIA_ITEMS_TABLE.get_item(Key={'id': str(media_id)})
-        return response.get('Item')
     except Exception as e:
         print(f"Error getting media item {media_id}: {e}")
         return None
+    item = response.get('Item')
+    if item:
+        _cache_items(MEDIA_CACHE_PREFIX, [item])
+    return item
+
+# BatchGetItem accepts at most 100 keys per call
+BATCH_GET_MAX_KEYS = 100
+
+def _batch_get_items(table, item_ids: List[UUID], cache_prefix: Union[str, None] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Fetches items by ID with BatchGetItem, chunking keys and retrying unprocessed ones.
+    With a cache prefix, cached items are served from the item cache and the rest are cached once fetched.
+    """
+    unique_ids = list(dict.fromkeys(str(item_id) for item_id in item_ids))
+    found_items = {}
+    if cache_prefix:
+        cached_items = get_many_from_cache([f"{cache_prefix}{item_id}" for item_id in unique_ids])
+        for cached_item in cached_items.values():
+            found_items[cached_item['id']] = cached_item
+        unique_ids = [item_id for item_id in unique_ids if item_id not in found_items]
+
+    for start in range(0, len(unique_ids), BATCH_GET_MAX_KEYS):
+        request_items = {
+            table.name: {'Keys': [{'id': item_id} for item_id in unique_ids[start:start + BATCH_GET_MAX_KEYS]]}
+        }
+        try:
+            while request_items:
+                response = dynamodb.batch_get_item(RequestItems=request_items)
+                for item in response.get('Responses', {}).get(table.name, []):
+                    found_items[item['id']] = item
+                # DynamoDB may return some keys unprocessed when throttled; ask for those again
+                request_items = response.get('UnprocessedKeys') or {}
+        except Exception as e:
+            print(f"Error batch getting items from {table.name}: {e}")
+
+    if cache_prefix:
+        _cache_items(cache_prefix, [found_items[item_id] for item_id in unique_ids if item_id in found_items])
+    return found_items
+
+def batch_get_media_items(media_ids: List[UUID]) -> Dict[str, Dict[str, Any]]:
+    """Retrieves many media items at once, keyed by their ID. Missing IDs are simply absent."""
+    return _batch_get_items(MEDIA_ITEMS_TABLE, media_ids, MEDIA_CACHE_PREFIX)
 
 from datetime import datetime
 
@@ -61,6 +123,8 @@ def _serialize_item_for_dynamodb(obj: Any) -> Any:
         return str(obj)
     if isinstance(obj, datetime):
         return obj.isoformat() # Convert datetime to ISO 8601 string
+    if isinstance(obj, float):
+        return Decimal(str(obj)) # DynamoDB does not accept Python floats
     return obj
 
 def add_media_item(media_item_dict: Dict[str, Any]):
@@ -73,6 +137,19 @@ def add_media_item(media_item_dict: Dict[str, Any]):
         print(f"Error adding media item: {e}")
         # Re-raise to be caught by FastAPI error handling
         raise
+    _cache_items(MEDIA_CACHE_PREFIX, [item_to_add])
+
+def update_media_info(media_id: UUID, media_info: Dict[str, Any]):
+    """Stores probed media information (duration, resolution, cost, ...) on an existing media item."""
+    try:
+        MEDIA_ITEMS_TABLE.update_item(
+            Key={'id': str(media_id)},
+            UpdateExpression="SET media_info = :media_info",
+            ExpressionAttributeValues={':media_info': _serialize_item_for_dynamodb(media_info)}
+        )
+    except Exception as e:
+        print(f"Error updating media info for {media_id}: {e}")
+    delete_from_cache(f"{MEDIA_CACHE_PREFIX}{media_id}")
 
 def get_user_media(user_id: str) -> List[Dict[str, Any]]:
     """Retrieves all media items for a specific user using the GSI."""
@@ -81,10 +158,12 @@ def get_user_media(user_id: str) -> List[Dict[str, Any]]:
             IndexName='OwnerIdIndex',
             KeyConditionExpression=Key('owner_id').eq(user_id)
         )
-        return response.get('Items', [])
     except Exception as e:
         print(f"Error querying user media for {user_id}: {e}")
         return []
+    items = response.get('Items', [])
+    _cache_items(MEDIA_CACHE_PREFIX, items)
+    return items
 
 def delete_user_media(user_id: str) -> List[str]:
     """Finds all media for a user, collects their S3 paths, and deletes the items from DynamoDB."""
@@ -108,19 +187,30 @@ def delete_user_media(user_id: str) -> List[str]:
             print(f"Error batch deleting media items from DynamoDB: {e}")
             # If DB deletion fails, do not return paths to prevent orphaning S3 files
             return []
+        delete_many_from_cache([f"{MEDIA_CACHE_PREFIX}{key['id']}" for key in items_to_delete_keys])
             
     return paths_to_delete
 
 # --- Filter Item Functions ---
 
 def get_filter_by_id(filter_id: UUID) -> Union[Dict[str, Any], None]:
-    """Retrieves a single filter item by its ID from DynamoDB."""
+    """Retrieves a single filter item by its ID, from the item cache or else DynamoDB."""
+    cached_item = get_from_cache(f"{FILTER_CACHE_PREFIX}{filter_id}")
+    if cached_item is not None:
+        return cached_item
     try:
         response = FILTER_ITEMS_TABLE.get_item(Key={'id': str(filter_id)})
-        return response.get('Item')
     except Exception as e:
         print(f"Error getting filter item {filter_id}: {e}")
         return None
+    item = response.get('Item')
+    if item:
+        _cache_items(FILTER_CACHE_PREFIX, [item])
+    return item
+
+def batch_get_filter_items(filter_ids: List[UUID]) -> Dict[str, Dict[str, Any]]:
+    """Retrieves many filter items at once, keyed by their ID. Missing IDs are simply absent."""
+    return _batch_get_items(FILTER_ITEMS_TABLE, filter_ids, FILTER_CACHE_PREFIX)
 
 def add_filter_item(filter_item_dict: Dict[str, Any]):
     """Adds a new filter item to the filter_items table in DynamoDB."""
@@ -130,6 +220,7 @@ def add_filter_item(filter_item_dict: Dict[str, Any]):
     except Exception as e:
         print(f"Error adding filter item: {e}")
         raise
+    _cache_items(FILTER_CACHE_PREFIX, [item_to_add])
 
 def get_filters_for_user(user_id: UUID, **kwargs) -> List[Dict[str, Any]]:
     """Retrieves all default filters plus all filters owned by the specified user."""
@@ -147,8 +238,50 @@ def get_filters_for_user(user_id: UUID, **kwargs) -> List[Dict[str, Any]]:
             FilterExpression=Attr('owner_id').eq(str(user_id))
         )
         visible_filters.extend(custom_filters_response.get('Items', []))
-        
-        return visible_filters
     except Exception as e:
         print(f"Error getting filters for user {user_id}: {e}")
         return []
+    _cache_items(FILTER_CACHE_PREFIX, visible_filters)
+    return visible_filters
+
+# --- Job Functions ---
+
+def add_job_items(job_dicts: List[Dict[str, Any]]):
+    """Adds job records to the jobs table, batching the writes when there are several."""
+    try:
+        with JOBS_TABLE.batch_writer() as batch:
+            for job_dict in job_dicts:
+                batch.put_item(Item=_serialize_item_for_dynamodb(job_dict))
+    except Exception as e:
+        print(f"Error adding job items: {e}")
+        raise
+
+def fail_queued_job(job_id: UUID, error: str):
+    """
+    Marks a job whose message could not be sent as failed, so it does not stay "queued" forever.
+    Left alone if a worker already picked it up (the send may have gone through) or it was never written.
+    """
+    try:
+        JOBS_TABLE.update_item(
+            Key={'id': str(job_id)},
+            UpdateExpression="SET #status = :status, #error = :error, updated_at = :updated_at",
+            ConditionExpression=Attr('status').eq('queued'),
+            ExpressionAttributeNames={'#status': 'status', '#error': 'error'}, # "status" is a reserved word
+            ExpressionAttributeValues={':status': 'failed', ':error': error, ':updated_at': datetime.utcnow().isoformat()}
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            print(f"Error marking job {job_id} as failed: {e}")
+
+def get_job_by_id(job_id: UUID) -> Union[Dict[str, Any], None]:
+    """Retrieves a single job by its ID from DynamoDB."""
+    try:
+        response = JOBS_TABLE.get_item(Key={'id': str(job_id)})
+        return response.get('Item')
+    except Exception as e:
+        print(f"Error getting job {job_id}: {e}")
+        return None
+
+def batch_get_job_items(job_ids: List[UUID]) -> Dict[str, Dict[str, Any]]:
+    """Retrieves many jobs at once, keyed by their ID. Missing IDs are simply absent."""
+    return _batch_get_items(JOBS_TABLE, job_ids)
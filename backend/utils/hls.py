@@ -0,0 +1,50 @@
+import re
+import posixpath
+from typing import Callable, Optional
+
+# Processed videos written as HLS store the S3 key of their master playlist as storage_path
+HLS_MEDIA_TYPE = "application/vnd.apple.mpegurl"
+PLAYLIST_SUFFIX = ".m3u8"
+
+_MAP_URI = re.compile(r'(#EXT-X-MAP:.*URI=")([^"]+)(")')
+
+
+def is_hls_media(media_item: dict) -> bool:
+    return media_item.get("media_type") == HLS_MEDIA_TYPE
+
+
+def hls_prefix(storage_path: str) -> str:
+    """The S3 prefix holding every playlist and segment of an HLS output."""
+    return f"{posixpath.dirname(storage_path)}/"
+
+
+def resolve_playlist_key(storage_path: str, playlist_path: str) -> Optional[str]:
+    """S3 key of a playlist requested relative to the master playlist; None if it escapes the output's prefix."""
+    prefix = hls_prefix(storage_path)
+    key = posixpath.normpath(posixpath.join(prefix, playlist_path))
+    if not key.startswith(prefix) or not key.endswith(PLAYLIST_SUFFIX):
+        return None
+    return key
+
+
+def rewrite_playlist(text: str, playlist_key: str, sign: Callable[[str], str]) -> str:
+    """
+    Points the segments and init sections of a playlist at pre-signed S3 URLs (`sign` maps a key to a URL).
+    References to other playlists stay relative, so players request them through the API as well.
+    """
+    base = posixpath.dirname(playlist_key)
+
+    def signed(uri: str) -> str:
+        if "://" in uri:
+            return uri
+        return sign(posixpath.normpath(posixpath.join(base, uri)))
+
+    lines = []
+    for line in text.splitlines():
+        stripped = line.strip()
+        if stripped.startswith("#EXT-X-MAP:"):
+            line = _MAP_URI.sub(lambda m: f"{m.group(1)}{signed(m.group(2))}{m.group(3)}", line)
+        elif stripped and not stripped.startswith("#") and not stripped.endswith(PLAYLIST_SUFFIX):
+            line = signed(stripped)
+        lines.append(line)
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,65 @@
+import os
+import asyncio
+from typing import Dict, Optional, Set, Tuple
+
+from utils.database import batch_get_job_items
+
+# How often the watcher re-reads the jobs that have open event streams
+JOB_EVENTS_POLL_SECONDS = float(os.getenv("JOB_EVENTS_POLL_SECONDS", "1"))
+TERMINAL_JOB_STATUSES = ("completed", "failed")
+
+
+class JobWatcher:
+    """
+    Pushes job changes to the event streams open in this API process. One background task
+    reads every watched job with a single BatchGetItem per interval and hands changed jobs to
+    their subscribers, so database load depends on the number of API processes, not on the
+    number of clients following jobs. The task only runs while somebody is subscribed.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._versions: Dict[str, Tuple] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _version(job: Dict) -> Tuple:
+        return job.get("status"), job.get("progress"), job.get("updated_at")
+
+    def subscribe(self, job_id: str, job: Optional[Dict] = None) -> asyncio.Queue:
+        """
+        Starts pushing changes of a job to a new queue. `job` is the state the subscriber already
+        has; it is not pushed again unless the job has moved on since other subscribers last saw it.
+        """
+        queue = asyncio.Queue()
+        self._subscribers.setdefault(job_id, set()).add(queue)
+        if job is not None:
+            self._versions.setdefault(job_id, self._version(job))
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return queue
+
+    def unsubscribe(self, job_id: str, queue: asyncio.Queue):
+        queues = self._subscribers.get(job_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[job_id]
+            self._versions.pop(job_id, None)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while self._subscribers:
+            jobs = await loop.run_in_executor(None, batch_get_job_items, list(self._subscribers))
+            for job_id, job in jobs.items():
+                version = self._version(job)
+                if self._versions.get(job_id) == version:
+                    continue
+                self._versions[job_id] = version
+                for queue in self._subscribers.get(job_id, ()):
+                    queue.put_nowait(job)
+            await asyncio.sleep(JOB_EVENTS_POLL_SECONDS)
+
+
+job_watcher = JobWatcher()
@@ -0,0 +1,120 @@
+import os
+import json
+import time
+import hashlib
+from typing import Dict, Optional
+
+from utils.cache_client import (
+    add_to_cache, get_from_cache, gets_from_cache, cas_to_cache, set_to_cache, delete_from_cache
+)
+from utils.database import get_job_by_id
+from utils.job_events import TERMINAL_JOB_STATUSES
+
+# --- In-Flight Job Registry --- #
+# Double clicks, client retries and several open tabs submit the same job more than once. Each
+# submission claims its request fingerprint in Memcached (an atomic `add`); while the job holding
+# the claim is still queued or running, identical submissions get that job's ID back instead of a
+# new encode. Once that job has finished, the next submission takes the claim over with a
+# check-and-set, so only one of several concurrent submissions wins it. Clients may also send an
+# `Idempotency-Key` header: a key is bound to the first job submitted with it and replays that job
+# (finished or not) for IDEMPOTENCY_TTL_SECONDS.
+# Without Memcached nothing is coalesced.
+IN_FLIGHT_TTL_SECONDS = int(os.getenv("IN_FLIGHT_TTL_SECONDS", "3600"))
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(24 * 3600)))
+IDEMPOTENCY_HEADER = "idempotency-key"
+# A claim whose job record does not exist yet is treated as in flight for this long after it was
+# taken, which covers the time between claiming and writing the record
+CLAIM_SUBMIT_GRACE_SECONDS = int(os.getenv("CLAIM_SUBMIT_GRACE_SECONDS", "30"))
+CLAIM_ATTEMPTS = 3
+
+# Message fields that differ between otherwise identical submissions
+_UNIQUE_MESSAGE_FIELDS = ("job_id", "s3_output_key", "profile", "estimated_cost")
+
+
+def request_fingerprint(message_body: Dict) -> str:
+    """Identifies a job by everything the worker is asked to do: user, media, looks and output options."""
+    fields = {key: value for key, value in message_body.items() if key not in _UNIQUE_MESSAGE_FIELDS}
+    return hashlib.sha256(json.dumps(fields, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def _in_flight_key(fingerprint: str) -> str:
+    return f"inflight-job:{fingerprint}"
+
+
+def _idempotency_cache_key(user_id: str, idempotency_key: str) -> str:
+    digest = hashlib.sha256(f"{user_id}:{idempotency_key}".encode("utf-8")).hexdigest()
+    return f"idempotency-key:{digest}"
+
+
+def _as_claim(claim) -> Dict:
+    # Claims written before they recorded their time hold only the job ID
+    return {"job_id": claim, "claimed_at": 0} if isinstance(claim, str) else claim
+
+
+def _claim_holder(claim: Dict, now: float) -> Optional[str]:
+    """The job a live claim still belongs to, or None when the claim can be taken over."""
+    existing_job = get_job_by_id(claim["job_id"])
+    if existing_job is None:
+        # The claiming request writes its job record just after claiming; until it has had time to,
+        # a missing record means the job is being submitted, not that it never was
+        return claim["job_id"] if now - claim["claimed_at"] < CLAIM_SUBMIT_GRACE_SECONDS else None
+    return claim["job_id"] if existing_job.get("status") not in TERMINAL_JOB_STATUSES else None
+
+
+def claim_in_flight(fingerprint: str, job_id: str) -> Optional[str]:
+    """
+    Claims a fingerprint for a new job. Returns the ID of the identical job still in flight,
+    or None when the caller's job holds the claim and should be submitted.
+    """
+    key = _in_flight_key(fingerprint)
+    for _ in range(CLAIM_ATTEMPTS):
+        now = time.time()
+        new_claim = {"job_id": job_id, "claimed_at": now}
+        if add_to_cache(key, new_claim, expire=IN_FLIGHT_TTL_SECONDS):
+            return None
+        claim, token = gets_from_cache(key)
+        if claim is None:
+            continue # Released or expired since the add: claim it afresh
+        existing_job_id = _claim_holder(_as_claim(claim), now)
+        if existing_job_id:
+            return existing_job_id
+        # The previous job finished (or its submission failed): this one takes over the claim,
+        # unless another request took it over first
+        if cas_to_cache(key, new_claim, token, expire=IN_FLIGHT_TTL_SECONDS):
+            return None
+    # Lost every race: join whichever request holds the claim now
+    claim = get_from_cache(key)
+    return _as_claim(claim)["job_id"] if claim else None
+
+
+class IdempotencyKeyReused(ValueError):
+    """An idempotency key was sent again with a different request."""
+
+
+def claim_job(fingerprint: str, job_id: str, user_id: str, idempotency_key: Optional[str] = None) -> Optional[str]:
+    """
+    Claims a new job's fingerprint and idempotency key. Returns the ID of the earlier job to hand back
+    instead, or None when the new job should be submitted. Raises IdempotencyKeyReused when the key
+    belongs to a different request.
+    """
+    if idempotency_key:
+        key = _idempotency_cache_key(user_id, idempotency_key)
+        if not add_to_cache(key, {"job_id": job_id, "fingerprint": fingerprint}, expire=IDEMPOTENCY_TTL_SECONDS):
+            binding = get_from_cache(key)
+            if binding:
+                if binding["fingerprint"] != fingerprint:
+                    raise IdempotencyKeyReused("Idempotency-Key was already used for a different request.")
+                return binding["job_id"]
+    existing_job_id = claim_in_flight(fingerprint, job_id)
+    if existing_job_id and idempotency_key:
+        # The key replays the job this request was coalesced into
+        set_to_cache(_idempotency_cache_key(user_id, idempotency_key),
+                     {"job_id": existing_job_id, "fingerprint": fingerprint}, expire=IDEMPOTENCY_TTL_SECONDS)
+    return existing_job_id
+
+
+def release_claims(fingerprint: str, user_id: Optional[str] = None, idempotency_key: Optional[str] = None):
+    """Drops a job's claims after its submission failed, so the request can be retried."""
+    delete_from_cache(_in_flight_key(fingerprint))
+    if idempotency_key:
+        delete_from_cache(_idempotency_cache_key(user_id, idempotency_key))
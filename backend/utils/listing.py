@@ -0,0 +1,103 @@
+import os
+import gzip
+import hashlib
+from typing import Any, Dict, List, Optional, Type
+
+import orjson
+from fastapi import Request, Response
+from pydantic import BaseModel
+
+from utils.cache_client import get_from_cache, set_to_cache, delete_from_cache, _encode_default
+
+# --- Listing Responses --- #
+# Listings are built from the stored items as plain dicts (each item was validated by its model
+# when it was written) and encoded once with orjson, instead of constructing and re-serializing a
+# model per item. Every listing carries a weak ETag derived from its content, shared by its gzip and
+# identity encodings (which are equivalent, so If-None-Match is compared weakly). The ETags of a user's
+# listings are kept in Memcached, so a client revalidating with If-None-Match gets a 304 without
+# the listing being read from DynamoDB, as long as the cached ETag is current. ETags are dropped
+# when the API changes a listing; changes made by the worker (new processed media) show up once
+# LISTING_ETAG_TTL_SECONDS has passed.
+LISTING_ETAG_TTL_SECONDS = int(os.getenv("LISTING_ETAG_TTL_SECONDS", "15"))
+# Bodies at least this large are gzip-compressed for clients that accept it
+LISTING_COMPRESS_MIN_BYTES = int(os.getenv("LISTING_COMPRESS_MIN_BYTES", "2048"))
+LISTING_COMPRESS_LEVEL = 5
+
+
+def lean_items(items: List[Dict[str, Any]], model: Type[BaseModel]) -> List[Dict[str, Any]]:
+    """
+    Stored items in the shape `model` serializes to (its fields, under their serialization aliases),
+    without validating each item again. Fields missing from an item get their static default; those
+    without one (required, or from a default factory such as a timestamp) are left out, so a
+    listing's content, and its ETag, only change when its items do.
+    """
+    fields = [
+        (name, field.serialization_alias or name, not field.is_required() and field.default_factory is None, field.default)
+        for name, field in model.model_fields.items()
+    ]
+    return [
+        {key: item.get(name, default) for name, key, has_static_default, default in fields if has_static_default or name in item}
+        for item in items
+    ]
+
+
+def _etags_key(user_id: str, listing: str) -> str:
+    return f"listing-etags:{listing}:{user_id}"
+
+
+def _opaque_tag(etag: str) -> str:
+    return etag[2:] if etag.startswith("W/") else etag
+
+
+def _matches(request: Request, etag: str) -> bool:
+    # Weak comparison: the tags match whether or not either side is marked weak
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidates = [_opaque_tag(candidate.strip()) for candidate in if_none_match.split(",")]
+    return "*" in candidates or _opaque_tag(etag) in candidates
+
+
+def _headers(etag: str) -> Dict[str, str]:
+    # Clients must revalidate each time; the ETag makes that cheap
+    return {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Authorization, Accept-Encoding"}
+
+
+def not_modified(request: Request, user_id: str, listing: str, variant: str = "") -> Optional[Response]:
+    """A 304 when the client's copy matches the cached ETag of the listing, or None to build the listing."""
+    if not request.headers.get("if-none-match"):
+        return None
+    etags = get_from_cache(_etags_key(user_id, listing)) or {}
+    etag = etags.get(variant)
+    if etag and _matches(request, etag):
+        return Response(status_code=304, headers=_headers(etag))
+    return None
+
+
+def listing_response(request: Request, user_id: str, listing: str, payload: Any, variant: str = "") -> Response:
+    """
+    Encodes a listing, records its ETag for later revalidations, and returns it (or a 304 when the
+    client already has it), gzip-compressed when it is large and the client accepts gzip.
+    `variant` distinguishes versions of one listing, such as its pages.
+    """
+    body = orjson.dumps(payload, default=_encode_default)
+    etag = f'W/"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+    etags_key = _etags_key(user_id, listing)
+    etags = get_from_cache(etags_key) or {}
+    if etags.get(variant) != etag:
+        etags[variant] = etag
+        set_to_cache(etags_key, etags, expire=LISTING_ETAG_TTL_SECONDS)
+
+    headers = _headers(etag)
+    if _matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    if len(body) >= LISTING_COMPRESS_MIN_BYTES and "gzip" in request.headers.get("accept-encoding", ""):
+        body = gzip.compress(body, compresslevel=LISTING_COMPRESS_LEVEL)
+        headers["Content-Encoding"] = "gzip"
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def invalidate_listing(user_id: str, listing: str):
+    """Forgets the ETags of a user's listing after it changed, so revalidations rebuild it."""
+    delete_from_cache(_etags_key(user_id, listing))
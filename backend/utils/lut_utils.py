@@ -0,0 +1,170 @@
+import os
+import sys
+import struct
+import hashlib
+from array import array
+from dataclasses import dataclass
+from typing import Iterable, Tuple
+
+# --- Limits for uploaded .cube files --- #
+MIN_LUT_3D_SIZE = 2
+MAX_LUT_3D_SIZE = int(os.getenv("MAX_LUT_3D_SIZE", "65"))
+MAX_LUT_FILE_BYTES = int(os.getenv("MAX_LUT_FILE_BYTES", str(32 * 1024 ** 2)))
+
+# --- Compiled sidecar format --- #
+# Header (32 bytes, so the data that follows is float-aligned): magic, version, padding, grid size,
+# domain min (3 x f32), domain max (3 x f32). Then size^3 RGB triplets as little-endian float32
+# in .cube order (red changes fastest).
+COMPILED_LUT_MAGIC = b"LUT3"
+COMPILED_LUT_VERSION = 1
+COMPILED_LUT_HEADER = struct.Struct("<4sBxH3f3f")
+COMPILED_LUT_SUFFIX = ".lut3d"
+
+# --- LUT analysis --- #
+# Largest per-channel difference still treated as "the same". Workers apply uploaded LUTs by the class
+# computed here and do not re-analyze them, so this classification is the only one for uploaded filters.
+LUT_ANALYSIS_TOLERANCE = float(os.getenv("LUT_ANALYSIS_TOLERANCE", str(1 / 255)))
+LUT_CLASS_IDENTITY = "identity"
+LUT_CLASS_SEPARABLE = "separable"
+LUT_CLASS_3D = "3d"
+
+
+class LutValidationError(ValueError):
+    """Raised when an uploaded .cube file is malformed or too large."""
+
+
+@dataclass
+class ParsedLut:
+    size: int
+    domain_min: Tuple[float, float, float]
+    domain_max: Tuple[float, float, float]
+    values: array  # float32, size^3 * 3 entries
+    content_hash: str
+
+
+def _parse_triplet(parts, line_number: int) -> Tuple[float, float, float]:
+    if len(parts) != 3:
+        raise LutValidationError(f"Line {line_number}: expected 3 values, got {len(parts)}.")
+    try:
+        return float(parts[0]), float(parts[1]), float(parts[2])
+    except ValueError:
+        raise LutValidationError(f"Line {line_number}: values must be numbers.")
+
+
+def parse_cube_stream(lines: Iterable[bytes]) -> ParsedLut:
+    """
+    Parses a 3D .cube LUT line by line, so the file never has to be held in memory as text.
+    Checks LUT_3D_SIZE, DOMAIN_MIN/DOMAIN_MAX and that exactly size^3 entries follow.
+
+    Raises:
+        LutValidationError: If the file is not a valid 3D LUT within the configured limits.
+    """
+    digest = hashlib.sha256()
+    total_bytes = 0
+    size = None
+    domain_min = (0.0, 0.0, 0.0)
+    domain_max = (1.0, 1.0, 1.0)
+    values = array('f')
+    expected_entries = None
+
+    for line_number, raw_line in enumerate(lines, start=1):
+        digest.update(raw_line)
+        total_bytes += len(raw_line)
+        if total_bytes > MAX_LUT_FILE_BYTES:
+            raise LutValidationError(f"LUT file is larger than {MAX_LUT_FILE_BYTES} bytes.")
+
+        line = raw_line.decode('utf-8', errors='replace').strip()
+        if not line or line.startswith('#'):
+            continue
+
+        parts = line.split()
+        keyword = parts[0].upper()
+        if keyword == 'TITLE':
+            continue
+        if keyword == 'LUT_1D_SIZE':
+            raise LutValidationError("1D LUTs are not supported. Please upload a 3D .cube LUT.")
+        if keyword == 'LUT_3D_SIZE':
+            if size is not None:
+                raise LutValidationError(f"Line {line_number}: LUT_3D_SIZE is declared twice.")
+            try:
+                size = int(parts[1])
+            except (IndexError, ValueError):
+                raise LutValidationError(f"Line {line_number}: invalid LUT_3D_SIZE.")
+            if not MIN_LUT_3D_SIZE <= size <= MAX_LUT_3D_SIZE:
+                raise LutValidationError(f"LUT_3D_SIZE must be between {MIN_LUT_3D_SIZE} and {MAX_LUT_3D_SIZE}, got {size}.")
+            expected_entries = size ** 3
+            continue
+        if keyword == 'DOMAIN_MIN':
+            domain_min = _parse_triplet(parts[1:], line_number)
+            continue
+        if keyword == 'DOMAIN_MAX':
+            domain_max = _parse_triplet(parts[1:], line_number)
+            continue
+        if keyword.isalpha() or '_' in keyword:
+            # Other keywords (e.g. LUT_3D_INPUT_RANGE from some tools) are ignored
+            continue
+
+        if expected_entries is None:
+            raise LutValidationError(f"Line {line_number}: data found before LUT_3D_SIZE.")
+        if len(values) >= expected_entries * 3:
+            raise LutValidationError(f"LUT has more than the {expected_entries} entries declared by LUT_3D_SIZE.")
+        values.extend(_parse_triplet(parts, line_number))
+
+    if size is None:
+        raise LutValidationError("Missing LUT_3D_SIZE. Only 3D .cube LUTs are supported.")
+    if len(values) != expected_entries * 3:
+        raise LutValidationError(f"LUT has {len(values) // 3} entries, expected {expected_entries} for LUT_3D_SIZE {size}.")
+    if any(low >= high for low, high in zip(domain_min, domain_max)):
+        raise LutValidationError("DOMAIN_MIN must be lower than DOMAIN_MAX for every channel.")
+
+    return ParsedLut(
+        size=size,
+        domain_min=domain_min,
+        domain_max=domain_max,
+        values=values,
+        content_hash=digest.hexdigest(),
+    )
+
+
+def compile_lut(lut: ParsedLut) -> bytes:
+    """Serializes a parsed LUT to the compiled sidecar format loaded by the media worker."""
+    values = array('f', lut.values)
+    if sys.byteorder == 'big':
+        values.byteswap() # The format is little-endian
+    header = COMPILED_LUT_HEADER.pack(
+        COMPILED_LUT_MAGIC, COMPILED_LUT_VERSION, lut.size, *lut.domain_min, *lut.domain_max
+    )
+    return header + values.tobytes()
+
+
+def classify_lut(lut: ParsedLut, tolerance: float = LUT_ANALYSIS_TOLERANCE) -> str:
+    """
+    Classifies a LUT as identity, per-channel separable (three 1D curves stored as a cube) or 3d.
+    Stored on the filter record; workers trust it to pick a cheaper pipeline and do not re-analyze.
+    """
+    if lut.domain_min != (0.0, 0.0, 0.0) or lut.domain_max != (1.0, 1.0, 1.0):
+        return LUT_CLASS_3D
+
+    n = lut.size
+    values = lut.values
+    curves = [
+        [values[i * 3] for i in range(n)],
+        [values[(i * n) * 3 + 1] for i in range(n)],
+        [values[(i * n * n) * 3 + 2] for i in range(n)],
+    ]
+
+    is_identity = True
+    index = 0
+    for b in range(n):
+        for g in range(n):
+            for r in range(n):
+                red, green, blue = values[index], values[index + 1], values[index + 2]
+                index += 3
+                if (abs(red - curves[0][r]) > tolerance or abs(green - curves[1][g]) > tolerance
+                        or abs(blue - curves[2][b]) > tolerance):
+                    return LUT_CLASS_3D
+                if is_identity and (abs(red - r / (n - 1)) > tolerance or abs(green - g / (n - 1)) > tolerance
+                                    or abs(blue - b / (n - 1)) > tolerance):
+                    is_identity = False
+
+    return LUT_CLASS_IDENTITY if is_identity else LUT_CLASS_SEPARABLE
@@ -0,0 +1,128 @@
+import os
+import json
+import subprocess
+from typing import Optional, Dict, Any
+
+from botocore.exceptions import ClientError
+
+from utils.s3_client import s3_client, S3_BUCKET_NAME, create_presigned_url
+
+# Only the head of a file is probed. Most containers keep their stream headers there;
+# MP4 files with the `moov` atom at the end fall back to probing through a pre-signed URL.
+PROBE_BYTES = int(os.getenv("PROBE_BYTES", str(1024 * 1024)))
+PROBE_TIMEOUT_SECONDS = 15
+
+# A still image costs about the same to grade as one frame of video
+IMAGE_EQUIVALENT_SECONDS = 1 / 30
+# Rough worker throughput used to turn a cost into an ETA (1080p at ~2x realtime)
+PIXEL_SECONDS_PER_SECOND = float(os.getenv("PIXEL_SECONDS_PER_SECOND", "4000000"))
+JOB_OVERHEAD_SECONDS = 2.0
+
+
+def _run_ffprobe(source: str, data: Optional[bytes] = None) -> Optional[Dict[str, Any]]:
+    """Runs ffprobe on a path/URL, or on raw bytes piped to stdin when `data` is given."""
+    command = [
+        'ffprobe',
+        '-v', 'error',
+        '-print_format', 'json',
+        '-show_format',
+        '-show_streams',
+        '-select_streams', 'v:0',
+        source
+    ]
+    try:
+        result = subprocess.run(
+            command,
+            input=data,
+            check=True,
+            capture_output=True,
+            timeout=PROBE_TIMEOUT_SECONDS
+        )
+        return json.loads(result.stdout.decode('utf-8'))
+    except FileNotFoundError:
+        print("Error: 'ffprobe' command not found. Media probing is disabled.")
+        return None
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired, json.JSONDecodeError) as e:
+        print(f"ffprobe failed for {source}: {e}")
+        return None
+
+
+def _parse_frame_rate(rate: Optional[str]) -> Optional[float]:
+    """Parses ffprobe's fractional frame rate (e.g. '30000/1001')."""
+    if not rate:
+        return None
+    try:
+        numerator, _, denominator = rate.partition('/')
+        value = float(numerator) / float(denominator or 1)
+        return round(value, 3) if value > 0 else None
+    except (ValueError, ZeroDivisionError):
+        return None
+
+
+def _parse_probe_output(probe: Dict[str, Any], media_type: str) -> Optional[Dict[str, Any]]:
+    """Turns raw ffprobe JSON into the media_info record stored on a media item."""
+    streams = probe.get("streams") or []
+    if not streams:
+        return None
+    stream = streams[0]
+    width = stream.get("width")
+    height = stream.get("height")
+    if not width or not height:
+        return None
+
+    duration = None
+    for raw_duration in (stream.get("duration"), probe.get("format", {}).get("duration")):
+        try:
+            duration = round(float(raw_duration), 3)
+            break
+        except (TypeError, ValueError):
+            continue
+
+    is_video = "video" in media_type
+    if is_video and not duration:
+        # A video without a duration cannot be costed; let the caller try a fuller probe
+        return None
+
+    pixel_count = int(width) * int(height)
+    seconds = duration if is_video else IMAGE_EQUIVALENT_SECONDS
+    return {
+        "duration": duration if is_video else None,
+        "width": int(width),
+        "height": int(height),
+        "frame_rate": _parse_frame_rate(stream.get("avg_frame_rate")) if is_video else None,
+        "codec": stream.get("codec_name"),
+        "pixel_count": pixel_count,
+        "estimated_cost": round(pixel_count * seconds, 1),
+    }
+
+
+def probe_media_bytes(data: bytes, media_type: str) -> Optional[Dict[str, Any]]:
+    """Probes the first bytes of a media file that are already in memory (e.g. during upload)."""
+    probe = _run_ffprobe('pipe:0', data=data[:PROBE_BYTES])
+    return _parse_probe_output(probe, media_type) if probe else None
+
+
+def probe_s3_object(object_key: str, media_type: str) -> Optional[Dict[str, Any]]:
+    """
+    Probes a media file stored in S3 from a ranged GET of its first PROBE_BYTES.
+    If the header is not at the start of the file, ffprobe reads it through a pre-signed URL instead,
+    which still only fetches the byte ranges it needs.
+    """
+    try:
+        response = s3_client.get_object(Bucket=S3_BUCKET_NAME, Key=object_key, Range=f"bytes=0-{PROBE_BYTES - 1}")
+        media_info = probe_media_bytes(response["Body"].read(), media_type)
+    except ClientError as e:
+        print(f"Error reading head of {object_key} from S3: {e}")
+        media_info = None
+
+    if media_info is None:
+        probe = _run_ffprobe(create_presigned_url(object_key, expiration=300))
+        media_info = _parse_probe_output(probe, media_type) if probe else None
+    return media_info
+
+
+def estimate_processing_seconds(media_info: Optional[Dict[str, Any]]) -> Optional[float]:
+    """Estimates how long a worker needs to grade the media, from its probed cost."""
+    if not media_info or media_info.get("estimated_cost") is None:
+        return None
+    return round(JOB_OVERHEAD_SECONDS + float(media_info["estimated_cost"]) / PIXEL_SECONDS_PER_SECOND, 1)
@@ -0,0 +1,91 @@
+import os
+import re
+import sys
+import time
+import random
+import secrets
+import threading
+from collections import Counter
+from types import CodeType, FrameType
+from typing import Dict, Optional
+
+# --- Profiling Configuration --- #
+# Opt-in sampling profiler for finding hot spots in production without redeploying. A fraction of
+# requests (PROFILE_SAMPLE_RATE, 0 disables it) is profiled, plus any request an admin sends with
+# `X-Profile: 1`. While a request is profiled, a background thread samples the stack of the thread
+# handling it every PROFILE_INTERVAL_MS and writes the samples as folded stacks
+# (`frame;frame;frame count`, the input of flamegraph.pl and speedscope) to PROFILE_OUTPUT_DIR,
+# one file per request named after its route.
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL_SECONDS = float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000
+PROFILE_OUTPUT_DIR = os.getenv("PROFILE_OUTPUT_DIR", "/tmp/profiles")
+PROFILE_HEADER = "x-profile"
+
+_UNSAFE_TAG_CHARACTERS = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+def should_profile(requested: bool = False) -> bool:
+    """Whether to profile one request or job: when explicitly requested, else by sampling."""
+    return requested or (PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE)
+
+
+class SamplingProfiler:
+    """
+    Samples the stack of one thread (by default the calling thread) from a background thread.
+    Overhead is one stack walk per interval and nothing in the profiled code itself. For async
+    handlers the event loop thread is sampled, so samples of concurrent requests can show up too.
+    """
+
+    def __init__(self, tag: str, thread_id: Optional[int] = None, interval: float = PROFILE_INTERVAL_SECONDS):
+        self.tag = tag
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self.output_path: Optional[str] = None
+        self._labels: Dict[CodeType, str] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"profiler-{self.tag}", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.output_path = self.write()
+
+    def _label(self, code: CodeType) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            self._labels[code] = label
+        return label
+
+    def _fold(self, frame: Optional[FrameType]) -> str:
+        stack = []
+        while frame is not None:
+            stack.append(self._label(frame.f_code))
+            frame = frame.f_back
+        return ";".join(reversed(stack))
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.samples[self._fold(frame)] += 1
+
+    def write(self) -> Optional[str]:
+        """Writes the folded stacks to PROFILE_OUTPUT_DIR. Returns the file's path, or None if nothing was sampled."""
+        if not self.samples:
+            return None
+        tag = _UNSAFE_TAG_CHARACTERS.sub("_", self.tag).strip("_")
+        path = os.path.join(PROFILE_OUTPUT_DIR, f"{tag}-{time.strftime('%Y%m%dT%H%M%S')}-{secrets.token_hex(3)}.folded")
+        try:
+            os.makedirs(PROFILE_OUTPUT_DIR, exist_ok=True)
+            with open(path, "w") as f:
+                f.writelines(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+        except OSError as e:
+            print(f"Error writing profile {path}: {e}")
+            return None
+        return path
@@ -0,0 +1,111 @@
+import os
+import math
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+
+import boto3
+
+from utils.cache_client import get_from_cache, set_to_cache
+
+# --- Queue Load Configuration --- #
+# The process API reads each queue's backlog (SQS ApproximateNumberOfMessages) and the rate workers
+# have recently been finishing jobs (the queue's NumberOfMessagesDeleted metric in CloudWatch) to
+# tell users roughly when a job will start, and to push back once the backlog passes a limit.
+# Both are cached, in this process and in Memcached, so requests do not query AWS each time.
+QUEUE_STATS_TTL_SECONDS = int(os.getenv("QUEUE_STATS_TTL_SECONDS", "15"))
+THROUGHPUT_TTL_SECONDS = int(os.getenv("THROUGHPUT_TTL_SECONDS", "60"))
+# Throughput is averaged over this trailing window
+THROUGHPUT_WINDOW_SECONDS = int(os.getenv("THROUGHPUT_WINDOW_SECONDS", "900"))
+# Assumed throughput while the metric shows none (idle or freshly scaled workers)
+DEFAULT_JOBS_PER_MINUTE = float(os.getenv("DEFAULT_JOBS_PER_MINUTE", "6"))
+# Waiting jobs at which new submissions are rejected with 429. 0 disables backpressure.
+QUEUE_DEPTH_LIMIT = int(os.getenv("QUEUE_DEPTH_LIMIT", "0"))
+# Low-priority submissions (bulk requests, or priority "low") are turned away earlier
+LOW_PRIORITY_DEPTH_LIMIT = int(os.getenv("LOW_PRIORITY_DEPTH_LIMIT", str(max(1, QUEUE_DEPTH_LIMIT // 2))))
+MAX_RETRY_AFTER_SECONDS = int(os.getenv("MAX_RETRY_AFTER_SECONDS", "600"))
+
+sqs_client = boto3.client('sqs', region_name=os.environ.get('AWS_REGION', 'ap-southeast-2'))
+cloudwatch_client = boto3.client('cloudwatch', region_name=os.environ.get('AWS_REGION', 'ap-southeast-2'))
+
+# queue url + kind -> (expires at, value)
+_local_cache: Dict[str, Tuple[float, Optional[float]]] = {}
+
+
+def _cached(key: str, ttl: int, fetch) -> Optional[float]:
+    """Returns a value from this process's cache, then Memcached, and only then from `fetch`."""
+    now = time.time()
+    entry = _local_cache.get(key)
+    if entry and entry[0] > now:
+        return entry[1]
+    value = get_from_cache(key)
+    if value is None:
+        value = fetch()
+        if value is not None:
+            set_to_cache(key, value, expire=ttl)
+    _local_cache[key] = (now + ttl, value)
+    return value
+
+
+def _fetch_depth(queue_url: str) -> Optional[float]:
+    try:
+        response = sqs_client.get_queue_attributes(
+            QueueUrl=queue_url,
+            AttributeNames=['ApproximateNumberOfMessages', 'ApproximateNumberOfMessagesDelayed']
+        )
+    except Exception as e:
+        print(f"Error reading queue depth of {queue_url}: {e}")
+        return None
+    attributes = response.get('Attributes', {})
+    return float(int(attributes.get('ApproximateNumberOfMessages', 0)) + int(attributes.get('ApproximateNumberOfMessagesDelayed', 0)))
+
+
+def _fetch_jobs_per_minute(queue_url: str) -> Optional[float]:
+    end = datetime.now(timezone.utc)
+    try:
+        response = cloudwatch_client.get_metric_statistics(
+            Namespace='AWS/SQS',
+            MetricName='NumberOfMessagesDeleted',
+            Dimensions=[{'Name': 'QueueName', 'Value': queue_url.rstrip('/').rsplit('/', 1)[-1]}],
+            StartTime=end - timedelta(seconds=THROUGHPUT_WINDOW_SECONDS),
+            EndTime=end,
+            Period=60,
+            Statistics=['Sum'],
+        )
+    except Exception as e:
+        print(f"Error reading worker throughput of {queue_url}: {e}")
+        return None
+    deleted = sum(point['Sum'] for point in response.get('Datapoints', []))
+    return deleted / (THROUGHPUT_WINDOW_SECONDS / 60)
+
+
+def get_queue_load(queue_url: str) -> Optional[Dict[str, float]]:
+    """
+    Waiting jobs ("depth") and recent worker throughput ("jobs_per_minute") of a queue,
+    or None when the depth cannot be read. Missing throughput falls back to DEFAULT_JOBS_PER_MINUTE.
+    """
+    depth = _cached(f"queue-depth:{queue_url}", QUEUE_STATS_TTL_SECONDS, lambda: _fetch_depth(queue_url))
+    if depth is None:
+        return None
+    jobs_per_minute = _cached(f"queue-throughput:{queue_url}", THROUGHPUT_TTL_SECONDS, lambda: _fetch_jobs_per_minute(queue_url))
+    return {"depth": int(depth), "jobs_per_minute": jobs_per_minute or DEFAULT_JOBS_PER_MINUTE}
+
+
+def estimate_wait_seconds(load: Optional[Dict[str, float]]) -> Optional[float]:
+    """Roughly how long a job submitted now waits before a worker starts it."""
+    if load is None:
+        return None
+    return round(load["depth"] / load["jobs_per_minute"] * 60, 1)
+
+
+def retry_after_seconds(load: Optional[Dict[str, float]], priority: str = "normal") -> Optional[int]:
+    """
+    Seconds a rejected submission should wait before retrying, or None to accept it.
+    Submissions are always accepted when backpressure is disabled or the depth is unknown.
+    """
+    limit = LOW_PRIORITY_DEPTH_LIMIT if priority == "low" else QUEUE_DEPTH_LIMIT
+    if not QUEUE_DEPTH_LIMIT or load is None or load["depth"] < limit:
+        return None
+    # Time for the workers to bring the backlog back under the limit
+    excess_jobs = load["depth"] - limit + 1
+    return min(MAX_RETRY_AFTER_SECONDS, max(1, math.ceil(excess_jobs / load["jobs_per_minute"] * 60)))
@@ -90,4 +90,54 @@ def delete_file_from_s3(object_key: str):
         s3_client.delete_object(Bucket=S3_BUCKET_NAME, Key=object_key)
     except ClientError as e:
         print(f"S3 deletion failed: {e}")
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to delete file from S3: {e}")
\ No newline at end of file
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to delete file from S3: {e}")
+def read_text_from_s3(object_key: str) -> str:
+    """
+    Reads a small text object (e.g. an HLS playlist) from S3.
+
+    Raises:
+        HTTPException: 404 if the object does not exist, 500 if the read fails.
+    """
+    if not S3_BUCKET_NAME:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="S3_BUCKET_NAME is not configured.")
+
+    try:
+        response = s3_client.get_object(Bucket=S3_BUCKET_NAME, Key=object_key)
+        return response["Body"].read().decode("utf-8")
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found.")
+        print(f"S3 read failed: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to read file from S3: {e}")
+
+def delete_prefix_from_s3(prefix: str):
+    """
+    Deletes every object under a prefix (e.g. all segments of an HLS output).
+
+    Raises:
+        HTTPException: If listing or deletion fails.
+    """
+    if not S3_BUCKET_NAME:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="S3_BUCKET_NAME is not configured.")
+
+    try:
+        paginator = s3_client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=S3_BUCKET_NAME, Prefix=prefix):
+            keys = [{"Key": obj["Key"]} for obj in page.get("Contents", [])]
+            if keys:
+                # list_objects_v2 pages hold at most 1000 keys, the delete_objects limit
+                s3_client.delete_objects(Bucket=S3_BUCKET_NAME, Delete={"Objects": keys, "Quiet": True})
+    except ClientError as e:
+        print(f"S3 prefix deletion failed: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to delete files from S3: {e}")
+
+def s3_object_exists(object_key: str) -> bool:
+    """Returns True if the object exists (e.g. a cached preview). Errors count as missing."""
+    if not S3_BUCKET_NAME:
+        return False
+
+    try:
+        s3_client.head_object(Bucket=S3_BUCKET_NAME, Key=object_key)
+        return True
+    except ClientError:
+        return False
@@ -116,7 +116,9 @@ function AppView({ handleLogout }) {
       });
       const taskId = processResponse.data.task_id;
       console.log(`Processing initiated. Task ID: ${taskId}`);
-      alert(`Processing initiated. You will be notified when it's complete. Task ID: ${taskId}`);
+      const { estimated_completion_at: estimatedCompletionAt } = processResponse.data;
+      const eta = estimatedCompletionAt ? ` Estimated completion: ${new Date(estimatedCompletionAt).toLocaleTimeString()}.` : '';
+      alert(`Processing initiated. You will be notified when it's complete.${eta} Task ID: ${taskId}`);
 
       // We can't immediately download. The UI should reflect "processing in background"
       // For now, we'll reset to file_selected or a new 'pending' state.
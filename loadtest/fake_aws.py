@@ -0,0 +1,512 @@
+"""
+In-process stand-ins for the AWS services the API and the worker use (S3, SQS, DynamoDB, the SQS
+metrics read from CloudWatch, and the Parameter Store / Secrets Manager lookups done at startup),
+for load-testing on one machine.
+
+install() replaces boto3.client and boto3.resource, so it must run before the API or worker
+modules are imported (they create their clients at import time). Only the calls and expression
+forms this repository uses are implemented; anything else raises NotImplementedError rather than
+silently doing the wrong thing.
+"""
+import io
+import re
+import copy
+import time
+import uuid
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+import boto3
+from botocore.exceptions import ClientError
+
+
+def _client_error(code: str, message: str, operation: str, status: int = 400) -> ClientError:
+    return ClientError({'Error': {'Code': code, 'Message': message}, 'ResponseMetadata': {'HTTPStatusCode': status}},
+                       operation)
+
+
+def _metadata(status: int = 200) -> dict:
+    return {'ResponseMetadata': {'HTTPStatusCode': status, 'RetryAttempts': 0}}
+
+
+# --- S3 --- #
+
+class _Body:
+    def __init__(self, data: bytes):
+        self._stream = io.BytesIO(data)
+
+    def read(self, amount: Optional[int] = None) -> bytes:
+        return self._stream.read(amount)
+
+    def close(self):
+        pass
+
+
+class _ListObjectsPaginator:
+    def __init__(self, s3: "FakeS3"):
+        self._s3 = s3
+
+    def paginate(self, Bucket: str, Prefix: str = '', **kwargs):
+        with self._s3._lock:
+            keys = sorted(key for bucket, key in self._s3._objects if bucket == Bucket and key.startswith(Prefix))
+        for start in range(0, len(keys), 1000):
+            yield {'Contents': [{'Key': key} for key in keys[start:start + 1000]]}
+
+
+class FakeS3:
+    """Objects held in memory, keyed by (bucket, key)."""
+
+    def __init__(self):
+        self._objects: Dict[tuple, dict] = {}
+        self._lock = threading.Lock()
+
+    def _put(self, bucket: str, key: str, data: bytes, content_type: Optional[str] = None):
+        with self._lock:
+            self._objects[(bucket, key)] = {'data': data, 'content_type': content_type or 'binary/octet-stream'}
+
+    def _get(self, bucket: str, key: str, operation: str) -> dict:
+        with self._lock:
+            stored = self._objects.get((bucket, key))
+        if stored is None:
+            raise _client_error('NoSuchKey' if operation == 'GetObject' else '404', f"{key} not found", operation, 404)
+        return stored
+
+    def upload_fileobj(self, Fileobj, Bucket: str, Key: str, ExtraArgs: Optional[dict] = None, **kwargs):
+        self._put(Bucket, Key, Fileobj.read(), (ExtraArgs or {}).get('ContentType'))
+
+    def upload_file(self, Filename: str, Bucket: str, Key: str, ExtraArgs: Optional[dict] = None, **kwargs):
+        with open(Filename, 'rb') as f:
+            self._put(Bucket, Key, f.read(), (ExtraArgs or {}).get('ContentType'))
+
+    def put_object(self, Bucket: str, Key: str, Body=b'', ContentType: Optional[str] = None, **kwargs):
+        data = Body.encode('utf-8') if isinstance(Body, str) else Body
+        self._put(Bucket, Key, data, ContentType)
+        return _metadata()
+
+    def download_file(self, Bucket: str, Key: str, Filename: str, **kwargs):
+        stored = self._get(Bucket, Key, 'HeadObject')
+        with open(Filename, 'wb') as f:
+            f.write(stored['data'])
+
+    def get_object(self, Bucket: str, Key: str, Range: Optional[str] = None, **kwargs):
+        stored = self._get(Bucket, Key, 'GetObject')
+        data = stored['data']
+        if Range:
+            match = re.fullmatch(r'bytes=(\d+)-(\d*)', Range)
+            if match is None:
+                raise NotImplementedError(f"Range {Range!r}")
+            end = int(match.group(2)) + 1 if match.group(2) else len(data)
+            data = data[int(match.group(1)):end]
+        return dict(_metadata(206 if Range else 200), Body=_Body(data), ContentLength=len(data),
+                    ContentType=stored['content_type'])
+
+    def head_object(self, Bucket: str, Key: str, **kwargs):
+        stored = self._get(Bucket, Key, 'HeadObject')
+        return dict(_metadata(), ContentLength=len(stored['data']), ContentType=stored['content_type'])
+
+    def delete_object(self, Bucket: str, Key: str, **kwargs):
+        with self._lock:
+            self._objects.pop((Bucket, Key), None)
+        return _metadata(204)
+
+    def delete_objects(self, Bucket: str, Delete: dict, **kwargs):
+        with self._lock:
+            for obj in Delete.get('Objects', []):
+                self._objects.pop((Bucket, obj['Key']), None)
+        return _metadata()
+
+    def get_paginator(self, operation: str):
+        if operation != 'list_objects_v2':
+            raise NotImplementedError(operation)
+        return _ListObjectsPaginator(self)
+
+    def generate_presigned_url(self, operation: str, Params: dict, ExpiresIn: int = 3600, **kwargs) -> str:
+        # Not fetchable: the harness never hands these to ffmpeg (previews are not load-tested)
+        return f"http://fake-s3.invalid/{Params['Bucket']}/{Params['Key']}"
+
+
+# --- SQS --- #
+
+class FakeSQS:
+    """
+    Standard queues in memory, with visibility timeouts, long polling and the receive count.
+    Records when each message was sent and first received, for queue wait statistics.
+    """
+
+    DEFAULT_VISIBILITY_TIMEOUT = 300
+
+    def __init__(self):
+        self._messages: Dict[str, "OrderedDict[str, dict]"] = {}
+        self._condition = threading.Condition()
+        self.queue_waits: List[float] = [] # Seconds from send to first receive
+        self.deleted_at: Dict[str, List[float]] = {} # Queue URL -> when each message was deleted
+
+    def _queue(self, queue_url: str) -> "OrderedDict[str, dict]":
+        return self._messages.setdefault(queue_url, OrderedDict())
+
+    def send_message(self, QueueUrl: str, MessageBody: str, MessageAttributes: Optional[dict] = None,
+                     DelaySeconds: int = 0, **kwargs):
+        message_id = str(uuid.uuid4())
+        with self._condition:
+            self._queue(QueueUrl)[message_id] = {
+                'MessageId': message_id,
+                'Body': MessageBody,
+                'MD5OfBody': hashlib.md5(MessageBody.encode('utf-8')).hexdigest(),
+                'MessageAttributes': MessageAttributes or {},
+                'sent_at': time.time(),
+                'visible_at': time.time() + DelaySeconds,
+                'receive_count': 0,
+                'receipt_handle': None,
+            }
+            self._condition.notify_all()
+        return dict(_metadata(), MessageId=message_id)
+
+    def send_message_batch(self, QueueUrl: str, Entries: List[dict], **kwargs):
+        successful = []
+        for entry in Entries:
+            response = self.send_message(QueueUrl, entry['MessageBody'], entry.get('MessageAttributes'),
+                                         entry.get('DelaySeconds', 0))
+            successful.append({'Id': entry['Id'], 'MessageId': response['MessageId']})
+        return dict(_metadata(), Successful=successful, Failed=[])
+
+    def _take_visible(self, queue_url: str, limit: int) -> List[dict]:
+        now = time.time()
+        taken = []
+        for message in self._queue(queue_url).values():
+            if len(taken) >= limit:
+                break
+            if message['visible_at'] <= now:
+                if message['receive_count'] == 0:
+                    self.queue_waits.append(now - message['sent_at'])
+                message['receive_count'] += 1
+                message['receipt_handle'] = f"{message['MessageId']}:{message['receive_count']}"
+                message['visible_at'] = now + self.DEFAULT_VISIBILITY_TIMEOUT
+                taken.append(message)
+        return taken
+
+    def receive_message(self, QueueUrl: str, MaxNumberOfMessages: int = 1, WaitTimeSeconds: int = 0,
+                        AttributeNames: Optional[List[str]] = None, MessageAttributeNames: Optional[List[str]] = None,
+                        **kwargs):
+        deadline = time.time() + WaitTimeSeconds
+        with self._condition:
+            taken = self._take_visible(QueueUrl, MaxNumberOfMessages)
+            while not taken and time.time() < deadline:
+                self._condition.wait(timeout=min(0.5, max(deadline - time.time(), 0)))
+                taken = self._take_visible(QueueUrl, MaxNumberOfMessages)
+            messages = []
+            for message in taken:
+                received = {key: message[key] for key in ('MessageId', 'Body', 'MD5OfBody')}
+                received['ReceiptHandle'] = message['receipt_handle']
+                received['Attributes'] = {
+                    'SentTimestamp': str(int(message['sent_at'] * 1000)),
+                    'ApproximateReceiveCount': str(message['receive_count']),
+                }
+                wanted = MessageAttributeNames or []
+                received['MessageAttributes'] = {
+                    name: value for name, value in message['MessageAttributes'].items()
+                    if 'All' in wanted or '.*' in wanted or name in wanted
+                }
+                messages.append(copy.deepcopy(received))
+        return dict(_metadata(), Messages=messages) if messages else _metadata()
+
+    def _find(self, queue_url: str, receipt_handle: str, operation: str) -> dict:
+        message = self._queue(queue_url).get(receipt_handle.split(':', 1)[0])
+        if message is None or message['receipt_handle'] != receipt_handle:
+            raise _client_error('ReceiptHandleIsInvalid', "The receipt handle is not valid", operation)
+        return message
+
+    def delete_message(self, QueueUrl: str, ReceiptHandle: str, **kwargs):
+        with self._condition:
+            message = self._find(QueueUrl, ReceiptHandle, 'DeleteMessage')
+            del self._queue(QueueUrl)[message['MessageId']]
+            self.deleted_at.setdefault(QueueUrl, []).append(time.time())
+        return _metadata()
+
+    def change_message_visibility(self, QueueUrl: str, ReceiptHandle: str, VisibilityTimeout: int, **kwargs):
+        with self._condition:
+            message = self._find(QueueUrl, ReceiptHandle, 'ChangeMessageVisibility')
+            message['visible_at'] = time.time() + VisibilityTimeout
+            self._condition.notify_all()
+        return _metadata()
+
+    def get_queue_attributes(self, QueueUrl: str, AttributeNames: Optional[List[str]] = None, **kwargs):
+        now = time.time()
+        with self._condition:
+            messages = list(self._queue(QueueUrl).values())
+        visible = sum(1 for message in messages if message['visible_at'] <= now)
+        return dict(_metadata(), Attributes={
+            'ApproximateNumberOfMessages': str(visible),
+            'ApproximateNumberOfMessagesNotVisible': str(len(messages) - visible),
+            'ApproximateNumberOfMessagesDelayed': '0',
+        })
+
+
+# --- CloudWatch --- #
+
+class FakeCloudWatch:
+    """The AWS/SQS NumberOfMessagesDeleted metric, computed from the deletions FakeSQS recorded."""
+
+    def __init__(self, sqs: FakeSQS):
+        self._sqs = sqs
+
+    def get_metric_statistics(self, Namespace: str, MetricName: str, Dimensions: List[dict], StartTime, EndTime,
+                              Period: int, Statistics: List[str], **kwargs):
+        if (Namespace, MetricName) != ('AWS/SQS', 'NumberOfMessagesDeleted') or Statistics != ['Sum']:
+            raise NotImplementedError(f"Unsupported metric: {Namespace} {MetricName} {Statistics}")
+        queue_name = next(dimension['Value'] for dimension in Dimensions if dimension['Name'] == 'QueueName')
+        start, end = StartTime.timestamp(), EndTime.timestamp()
+        periods: Dict[int, int] = {}
+        with self._sqs._condition:
+            for queue_url, deletions in self._sqs.deleted_at.items():
+                if queue_url.rstrip('/').rsplit('/', 1)[-1] != queue_name:
+                    continue
+                for deleted_at in deletions:
+                    if start <= deleted_at < end:
+                        period = int((deleted_at - start) // Period)
+                        periods[period] = periods.get(period, 0) + 1
+        datapoints = [
+            {'Timestamp': datetime.fromtimestamp(start + period * Period, timezone.utc), 'Sum': float(count), 'Unit': 'Count'}
+            for period, count in sorted(periods.items())
+        ]
+        return dict(_metadata(), Label=MetricName, Datapoints=datapoints)
+
+    def pending_count(self) -> int:
+        with self._condition:
+            return sum(len(messages) for messages in self._messages.values())
+
+
+# --- DynamoDB --- #
+
+def _to_dynamodb(value):
+    """Mirrors boto3's serializer: numbers come back as Decimal, and floats are rejected."""
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, float):
+        raise TypeError("Float types are not supported. Use Decimal types instead.")
+    if isinstance(value, int):
+        return Decimal(value)
+    if isinstance(value, dict):
+        return {key: _to_dynamodb(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_dynamodb(item) for item in value]
+    return value
+
+
+def _condition_matches(item: dict, condition) -> bool:
+    """Evaluates a boto3.dynamodb.conditions condition (Key(...)/Attr(...) expressions) against an item."""
+    expression = condition.get_expression()
+    operator, values = expression['operator'], expression['values']
+    if operator == 'AND':
+        return all(_condition_matches(item, value) for value in values)
+    if operator == 'OR':
+        return any(_condition_matches(item, value) for value in values)
+    if operator == 'NOT':
+        return not _condition_matches(item, values[0])
+    name = values[0].name
+    if operator == 'attribute_exists':
+        return name in item
+    if operator == 'attribute_not_exists':
+        return name not in item
+    if name not in item:
+        return False
+    actual = item[name]
+    if operator == '=':
+        return actual == _to_dynamodb(values[1])
+    if operator == '<>':
+        return actual != _to_dynamodb(values[1])
+    if operator in ('<', '<=', '>', '>='):
+        other = _to_dynamodb(values[1])
+        return {'<': actual < other, '<=': actual <= other, '>': actual > other, '>=': actual >= other}[operator]
+    if operator == 'begins_with':
+        return str(actual).startswith(values[1])
+    if operator == 'contains':
+        return values[1] in actual
+    if operator == 'BETWEEN':
+        return _to_dynamodb(values[1]) <= actual <= _to_dynamodb(values[2])
+    raise NotImplementedError(f"Condition operator {operator}")
+
+
+_EXISTS_EXPRESSION = re.compile(r'^attribute_(not_)?exists\(\s*(#?\w+)\s*\)$')
+
+
+def _check_condition_expression(item: Optional[dict], expression, names: dict, operation: str):
+    """Supports the condition forms the code uses: boto3 conditions and attribute_(not_)exists(name)."""
+    if expression is None:
+        return
+    if isinstance(expression, str):
+        clauses = [clause.strip() for clause in re.split(r'\s+AND\s+', expression)]
+        satisfied = True
+        for clause in clauses:
+            match = _EXISTS_EXPRESSION.match(clause)
+            if match is None:
+                raise NotImplementedError(f"ConditionExpression {expression!r}")
+            name = names.get(match.group(2), match.group(2))
+            exists = item is not None and name in item
+            satisfied = satisfied and (exists != bool(match.group(1)))
+    else:
+        satisfied = item is not None and _condition_matches(item, expression)
+    if not satisfied:
+        raise _client_error('ConditionalCheckFailedException', "The conditional request failed", operation)
+
+
+class _BatchWriter:
+    def __init__(self, table: "FakeTable"):
+        self._table = table
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def put_item(self, Item: dict):
+        self._table.put_item(Item=Item)
+
+    def delete_item(self, Key: dict):
+        self._table.delete_item(Key=Key)
+
+
+class FakeTable:
+    """A table with a single string hash key named `id`; indexes are served by filtering all items."""
+
+    def __init__(self, name: str):
+        self.name = self.table_name = name
+        self._items: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def get_item(self, Key: dict, **kwargs):
+        with self._lock:
+            item = self._items.get(Key['id'])
+        return dict(_metadata(), Item=copy.deepcopy(item)) if item is not None else _metadata()
+
+    def put_item(self, Item: dict, ConditionExpression=None, ExpressionAttributeNames: Optional[dict] = None, **kwargs):
+        item = _to_dynamodb(Item)
+        with self._lock:
+            _check_condition_expression(self._items.get(item['id']), ConditionExpression,
+                                        ExpressionAttributeNames or {}, 'PutItem')
+            self._items[item['id']] = item
+        return _metadata()
+
+    def delete_item(self, Key: dict, **kwargs):
+        with self._lock:
+            self._items.pop(Key['id'], None)
+        return _metadata()
+
+    def update_item(self, Key: dict, UpdateExpression: str, ExpressionAttributeValues: Optional[dict] = None,
+                    ExpressionAttributeNames: Optional[dict] = None, ConditionExpression=None, **kwargs):
+        names = ExpressionAttributeNames or {}
+        values = _to_dynamodb(ExpressionAttributeValues or {})
+        match = re.fullmatch(r'\s*SET\s+(.+)', UpdateExpression, re.S)
+        if match is None:
+            raise NotImplementedError(f"UpdateExpression {UpdateExpression!r}")
+        with self._lock:
+            existing = self._items.get(Key['id'])
+            _check_condition_expression(existing, ConditionExpression, names, 'UpdateItem')
+            item = existing if existing is not None else dict(Key)
+            updated = {}
+            for assignment in re.split(r',(?![^(]*\))', match.group(1)):
+                target, _, source = assignment.partition('=')
+                target, source = names.get(target.strip(), target.strip()), source.strip()
+                counter = re.fullmatch(r'if_not_exists\(\s*([#\w]+)\s*,\s*(:\w+)\s*\)\s*\+\s*(:\w+)', source)
+                if counter:
+                    current = item.get(names.get(counter.group(1), counter.group(1)), values[counter.group(2)])
+                    updated[target] = current + values[counter.group(3)]
+                elif source.startswith(':'):
+                    updated[target] = values[source]
+                else:
+                    raise NotImplementedError(f"UpdateExpression {UpdateExpression!r}")
+            item.update(updated)
+            self._items[Key['id']] = item
+        if kwargs.get('ReturnValues') == 'UPDATED_NEW':
+            return dict(_metadata(), Attributes=copy.deepcopy(updated))
+        return _metadata()
+
+    def _select(self, condition) -> List[dict]:
+        with self._lock:
+            items = list(self._items.values())
+        return [copy.deepcopy(item) for item in items if condition is None or _condition_matches(item, condition)]
+
+    def query(self, KeyConditionExpression, FilterExpression=None, IndexName: Optional[str] = None, **kwargs):
+        items = [item for item in self._select(KeyConditionExpression)
+                 if FilterExpression is None or _condition_matches(item, FilterExpression)]
+        return dict(_metadata(), Items=items, Count=len(items))
+
+    def scan(self, FilterExpression=None, **kwargs):
+        items = self._select(FilterExpression)
+        return dict(_metadata(), Items=items, Count=len(items))
+
+    def batch_writer(self, **kwargs) -> _BatchWriter:
+        return _BatchWriter(self)
+
+    def item_count(self) -> int:
+        with self._lock:
+            return len(self._items)
+
+
+class FakeDynamoDB:
+    """The boto3 DynamoDB resource: tables are created on first use."""
+
+    def __init__(self):
+        self._tables: Dict[str, FakeTable] = {}
+        self._lock = threading.Lock()
+
+    def Table(self, name: str) -> FakeTable:
+        with self._lock:
+            return self._tables.setdefault(name, FakeTable(name))
+
+    def batch_get_item(self, RequestItems: dict, **kwargs):
+        responses = {}
+        for table_name, request in RequestItems.items():
+            table = self.Table(table_name)
+            found = [table.get_item(Key=key).get('Item') for key in request['Keys']]
+            responses[table_name] = [item for item in found if item is not None]
+        return dict(_metadata(), Responses=responses, UnprocessedKeys={})
+
+
+# --- Startup configuration services --- #
+
+class FakeConfigStore:
+    """Parameter Store and Secrets Manager with nothing in them: the harness configures through env vars."""
+
+    def get_parameter(self, Name: str, **kwargs):
+        raise _client_error('ParameterNotFound', f"{Name} not found", 'GetParameter')
+
+    def get_secret_value(self, SecretId: str, **kwargs):
+        raise _client_error('ResourceNotFoundException', f"{SecretId} not found", 'GetSecretValue')
+
+
+class FakeAWS:
+    """One instance of every stand-in, shared by every client the code creates."""
+
+    def __init__(self):
+        self.s3 = FakeS3()
+        self.sqs = FakeSQS()
+        self.cloudwatch = FakeCloudWatch(self.sqs)
+        self.dynamodb = FakeDynamoDB()
+        self.config_store = FakeConfigStore()
+
+    def client(self, service_name: str, *args, **kwargs):
+        clients = {
+            's3': self.s3, 'sqs': self.sqs, 'cloudwatch': self.cloudwatch,
+            'ssm': self.config_store, 'secretsmanager': self.config_store,
+        }
+        if service_name not in clients:
+            raise NotImplementedError(f"No stand-in for the {service_name} client")
+        return clients[service_name]
+
+    def resource(self, service_name: str, *args, **kwargs):
+        if service_name != 'dynamodb':
+            raise NotImplementedError(f"No stand-in for the {service_name} resource")
+        return self.dynamodb
+
+
+def install() -> FakeAWS:
+    """Routes boto3.client / boto3.resource to a fresh set of stand-ins and returns them."""
+    fake_aws = FakeAWS()
+    boto3.client = fake_aws.client
+    boto3.resource = fake_aws.resource
+    return fake_aws
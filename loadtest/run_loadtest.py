@@ -0,0 +1,256 @@
+"""
+Local load test of the full upload -> process -> list loop, without AWS.
+
+Runs the FastAPI app (under uvicorn) and the media worker in this process, with S3, SQS,
+CloudWatch and DynamoDB replaced by the in-process stand-ins of fake_aws.py and Cognito token
+verification replaced by a stub that accepts the harness's own tokens. Simulated users each
+repeatedly upload a file, submit a job with one of the bundled filters, follow the job until it completes and list
+their media. Reports API latency percentiles per endpoint, completed jobs/s, end-to-end job time
+and the time jobs waited in the queue.
+
+The worker really runs ffmpeg, so results reflect this machine's encode capacity. Requires the API's
+and worker's Python dependencies, plus ffmpeg and ffprobe on the PATH.
+
+Usage:
+    python loadtest/run_loadtest.py [--users 8] [--iterations 3] [--worker-concurrency 2]
+                                    [--media path/to/input.jpg] [--output results.json]
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import socket
+import logging
+import argparse
+import mimetypes
+import importlib.util
+import subprocess
+import tempfile
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+ROOT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND_DIRECTORY = os.path.join(ROOT_DIRECTORY, 'backend')
+WORKER_DIRECTORY = os.path.join(ROOT_DIRECTORY, 'media_worker')
+LUT_DIRECTORY = os.path.join(BACKEND_DIRECTORY, 'assets', 'luts')
+API_PREFIX = "/api/v1"
+TOKEN_PREFIX = "loadtest-user-"
+TERMINAL_JOB_STATUSES = ("completed", "failed")
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile; 0 for no values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered) + 0.5)) - 1))]
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    return {
+        'count': len(values),
+        'p50_ms': round(percentile(values, 0.50) * 1000, 1),
+        'p90_ms': round(percentile(values, 0.90) * 1000, 1),
+        'p99_ms': round(percentile(values, 0.99) * 1000, 1),
+        'max_ms': round(max(values, default=0.0) * 1000, 1),
+    }
+
+
+def configure_environment(args, work_dir: str):
+    """Settings both services read at import time."""
+    os.environ.update({
+        'AWS_REGION': 'ap-southeast-2',
+        'S3_BUCKET_NAME': 'n11696630', # The worker's bucket name is fixed
+        'SQS_QUEUE_URL': 'https://fake-sqs.invalid/loadtest',
+        'COGNITO_USER_POOL_ID': 'loadtest',
+        'COGNITO_APP_CLIENT_ID': 'loadtest',
+        'COGNITO_REGION': 'ap-southeast-2',
+        'WORKER_CONCURRENCY': str(args.worker_concurrency),
+        'LUT_DIRECTORY': LUT_DIRECTORY,
+        'WORK_DIRECTORY': work_dir,
+    })
+    os.environ.pop('SQS_FAST_QUEUE_URL', None)
+    os.environ.setdefault('PEXELS_API_KEY', 'loadtest')
+
+
+def load_services():
+    """Imports the API app and the worker's main module (both are named `main`, so the worker's is loaded by path)."""
+    sys.path[:0] = [BACKEND_DIRECTORY, WORKER_DIRECTORY]
+    from main import app
+    spec = importlib.util.spec_from_file_location('worker_main', os.path.join(WORKER_DIRECTORY, 'main.py'))
+    worker_main = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(worker_main)
+    return app, worker_main
+
+
+def stub_cognito():
+    """Accepts `loadtest-user-<n>` bearer tokens, each a distinct (non-admin) user."""
+    from utils.cognito_auth import cognito_authenticator
+    from fastapi import HTTPException, status
+
+    def verify_token(token: str) -> dict:
+        if not token.startswith(TOKEN_PREFIX):
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials")
+        return {'sub': str(uuid.uuid5(uuid.NAMESPACE_URL, token)), 'cognito:groups': [], 'username': token}
+
+    cognito_authenticator.verify_token = verify_token
+
+
+def seed_filters(count: int) -> List[str]:
+    """Registers bundled LUTs as default filters, which the worker reads from LUT_DIRECTORY."""
+    from models.schemas import FilterItemInDB
+    from utils.database import add_filter_item
+    filter_ids = []
+    for filename in sorted(os.listdir(LUT_DIRECTORY))[:count]:
+        filter_item = FilterItemInDB(
+            name=os.path.splitext(filename)[0],
+            storage_path=f"filters/public/{filename}",
+            filter_type="default",
+        )
+        add_filter_item(filter_item.model_dump())
+        filter_ids.append(str(filter_item.id))
+    return filter_ids
+
+
+def start_api(app) -> str:
+    import uvicorn
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host='127.0.0.1', port=port, log_level='warning', access_log=False))
+    threading.Thread(target=server.run, name='api', daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}{API_PREFIX}"
+
+
+def generate_media(path: str):
+    subprocess.run(['ffmpeg', '-y', '-v', 'error', '-f', 'lavfi', '-i', 'testsrc2=size=1920x1080',
+                    '-frames:v', '1', '-q:v', '3', path], check=True)
+
+
+class LoadTest:
+    def __init__(self, base_url: str, media_path: str, filter_ids: List[str], args):
+        self.base_url = base_url
+        self.media_path = media_path
+        self.media_type = mimetypes.guess_type(media_path)[0] or 'application/octet-stream'
+        self.filter_ids = filter_ids
+        self.args = args
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.job_times: List[float] = []
+        self.failed_jobs = 0
+        self._lock = threading.Lock()
+
+    def _call(self, session, name: str, method: str, path: str, **kwargs):
+        started = time.perf_counter()
+        response = session.request(method, f"{self.base_url}{path}", timeout=60, **kwargs)
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.latencies[name].append(elapsed)
+            if response.status_code >= 400:
+                self.errors[name] += 1
+        return response
+
+    def run_user(self, user_index: int):
+        import requests
+        session = requests.Session()
+        session.headers['Authorization'] = f"Bearer {TOKEN_PREFIX}{user_index}"
+        with open(self.media_path, 'rb') as f:
+            media = f.read()
+
+        for iteration in range(self.args.iterations):
+            response = self._call(session, 'upload', 'POST', '/media/upload',
+                                  files={'file': (os.path.basename(self.media_path), media, self.media_type)})
+            if response.status_code != 201:
+                continue
+            filter_id = self.filter_ids[(user_index + iteration) % len(self.filter_ids)]
+            submitted_at = time.perf_counter()
+            response = self._call(session, 'process', 'POST', '/process',
+                                  json={'media_id': response.json()['id'], 'filter_id': filter_id})
+            if response.status_code != 200:
+                continue
+            self.wait_for_job(session, response.json()['task_id'], submitted_at)
+            self._call(session, 'list', 'GET', '/media/')
+
+    def wait_for_job(self, session, job_id: str, submitted_at: float):
+        deadline = submitted_at + self.args.job_timeout
+        while time.perf_counter() < deadline:
+            response = self._call(session, 'job_status', 'GET', f"/jobs/{job_id}")
+            if response.status_code == 200 and response.json()['status'] in TERMINAL_JOB_STATUSES:
+                with self._lock:
+                    if response.json()['status'] == 'completed':
+                        self.job_times.append(time.perf_counter() - submitted_at)
+                    else:
+                        self.failed_jobs += 1
+                return
+            time.sleep(self.args.poll_interval)
+        with self._lock:
+            self.failed_jobs += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--users', type=int, default=8, help="Concurrent simulated users")
+    parser.add_argument('--iterations', type=int, default=3, help="Upload/process/list rounds per user")
+    parser.add_argument('--worker-concurrency', type=int, default=2, help="WORKER_CONCURRENCY of the in-process worker")
+    parser.add_argument('--filters', type=int, default=3, help="Bundled LUTs registered as filters and used in turn")
+    parser.add_argument('--media', default=None, help="File each user uploads (defaults to a generated 1080p JPEG)")
+    parser.add_argument('--poll-interval', type=float, default=0.5, help="Seconds between job status checks")
+    parser.add_argument('--job-timeout', type=float, default=600, help="Seconds before a job counts as failed")
+    parser.add_argument('--output', default=None, help="Write the report as JSON to this path")
+    parser.add_argument('--verbose', action='store_true', help="Keep the services' INFO logging")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        configure_environment(args, work_dir)
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        import fake_aws
+        aws = fake_aws.install() # Before the services create their clients
+
+        app, worker_main = load_services()
+        stub_cognito()
+        if not args.verbose:
+            for logger in list(logging.root.manager.loggerDict.values()):
+                if isinstance(logger, logging.Logger):
+                    logger.setLevel(logging.WARNING)
+        filter_ids = seed_filters(args.filters)
+        media_path = args.media or os.path.join(work_dir, 'loadtest-input.jpg')
+        if not args.media:
+            generate_media(media_path)
+
+        base_url = start_api(app)
+        threading.Thread(target=worker_main.main, name='worker', daemon=True).start()
+
+        load_test = LoadTest(base_url, media_path, filter_ids, args)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.users) as executor:
+            list(executor.map(load_test.run_user, range(args.users)))
+        wall_seconds = time.perf_counter() - started
+
+    report = {
+        'users': args.users,
+        'iterations': args.iterations,
+        'worker_concurrency': args.worker_concurrency,
+        'wall_seconds': round(wall_seconds, 2),
+        'jobs_completed': len(load_test.job_times),
+        'jobs_failed': load_test.failed_jobs,
+        'jobs_per_second': round(len(load_test.job_times) / wall_seconds, 3) if wall_seconds else 0.0,
+        'job_time': summarize(load_test.job_times),
+        'queue_wait': summarize(aws.sqs.queue_waits),
+        'endpoints': {
+            name: dict(summarize(values), errors=load_test.errors.get(name, 0))
+            for name, values in sorted(load_test.latencies.items())
+        },
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
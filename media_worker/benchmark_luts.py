@@ -0,0 +1,267 @@
+"""
+Benchmark suite for the LUT processing engines (apply_lut_to_image / apply_lut_to_video).
+
+Generates deterministic synthetic stills (1 MP to 50 MP) and clips (720p to 4K) with ffmpeg's
+testsrc2, runs them through the engines across LUTs, LUT grid sizes, lut3d interpolation modes and
+x264 CRF/preset choices, and records fps, megapixels/s, peak RSS of ffmpeg and output size per case
+as JSON. It compares them with a baseline and fails (exit status 1) when a case got slower, used more
+memory or wrote a larger output than the baseline allows. A missing baseline fails too (exit status 2),
+unless --allow-missing-baseline is given.
+
+Baselines are machine-specific. The committed benchmarks/lut_baseline.json covers the default
+matrix on the reference machine described by its `environment` (a static ffmpeg 7.0 build on one
+x86_64 core); elsewhere, record one with --update-baseline and compare runs with the same matrix there.
+
+Linux only (peak RSS is read from /proc). Requires ffmpeg and ffprobe on the PATH.
+
+Usage:
+    python benchmark_luts.py [--quick] [--output results.json] [--baseline benchmarks/lut_baseline.json]
+                             [--update-baseline] [--allow-missing-baseline] [--tolerance 0.15] [--repeat 3]
+                             [--images 1mp,12mp,50mp] [--videos 720p,1080p,2160p] [--luts NAME,...]
+                             [--grids 17,33,65] [--interps tetrahedral,trilinear] [--crfs 23] [--presets veryfast,medium]
+"""
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import platform
+import itertools
+import subprocess
+import tempfile
+from typing import Dict, List, Optional
+
+import process_logic
+from process_logic import apply_lut_to_image, apply_lut_to_video
+from lut_utils import read_cube, write_cube, compose_luts
+from benchmark_tiled_image import ChildMemorySampler, DEFAULT_LUT_DIRECTORY
+
+DEFAULT_BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks', 'lut_baseline.json')
+RESULTS_VERSION = 1
+
+# Synthetic inputs: name -> (width, height)
+IMAGE_SIZES = {
+    '1mp': (1152, 864),
+    '12mp': (4000, 3000),
+    '24mp': (6000, 4000),
+    '50mp': (8192, 6144),
+}
+VIDEO_SIZES = {
+    '720p': (1280, 720),
+    '1080p': (1920, 1080),
+    '2160p': (3840, 2160),
+}
+VIDEO_SECONDS = 3
+VIDEO_FRAME_RATE = 30
+
+# Metric -> direction in which a change is a regression
+REGRESSION_DIRECTIONS = {
+    'megapixels_per_second': -1,
+    'peak_rss_bytes': 1,
+    'output_bytes': 1,
+}
+
+
+def _csv(value: str) -> List[str]:
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def _generate_image(path: str, width: int, height: int):
+    subprocess.run(
+        ['ffmpeg', '-y', '-v', 'error', '-f', 'lavfi', '-i', f"testsrc2=size={width}x{height}",
+         '-frames:v', '1', '-q:v', '2', path],
+        check=True
+    )
+
+
+def _generate_video(path: str, width: int, height: int):
+    # A fixed encode of a deterministic source, so every run grades identical input
+    subprocess.run(
+        ['ffmpeg', '-y', '-v', 'error',
+         '-f', 'lavfi', '-i', f"testsrc2=size={width}x{height}:rate={VIDEO_FRAME_RATE}:duration={VIDEO_SECONDS}",
+         '-f', 'lavfi', '-i', f"sine=frequency=440:duration={VIDEO_SECONDS}",
+         '-c:v', 'libx264', '-preset', 'veryfast', '-crf', '18', '-pix_fmt', 'yuv420p', '-c:a', 'aac',
+         '-shortest', path],
+        check=True
+    )
+
+
+def _ffmpeg_version() -> str:
+    try:
+        result = subprocess.run(['ffmpeg', '-version'], check=True, capture_output=True, text=True)
+        return result.stdout.splitlines()[0]
+    except (FileNotFoundError, subprocess.CalledProcessError, IndexError):
+        return 'unknown'
+
+
+def environment() -> Dict[str, object]:
+    return {
+        'ffmpeg': _ffmpeg_version(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def prepare_luts(names: Optional[List[str]], grids: List[int], work_dir: str) -> Dict[str, Dict[int, str]]:
+    """Resamples each selected bundled LUT to every grid size. Returns {lut name: {grid size: path}}."""
+    paths = sorted(glob.glob(os.path.join(DEFAULT_LUT_DIRECTORY, '*.[cC][uU][bB][eE]')))
+    by_name = {os.path.splitext(os.path.basename(path))[0]: path for path in paths}
+    selected = names or list(by_name)[:1]
+    luts = {}
+    for name in selected:
+        if name not in by_name:
+            raise SystemExit(f"Unknown LUT {name!r}; bundled LUTs: {', '.join(by_name)}")
+        lut = read_cube(by_name[name])
+        luts[name] = {}
+        for grid in grids:
+            grid_path = os.path.join(work_dir, f"lut-{len(luts)}-{grid}.cube")
+            write_cube(compose_luts([lut], 1.0, grid), grid_path)
+            luts[name][grid] = grid_path
+    return luts
+
+
+def run_case(run, output_path: str, pixels_per_frame: int, frames: int, repeat: int) -> Dict[str, object]:
+    """Runs one case `repeat` times; throughput is taken from the fastest run, memory from the largest."""
+    best_seconds = None
+    peak_rss = 0
+    for _ in range(repeat):
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        started = time.perf_counter()
+        with ChildMemorySampler() as sampler:
+            if not run(output_path):
+                return {'error': 'processing failed'}
+        seconds = time.perf_counter() - started
+        best_seconds = seconds if best_seconds is None else min(best_seconds, seconds)
+        peak_rss = max(peak_rss, max(sampler.peaks.values(), default=0))
+    return {
+        'seconds': round(best_seconds, 4),
+        'fps': round(frames / best_seconds, 3),
+        'megapixels_per_second': round(pixels_per_frame * frames / best_seconds / 1e6, 3),
+        'peak_rss_bytes': peak_rss,
+        'output_bytes': os.path.getsize(output_path),
+    }
+
+
+def run_suite(args, work_dir: str) -> List[Dict[str, object]]:
+    grids = [int(grid) for grid in args.grids]
+    luts = prepare_luts(args.luts, grids, work_dir)
+    results = []
+
+    def record(case: Dict[str, object], metrics: Dict[str, object]):
+        case['id'] = '/'.join(str(value) for value in case.values())
+        case.update(metrics)
+        results.append(case)
+        summary = metrics.get('error') or (f"{metrics['fps']:8.2f} fps {metrics['megapixels_per_second']:9.1f} MP/s "
+                                           f"{metrics['peak_rss_bytes'] / 1024 ** 2:7.0f} MiB {metrics['output_bytes']:>11} B")
+        print(f"{case['id']:<60} {summary}", flush=True)
+
+    for size_name in args.images:
+        width, height = IMAGE_SIZES[size_name]
+        input_path = os.path.join(work_dir, f"input-{size_name}.png")
+        _generate_image(input_path, width, height)
+        output_path = os.path.join(work_dir, f"output-{size_name}.jpg")
+        for lut_name, grid, interp in itertools.product(luts, grids, args.interps):
+            process_logic.LUT3D_INTERPOLATION = interp
+            lut_path = luts[lut_name][grid]
+            metrics = run_case(lambda out: apply_lut_to_image(input_path, lut_path, out),
+                               output_path, width * height, 1, args.repeat)
+            record({'engine': 'image', 'input': size_name, 'lut': lut_name, 'grid': grid, 'interp': interp}, metrics)
+        os.remove(input_path)
+
+    for size_name in args.videos:
+        width, height = VIDEO_SIZES[size_name]
+        input_path = os.path.join(work_dir, f"input-{size_name}.mp4")
+        _generate_video(input_path, width, height)
+        output_path = os.path.join(work_dir, f"output-{size_name}.mp4")
+        for lut_name, grid, interp, crf, preset in itertools.product(luts, grids, args.interps, args.crfs, args.presets):
+            process_logic.LUT3D_INTERPOLATION = interp
+            lut_path = luts[lut_name][grid]
+            metrics = run_case(
+                lambda out: apply_lut_to_video(input_path, lut_path, out, int(crf), preset=preset),
+                output_path, width * height, VIDEO_SECONDS * VIDEO_FRAME_RATE, args.repeat
+            )
+            record({'engine': 'video', 'input': size_name, 'lut': lut_name, 'grid': grid, 'interp': interp,
+                    'crf': int(crf), 'preset': preset}, metrics)
+        os.remove(input_path)
+
+    return results
+
+
+def compare(results: List[Dict[str, object]], baseline: Dict[str, object], tolerance: float) -> List[str]:
+    """Describes every metric that regressed past `tolerance` (a fraction) against the baseline."""
+    baseline_cases = {case['id']: case for case in baseline.get('results', [])}
+    regressions = []
+    for case in results:
+        expected = baseline_cases.get(case['id'])
+        if expected is None:
+            continue
+        if 'error' in case and 'error' not in expected:
+            regressions.append(f"{case['id']}: {case['error']}")
+            continue
+        for metric, direction in REGRESSION_DIRECTIONS.items():
+            if not expected.get(metric) or metric not in case:
+                continue
+            change = (case[metric] - expected[metric]) / expected[metric]
+            if change * direction > tolerance:
+                regressions.append(f"{case['id']}: {metric} {expected[metric]} -> {case[metric]} ({change:+.1%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--quick', action='store_true', help="Smallest still and clip, default LUT grid and interpolation only")
+    parser.add_argument('--images', type=_csv, default=['1mp', '12mp', '50mp'], help=f"Stills: {', '.join(IMAGE_SIZES)}")
+    parser.add_argument('--videos', type=_csv, default=['720p', '1080p', '2160p'], help=f"Clips: {', '.join(VIDEO_SIZES)}")
+    parser.add_argument('--luts', type=_csv, default=None, help="Bundled LUT names (defaults to the first one)")
+    parser.add_argument('--grids', type=_csv, default=['17', '33', '65'], help="LUT grid sizes to resample to")
+    parser.add_argument('--interps', type=_csv, default=['tetrahedral', 'trilinear'], help="lut3d interpolation modes")
+    parser.add_argument('--crfs', type=_csv, default=['23'], help="x264 CRF values (videos)")
+    parser.add_argument('--presets', type=_csv, default=['veryfast', 'medium'], help="x264 presets (videos)")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per case; the fastest counts")
+    parser.add_argument('--output', default=None, help="Write results as JSON to this path")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE_PATH, help="Baseline results to compare with")
+    parser.add_argument('--update-baseline', action='store_true', help="Store these results as the baseline")
+    parser.add_argument('--allow-missing-baseline', action='store_true',
+                        help="Exit 0 when there is no baseline to compare with, instead of failing")
+    parser.add_argument('--tolerance', type=float, default=0.15, help="Allowed regression as a fraction (0.15 = 15%%)")
+    args = parser.parse_args()
+    if args.quick:
+        args.images, args.videos, args.grids, args.interps, args.presets = ['1mp'], ['720p'], ['33'], ['tetrahedral'], ['veryfast']
+    unknown = [name for name in args.images if name not in IMAGE_SIZES] + [name for name in args.videos if name not in VIDEO_SIZES]
+    if unknown:
+        raise SystemExit(f"Unknown input size(s): {', '.join(unknown)}")
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        results = run_suite(args, work_dir)
+    report = {'version': RESULTS_VERSION, 'environment': environment(), 'results': results}
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; record one with --update-baseline", file=sys.stderr)
+        raise SystemExit(0 if args.allow_missing_baseline else 2)
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get('environment') != report['environment']:
+        print("Warning: the baseline was recorded in a different environment:", baseline.get('environment'), file=sys.stderr)
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    compared = len({case['id'] for case in baseline.get('results', [])} & {case['id'] for case in results})
+    print(f"{len(regressions)} regressions in {compared} cases compared against {args.baseline}")
+    raise SystemExit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""
+Benchmark for strip-based grading of very large stills (tiled_image.py).
+
+Generates a synthetic image, grades it to PNG once as a whole frame (apply_lut_to_image) and once
+in strips (apply_lut_to_large_image), and reports for each mode:
+- the peak resident memory (VmHWM) of every ffmpeg process involved, per pipeline stage;
+- the end-to-end peak: the largest sum, over all samples, of the RSS of every ffmpeg process
+  alive at once plus what this process (which compresses the strips) grew by.
+The grade stage of the strip mode should stay within the memory budget (on top of ffmpeg's own
+baseline) however large the image is. The end-to-end peak still includes the decoder's full frame.
+
+Linux only (reads /proc). Requires ffmpeg and ffprobe on the PATH.
+
+Usage:
+    python benchmark_tiled_image.py [--width 16000] [--height 8000] [--input-format png]
+                                    [--budget-mb 64] [--lut ../backend/assets/luts/<name>.CUBE]
+"""
+import os
+import glob
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+from typing import Dict
+
+from process_logic import apply_lut_to_image, build_lut_filter
+from tiled_image import apply_lut_to_large_image
+
+DEFAULT_LUT_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend', 'assets', 'luts')
+SAMPLE_INTERVAL_SECONDS = 0.01
+
+
+def _status_kib(status: dict, field: str) -> int:
+    return int(status[field].split()[0]) * 1024
+
+
+def _own_rss() -> int:
+    with open('/proc/self/status') as f:
+        return _status_kib(dict(line.split(':', 1) for line in f if ':' in line), 'VmRSS')
+
+
+class ChildMemorySampler:
+    """
+    Samples the peak RSS of this process's child processes, grouped by pipeline stage, and the
+    end-to-end peak of the children together plus this process's own growth.
+    """
+
+    def __init__(self):
+        self.peaks: Dict[str, int] = {}
+        self.total_peak = 0
+        self._own_start = _own_rss()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    @staticmethod
+    def _stage(command: str) -> str:
+        if 'lut3d=' in command or 'lut1d=' in command:
+            return 'grade' if 'pipe:0' in command else 'whole'
+        if 'pipe:1' in command:
+            return 'decode'
+        return 'encode'
+
+    def _run(self):
+        parent = str(os.getpid())
+        while not self._stop.is_set():
+            total = max(0, _own_rss() - self._own_start)
+            for status_path in glob.glob('/proc/[0-9]*/status'):
+                try:
+                    with open(status_path) as f:
+                        status = dict(line.split(':', 1) for line in f if ':' in line)
+                    if status.get('PPid', '').strip() != parent or 'VmHWM' not in status:
+                        continue
+                    with open(status_path.replace('status', 'cmdline'), 'rb') as f:
+                        command = f.read().replace(b'\0', b' ').decode('utf-8', errors='replace')
+                except OSError:
+                    continue
+                if 'ffmpeg' not in command:
+                    continue
+                stage = self._stage(command)
+                self.peaks[stage] = max(self.peaks.get(stage, 0), _status_kib(status, 'VmHWM'))
+                total += _status_kib(status, 'VmRSS')
+            self.total_peak = max(self.total_peak, total)
+            time.sleep(SAMPLE_INTERVAL_SECONDS)
+
+
+def _generate_image(path: str, width: int, height: int):
+    subprocess.run(
+        ['ffmpeg', '-y', '-v', 'error', '-f', 'lavfi', '-i', f"testsrc2=size={width}x{height}",
+         '-frames:v', '1', path],
+        check=True
+    )
+
+
+def _baseline_rss(lut_path: str) -> int:
+    """Peak RSS of ffmpeg applying the LUT to a tiny input, subtracted from the stage peaks."""
+    with ChildMemorySampler() as sampler:
+        subprocess.run(
+            ['ffmpeg', '-v', 'error', '-f', 'lavfi', '-i', 'color=size=16x16:duration=2',
+             '-vf', build_lut_filter(lut_path), '-f', 'null', '-'],
+            check=True
+        )
+    return max(sampler.peaks.values(), default=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--width', type=int, default=16000)
+    parser.add_argument('--height', type=int, default=8000)
+    parser.add_argument('--input-format', default='png', help="Input image extension; output is always PNG")
+    parser.add_argument('--budget-mb', type=int, default=64)
+    parser.add_argument('--lut', default=None, help="LUT to apply (defaults to the first bundled LUT)")
+    args = parser.parse_args()
+
+    lut_path = args.lut or sorted(glob.glob(os.path.join(DEFAULT_LUT_DIRECTORY, '*.[cC][uU][bB][eE]')))[0]
+    budget = args.budget_mb * 1024 ** 2
+    megapixels = args.width * args.height / 1e6
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        input_path = os.path.join(work_dir, f"input.{args.input_format}")
+        print(f"Generating {args.width}x{args.height} ({megapixels:.0f} MP) test image...")
+        _generate_image(input_path, args.width, args.height)
+        baseline = _baseline_rss(lut_path)
+
+        results = {}
+        for mode, run in (
+            ('whole', lambda out: apply_lut_to_image(input_path, lut_path, out)),
+            ('strips', lambda out: apply_lut_to_large_image(input_path, lut_path, out, memory_budget=budget)),
+        ):
+            output_path = os.path.join(work_dir, f"output_{mode}.png")
+            started = time.perf_counter()
+            with ChildMemorySampler() as sampler:
+                if not run(output_path):
+                    raise SystemExit(f"{mode} grading failed")
+            results[mode] = (time.perf_counter() - started, sampler.peaks, sampler.total_peak)
+
+    print(f"ffmpeg baseline RSS: {baseline / 1024 ** 2:.0f} MiB, strip budget: {args.budget_mb} MiB")
+    for mode, (seconds, peaks, total_peak) in results.items():
+        stages = ', '.join(f"{stage} {peak / 1024 ** 2:.0f} MiB" for stage, peak in sorted(peaks.items()))
+        print(f"{mode:>6}: {seconds:6.1f} s, end-to-end peak RSS {total_peak / 1024 ** 2:.0f} MiB, "
+              f"peak RSS per stage: {stages}")
+
+    grade_peak = results['strips'][1].get('grade', 0) - baseline
+    within_budget = grade_peak <= budget
+    print(f"Grade stage used {grade_peak / 1024 ** 2:.0f} MiB above baseline: "
+          f"{'within' if within_budget else 'OVER'} the {args.budget_mb} MiB budget")
+    raise SystemExit(0 if within_budget else 1)
+
+
+if __name__ == '__main__':
+    main()
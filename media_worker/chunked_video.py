@@ -0,0 +1,210 @@
+import os
+import json
+import math
+import shutil
+import logging
+import subprocess
+from typing import Callable, Optional, Set
+
+import boto3
+from botocore.exceptions import ClientError
+
+from process_logic import build_lut_filter, run_ffmpeg
+
+logger = logging.getLogger(__name__)
+
+s3_client = boto3.client('s3', region_name=os.environ.get('AWS_REGION', 'ap-southeast-2'))
+
+# --- Chunked Video Configuration --- #
+# Long videos are encoded in independently committed chunks. Each finished chunk is uploaded next to
+# the output and recorded in a journal, so a job retried after a crash or scale-in resumes from the
+# last committed chunk instead of from the start: an interruption costs at most one chunk of work.
+# Only one worker writes a journal at a time: while a job runs its message is kept invisible by the
+# visibility heartbeat (visibility.py), so SQS offers it again only once that worker has stopped.
+CHUNKED_VIDEO_MIN_SECONDS = float(os.environ.get('CHUNKED_VIDEO_MIN_SECONDS', '300'))
+VIDEO_CHUNK_SECONDS = int(os.environ.get('VIDEO_CHUNK_SECONDS', '60'))
+JOURNAL_NAME = "journal.json"
+JOURNAL_VERSION = 1
+
+
+def probe_duration(input_video_path: str) -> Optional[float]:
+    """Returns the duration of a media file in seconds, or None if it can't be probed."""
+    command = ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'json', input_video_path]
+    try:
+        result = subprocess.run(command, check=True, capture_output=True, text=True)
+        return float(json.loads(result.stdout)['format']['duration'])
+    except (FileNotFoundError, subprocess.CalledProcessError, json.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+        logger.warning(f"Could not probe the duration of {input_video_path}: {e}")
+        return None
+
+
+def chunk_prefix(s3_output_key: str) -> str:
+    """S3 prefix holding the committed chunks and journal of the job writing `s3_output_key`."""
+    return f"{s3_output_key}.chunks/"
+
+
+def chunk_name(index: int) -> str:
+    return f"chunk_{index:05d}.mp4"
+
+
+class ChunkJournal:
+    """
+    The journal of a chunked encode: an S3 object listing the committed chunks and the plan they
+    belong to. A chunk is committed by uploading it and then rewriting the journal, so every chunk
+    the journal lists is complete in S3. A journal for a different plan (chunk size, LUT, quality)
+    is ignored and the encode starts over.
+    """
+
+    def __init__(self, bucket: str, s3_output_key: str, plan: dict):
+        self.bucket = bucket
+        self.prefix = chunk_prefix(s3_output_key)
+        self.plan = plan
+        self.completed: Set[int] = set()
+
+    def load(self) -> Set[int]:
+        try:
+            response = s3_client.get_object(Bucket=self.bucket, Key=f"{self.prefix}{JOURNAL_NAME}")
+            journal = json.loads(response['Body'].read().decode('utf-8'))
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') not in ('NoSuchKey', '404'):
+                logger.warning(f"Could not read chunk journal s3://{self.bucket}/{self.prefix}: {e}")
+            return self.completed
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            logger.warning(f"Ignoring unreadable chunk journal s3://{self.bucket}/{self.prefix}: {e}")
+            return self.completed
+
+        if journal.get('plan') != self.plan:
+            logger.info(f"Chunk journal s3://{self.bucket}/{self.prefix} is for another plan; starting over")
+            return self.completed
+        self.completed = {int(index) for index in journal.get('completed', [])}
+        return self.completed
+
+    def commit(self, index: int, local_path: str) -> bool:
+        try:
+            s3_client.upload_file(local_path, self.bucket, f"{self.prefix}{chunk_name(index)}")
+            self.completed.add(index)
+            journal = {'plan': self.plan, 'completed': sorted(self.completed)}
+            s3_client.put_object(
+                Bucket=self.bucket, Key=f"{self.prefix}{JOURNAL_NAME}",
+                Body=json.dumps(journal).encode('utf-8'), ContentType='application/json'
+            )
+            return True
+        except (ClientError, OSError) as e:
+            self.completed.discard(index)
+            logger.error(f"Error committing chunk {index} to s3://{self.bucket}/{self.prefix}: {e}")
+            return False
+
+    def fetch(self, index: int, local_path: str) -> bool:
+        try:
+            s3_client.download_file(self.bucket, f"{self.prefix}{chunk_name(index)}", local_path)
+            return True
+        except ClientError as e:
+            logger.error(f"Error downloading committed chunk {index} from s3://{self.bucket}/{self.prefix}: {e}")
+            return False
+
+
+def discard_chunks(bucket: str, s3_output_key: str):
+    """Deletes the chunks and journal of a job once its final output has been published."""
+    prefix = chunk_prefix(s3_output_key)
+    try:
+        paginator = s3_client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            keys = [{'Key': obj['Key']} for obj in page.get('Contents', [])]
+            if keys:
+                s3_client.delete_objects(Bucket=bucket, Delete={'Objects': keys, 'Quiet': True})
+    except ClientError as e:
+        # Leftover chunks only cost storage; a bucket lifecycle rule can expire them
+        logger.warning(f"Could not delete chunks under s3://{bucket}/{prefix}: {e}")
+
+
+def _run_ffmpeg(command, duration: Optional[float] = None, on_progress: Optional[Callable[[float], None]] = None) -> bool:
+    try:
+        run_ffmpeg(command, duration, on_progress)
+        return True
+    except FileNotFoundError:
+        logger.error("Error: 'ffmpeg' command not found. Please ensure FFmpeg is installed and in your system's PATH.")
+        return False
+    except subprocess.CalledProcessError as e:
+        logger.error("An error occurred during FFmpeg execution.")
+        logger.error(f"Error message:\n{e.stderr}")
+        return False
+
+
+def apply_lut_to_video_chunked(input_video_path: str, lut_path: str, output_video_path: str, bucket: str,
+                               s3_output_key: str, duration: float, crf: int = 23, lut_kind: str = "3d",
+                               on_progress: Optional[Callable[[float], None]] = None) -> bool:
+    """
+    Applies a LUT to a long video in VIDEO_CHUNK_SECONDS chunks committed to S3 one by one,
+    skipping chunks a previous attempt already committed, then joins the chunks without
+    re-encoding and copies the original audio track in. `on_progress` gets the percentage of
+    the video encoded, counting chunks committed by earlier attempts.
+
+    Returns:
+        bool: True if successful, False otherwise.
+    """
+    chunk_count = math.ceil(duration / VIDEO_CHUNK_SECONDS)
+    plan = {
+        'version': JOURNAL_VERSION,
+        'chunk_seconds': VIDEO_CHUNK_SECONDS,
+        'chunk_count': chunk_count,
+        'lut': os.path.basename(lut_path),
+        'lut_kind': lut_kind,
+        'crf': crf,
+    }
+    journal = ChunkJournal(bucket, s3_output_key, plan)
+    committed = journal.load()
+    if committed:
+        logger.info(f"Resuming {input_video_path}: {len(committed)}/{chunk_count} chunks already committed")
+
+    chunk_directory = f"{output_video_path}.chunks"
+    os.makedirs(chunk_directory, exist_ok=True)
+    try:
+        lut_filter = build_lut_filter(lut_path, lut_kind)
+        for index in range(chunk_count):
+            if index in committed:
+                continue
+            chunk_path = os.path.join(chunk_directory, chunk_name(index))
+            command = [
+                'ffmpeg', '-y',
+                # Input seeking: only this chunk (from the keyframe before it) is decoded
+                '-ss', str(index * VIDEO_CHUNK_SECONDS),
+                '-t', str(VIDEO_CHUNK_SECONDS),
+                '-i', input_video_path,
+                '-map', '0:v:0',
+                '-vf', lut_filter,
+                '-c:v', 'libx264',
+                '-crf', str(crf),
+                '-pix_fmt', 'yuv420p',
+                '-an',
+                chunk_path
+            ]
+            logger.info(f"Encoding chunk {index + 1}/{chunk_count} of {input_video_path}")
+            chunk_progress = None
+            if on_progress is not None:
+                done = len(journal.completed)
+                chunk_progress = lambda percent: on_progress((done + percent / 100) * 100 / chunk_count)
+            if not _run_ffmpeg(command, VIDEO_CHUNK_SECONDS, chunk_progress) or not journal.commit(index, chunk_path):
+                return False
+
+        list_path = os.path.join(chunk_directory, 'chunks.txt')
+        with open(list_path, 'w') as chunk_list:
+            for index in range(chunk_count):
+                chunk_path = os.path.join(chunk_directory, chunk_name(index))
+                if not os.path.exists(chunk_path) and not journal.fetch(index, chunk_path):
+                    return False
+                chunk_list.write(f"file '{chunk_path}'\n")
+
+        command = [
+            'ffmpeg', '-y',
+            '-f', 'concat', '-safe', '0', '-i', list_path,
+            '-i', input_video_path,
+            '-map', '0:v', '-map', '1:a?',
+            '-c', 'copy', # Chunks share encoder settings, so they join without re-encoding
+            output_video_path
+        ]
+        if not _run_ffmpeg(command):
+            return False
+        logger.info(f"Video processing successful! Saved to: {output_video_path}")
+        return True
+    finally:
+        shutil.rmtree(chunk_directory, ignore_errors=True)
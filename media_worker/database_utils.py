@@ -12,6 +12,7 @@ AWS_REGION = os.getenv("AWS_REGION", "ap-southeast-2")
 dynamodb = boto3.resource('dynamodb', region_name=AWS_REGION)
 
 MEDIA_ITEMS_TABLE = dynamodb.Table(f"{STUDENT_ID_PREFIX}media_items")
+JOBS_TABLE = dynamodb.Table(f"{STUDENT_ID_PREFIX}jobs")
 
 def _serialize_item_for_dynamodb(obj: Any) -> Any:
     """Recursively converts special types in a dictionary or list to DynamoDB-compatible formats."""
@@ -34,3 +35,27 @@ def add_media_item(media_item_dict: Dict[str, Any]):
     except Exception as e:
         print(f"Error adding media item: {e}")
         raise
+
+def update_job(job_id: str, fields: Dict[str, Any]):
+    """Sets fields (status, progress, ...) on an existing job record in the jobs table."""
+    item = _serialize_item_for_dynamodb(fields)
+    names = {f"#{name}": name for name in item} # "status" is a DynamoDB reserved word
+    JOBS_TABLE.update_item(
+        Key={'id': job_id},
+        UpdateExpression="SET " + ", ".join(f"#{name} = :{name}" for name in item),
+        ExpressionAttributeNames=names,
+        ExpressionAttributeValues={f":{name}": value for name, value in item.items()},
+        # Jobs are created by the API; never resurrect one that has expired or was never written
+        ConditionExpression="attribute_exists(id)"
+    )
+
+def record_job_attempt(job_id: str) -> int:
+    """Counts a processing attempt on a job record and returns how many attempts it has had, this one included."""
+    response = JOBS_TABLE.update_item(
+        Key={'id': job_id},
+        UpdateExpression="SET attempts = if_not_exists(attempts, :zero) + :one",
+        ExpressionAttributeValues={':zero': 0, ':one': 1},
+        ConditionExpression="attribute_exists(id)",
+        ReturnValues="UPDATED_NEW"
+    )
+    return int(response['Attributes']['attempts'])
@@ -0,0 +1,223 @@
+import os
+import re
+import json
+import time
+import logging
+import tempfile
+import subprocess
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import boto3
+from botocore.exceptions import ClientError
+
+from process_logic import build_lut_filter
+
+logger = logging.getLogger(__name__)
+
+s3_client = boto3.client('s3', region_name=os.environ.get('AWS_REGION', 'ap-southeast-2'))
+
+# --- HLS Output Configuration --- #
+# Videos requested with video_output="hls" are written as fragmented-MP4 HLS and uploaded segment by
+# segment while ffmpeg is still encoding, so playback can start after the first segments land.
+HLS_SEGMENT_SECONDS = int(os.environ.get('HLS_SEGMENT_SECONDS', '4'))
+# Rendition ladder (heights), all encoded from one decode and one LUT pass; heights above the source are skipped
+HLS_RENDITION_HEIGHTS = [int(h) for h in os.environ.get('HLS_RENDITION_HEIGHTS', '1080,720,480').split(',') if h.strip()]
+HLS_UPLOAD_POLL_SECONDS = float(os.environ.get('HLS_UPLOAD_POLL_SECONDS', '1'))
+HLS_MASTER_PLAYLIST = "master.m3u8"
+HLS_MEDIA_TYPE = "application/vnd.apple.mpegurl"
+
+_CONTENT_TYPES = {'.m3u8': HLS_MEDIA_TYPE, '.m4s': 'video/iso.segment', '.mp4': 'video/mp4'}
+_MAP_URI = re.compile(r'#EXT-X-MAP:.*URI="([^"]+)"')
+
+
+def probe_video(input_video_path: str) -> Optional[Tuple[int, bool]]:
+    """Returns (height, has_audio) of a video, or None if it can't be probed."""
+    command = [
+        'ffprobe', '-v', 'error',
+        '-show_entries', 'stream=codec_type,height',
+        '-of', 'json',
+        input_video_path
+    ]
+    try:
+        result = subprocess.run(command, check=True, capture_output=True, text=True)
+        streams = json.loads(result.stdout).get('streams', [])
+    except (FileNotFoundError, subprocess.CalledProcessError, json.JSONDecodeError) as e:
+        logger.warning(f"Could not probe {input_video_path}: {e}")
+        return None
+    video = next((s for s in streams if s.get('codec_type') == 'video' and s.get('height')), None)
+    if video is None:
+        return None
+    return int(video['height']), any(s.get('codec_type') == 'audio' for s in streams)
+
+
+def rendition_heights(source_height: int) -> List[int]:
+    """The ladder for a source: configured heights it can fill, or just the source height (made even)."""
+    heights = sorted({h - h % 2 for h in HLS_RENDITION_HEIGHTS if 0 < h <= source_height}, reverse=True)
+    return heights or [source_height - source_height % 2]
+
+
+def build_hls_command(input_video_path: str, video_filter: str, heights: List[int], has_audio: bool,
+                      output_directory: str, crf: int) -> List[str]:
+    """One ffmpeg run: decode once, grade once, split into the ladder and write fMP4 HLS for each rendition."""
+    splits = ''.join(f"[s{i}]" for i in range(len(heights)))
+    graph = [f"[0:v]{video_filter},split={len(heights)}{splits}"]
+    graph += [f"[s{i}]scale=-2:{height}[v{i}]" for i, height in enumerate(heights)]
+
+    command = ['ffmpeg', '-y', '-i', input_video_path, '-filter_complex', ';'.join(graph)]
+    for i in range(len(heights)):
+        command += ['-map', f"[v{i}]"]
+        if has_audio:
+            command += ['-map', '0:a:0']
+    stream_map = ' '.join(f"v:{i},a:{i}" if has_audio else f"v:{i}" for i in range(len(heights)))
+    command += [
+        '-c:v', 'libx264',
+        '-crf', str(crf),
+        '-pix_fmt', 'yuv420p',
+        # Keyframes on segment boundaries so every segment starts cleanly in every rendition
+        '-force_key_frames', f"expr:gte(t,n_forced*{HLS_SEGMENT_SECONDS})",
+    ]
+    if has_audio:
+        command += ['-c:a', 'aac', '-b:a', '128k']
+    command += [
+        '-f', 'hls',
+        '-hls_time', str(HLS_SEGMENT_SECONDS),
+        '-hls_playlist_type', 'event', # Segments are only ever appended; ENDLIST is written at the end
+        '-hls_segment_type', 'fmp4',
+        # temp_file: segments and playlists only appear under their final name once complete
+        '-hls_flags', 'independent_segments+temp_file',
+        '-hls_fmp4_init_filename', 'init.mp4',
+        '-hls_segment_filename', os.path.join(output_directory, 'stream_%v_%05d.m4s'),
+        '-master_pl_name', HLS_MASTER_PLAYLIST,
+        '-var_stream_map', stream_map,
+        os.path.join(output_directory, 'stream_%v.m3u8'),
+    ]
+    return command
+
+
+def _playlist_uris(text: str) -> List[str]:
+    """URIs a playlist references: variant playlists, init sections and segments."""
+    uris = []
+    for line in text.splitlines():
+        line = line.strip()
+        match = _MAP_URI.match(line)
+        if match:
+            uris.append(match.group(1))
+        elif line and not line.startswith('#'):
+            uris.append(line)
+    return uris
+
+
+class ProgressiveUploader:
+    """
+    Mirrors a growing HLS output directory to S3. Each sync uploads the segments a playlist
+    references before the playlist itself, and the master playlist only once every rendition
+    has a playlist in S3, so a player never sees a reference to a missing object.
+    """
+
+    def __init__(self, output_directory: str, bucket: str, s3_prefix: str, on_ready: Optional[Callable[[], None]] = None):
+        self.output_directory = output_directory
+        self.bucket = bucket
+        self.s3_prefix = s3_prefix
+        self.on_ready = on_ready
+        self._uploaded: Set[str] = set()
+        self._playlists: Dict[str, str] = {} # Rendition playlist -> content last uploaded
+        self._ready = False
+
+    def _read(self, name: str) -> Optional[str]:
+        try:
+            with open(os.path.join(self.output_directory, name)) as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _put(self, name: str, body: Optional[str] = None):
+        key = f"{self.s3_prefix}{name}"
+        content_type = _CONTENT_TYPES.get(os.path.splitext(name)[1], 'application/octet-stream')
+        if body is None:
+            s3_client.upload_file(os.path.join(self.output_directory, name), self.bucket, key,
+                                  ExtraArgs={'ContentType': content_type})
+        else:
+            # Playlists change as segments land; players must re-fetch them
+            s3_client.put_object(Bucket=self.bucket, Key=key, Body=body.encode('utf-8'),
+                                 ContentType=content_type, CacheControl='no-cache')
+
+    def sync(self) -> bool:
+        """Uploads whatever is new. Returns False if an upload failed."""
+        master = self._read(HLS_MASTER_PLAYLIST)
+        if master is None:
+            return True
+        renditions = _playlist_uris(master)
+        try:
+            for rendition in renditions:
+                playlist = self._read(rendition)
+                if playlist is None or playlist == self._playlists.get(rendition):
+                    continue
+                for uri in _playlist_uris(playlist):
+                    if uri not in self._uploaded:
+                        self._put(uri)
+                        self._uploaded.add(uri)
+                self._put(rendition, playlist)
+                self._playlists[rendition] = playlist
+
+            if not self._ready and renditions and all(r in self._playlists for r in renditions):
+                self._put(HLS_MASTER_PLAYLIST, master)
+                self._ready = True
+                logger.info(f"HLS output s3://{self.bucket}/{self.s3_prefix}{HLS_MASTER_PLAYLIST} is playable")
+                if self.on_ready is not None:
+                    self.on_ready()
+        except (ClientError, OSError) as e:
+            logger.error(f"Error uploading HLS output to s3://{self.bucket}/{self.s3_prefix}: {e}")
+            return False
+        return True
+
+
+def apply_lut_to_video_hls(input_video_path: str, lut_path: str, output_directory: str, bucket: str, s3_prefix: str,
+                           crf: int = 23, lut_kind: str = "3d", on_ready: Optional[Callable[[], None]] = None) -> bool:
+    """
+    Applies a LUT to a video and streams it to S3 as HLS (fragmented MP4) while encoding.
+    The master playlist ends up at `{s3_prefix}master.m3u8`; `on_ready` is called once it is playable.
+
+    Returns:
+        bool: True if successful, False otherwise.
+    """
+    probe = probe_video(input_video_path)
+    if probe is None:
+        return False
+    source_height, has_audio = probe
+    heights = rendition_heights(source_height)
+    os.makedirs(output_directory, exist_ok=True)
+    command = build_hls_command(input_video_path, build_lut_filter(lut_path, lut_kind), heights, has_audio,
+                                output_directory, crf)
+
+    logger.info(f"Processing video: {input_video_path} with LUT: {lut_path} as HLS {heights}")
+    logger.info(f"Executing command: {' '.join(command)}")
+
+    uploader = ProgressiveUploader(output_directory, bucket, s3_prefix, on_ready)
+    with tempfile.TemporaryFile() as stderr:
+        try:
+            process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=stderr)
+        except FileNotFoundError:
+            logger.error("Error: 'ffmpeg' command not found. Please ensure FFmpeg is installed and in your system's PATH.")
+            return False
+
+        uploaded = True
+        while process.poll() is None:
+            time.sleep(HLS_UPLOAD_POLL_SECONDS)
+            if not uploader.sync():
+                uploaded = False
+                process.kill()
+                process.wait()
+                break
+
+        if process.returncode != 0:
+            if uploaded:
+                stderr.seek(0)
+                logger.error(f"An error occurred during FFmpeg execution for {input_video_path}.")
+                logger.error(f"Error message:\n{stderr.read().decode('utf-8', errors='replace')[-4000:]}")
+            return False
+
+    # Final sync picks up the last segments and the playlists with EXT-X-ENDLIST
+    if not uploader.sync():
+        return False
+    logger.info(f"Video processing successful! Streamed to: s3://{bucket}/{s3_prefix}{HLS_MASTER_PLAYLIST}")
+    return True
@@ -0,0 +1,71 @@
+import os
+import time
+import logging
+import threading
+from datetime import datetime
+from typing import Optional
+
+from database_utils import update_job
+
+logger = logging.getLogger(__name__)
+
+# --- Job Status Configuration --- #
+# The API creates a job record (status "queued") for every job it enqueues; the worker moves it
+# through its stages so clients can follow a job with GET /jobs/{id} or its event stream instead
+# of re-listing their media.
+JOB_STATUS_DOWNLOADING = "downloading"
+JOB_STATUS_ENCODING = "encoding"
+JOB_STATUS_UPLOADING = "uploading"
+JOB_STATUS_COMPLETED = "completed"
+JOB_STATUS_RETRYING = "retrying" # The attempt failed; SQS will offer the message again
+JOB_STATUS_FAILED = "failed" # Dead-lettered: the job will not be retried
+# Progress is written at most this often, and only when it moved by at least PROGRESS_MIN_STEP points
+PROGRESS_UPDATE_SECONDS = float(os.environ.get('PROGRESS_UPDATE_SECONDS', '2'))
+PROGRESS_MIN_STEP = 1
+
+
+class JobReporter:
+    """
+    Writes a job's stage and progress to its record in the jobs table. A failed write is logged
+    and otherwise ignored: status reporting never fails a job. Messages without a job_id (sent
+    before jobs were tracked) get a reporter that does nothing.
+    """
+
+    def __init__(self, job_id: Optional[str]):
+        self.job_id = job_id
+        self._lock = threading.Lock()
+        self._progress = -1
+        self._written_at = 0.0
+        self.last_error: Optional[str] = None
+
+    def _write(self, fields: dict):
+        fields['updated_at'] = datetime.utcnow()
+        try:
+            update_job(self.job_id, fields)
+        except Exception as e:
+            logger.warning(f"Could not update job {self.job_id}: {e}")
+
+    def stage(self, status: str, **fields):
+        """Records a new stage, with any extra fields (progress, error, output_media_id)."""
+        if fields.get('error'):
+            self.last_error = fields['error']
+        if not self.job_id:
+            return
+        with self._lock:
+            if 'progress' in fields:
+                self._progress = fields['progress']
+            self._written_at = time.monotonic()
+            self._write(dict(fields, status=status))
+
+    def progress(self, percent: float):
+        """Records encode progress (0-100), throttled to one write per PROGRESS_UPDATE_SECONDS."""
+        if not self.job_id:
+            return
+        percent = int(min(max(percent, 0), 100))
+        with self._lock:
+            now = time.monotonic()
+            if percent - self._progress < PROGRESS_MIN_STEP or now - self._written_at < PROGRESS_UPDATE_SECONDS:
+                return
+            self._progress = percent
+            self._written_at = now
+            self._write({'progress': percent})
@@ -0,0 +1,59 @@
+import hashlib
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+
+from lut_utils import analyze_lut, separable_curves, write_cube_1d, CompiledLutError
+from lut_utils import LUT_CLASS_SEPARABLE, LUT_CLASS_3D
+from lut_store import load_lut_grid
+from lut_cache import acquire_generated_lut
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+# LUT path -> its class, as analyzed in this process
+_classes: Dict[str, str] = {}
+
+
+def _acquire_1d_variant(lut_path: str) -> Optional[str]:
+    """The pinned path of a separable LUT's 1D variant in the LUT cache, built on first use."""
+    name = hashlib.sha256(lut_path.encode('utf-8')).hexdigest()
+
+    def generate(temp_path: str):
+        write_cube_1d(separable_curves(load_lut_grid(lut_path)), temp_path)
+
+    return acquire_generated_lut(f"lut1d-{name}.cube", generate)
+
+
+def plan_lut(lut_path: str, lut_class: Optional[str] = None) -> Tuple[str, str]:
+    """
+    Decides how a LUT should be applied and returns (class, path):
+    - identity:  nothing to grade, the input can be copied as is;
+    - separable: three per-channel curves, applied with ffmpeg's lut1d using the returned 1D file;
+    - 3d:        a real 3D LUT, applied with lut3d using the original file.
+    `lut_class` is the backend's classification, stored on the filter record at upload, and is
+    trusted as is so the two never disagree about a LUT. Only LUTs without one (composed chains,
+    filters uploaded before LUTs were classified) are analyzed here, once per process.
+    The 1D file of a separable LUT lives in the LUT cache and is pinned for the caller, who
+    releases it with release_lut() once done; the other classes return the (unpinned) input path.
+    """
+    if lut_class is None:
+        with _lock:
+            lut_class = _classes.get(lut_path)
+    if lut_class is None:
+        try:
+            lut_class, _ = analyze_lut(load_lut_grid(lut_path))
+        except (CompiledLutError, OSError, ValueError) as e:
+            logger.warning(f"Could not analyze LUT {lut_path}, applying it as a 3D LUT: {e}")
+            return LUT_CLASS_3D, lut_path
+        logger.info(f"LUT {lut_path} analyzed as {lut_class}")
+        with _lock:
+            _classes[lut_path] = lut_class
+
+    if lut_class != LUT_CLASS_SEPARABLE:
+        return lut_class, lut_path
+    lut_1d_path = _acquire_1d_variant(lut_path)
+    if lut_1d_path is None:
+        logger.warning(f"Could not build the 1D variant of LUT {lut_path}, applying it as a 3D LUT")
+        return LUT_CLASS_3D, lut_path
+    return LUT_CLASS_SEPARABLE, lut_1d_path
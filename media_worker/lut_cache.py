@@ -0,0 +1,197 @@
+import os
+import hashlib
+import logging
+import tempfile
+import threading
+from typing import Callable, Dict, Optional
+
+import boto3
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger(__name__)
+
+s3_client = boto3.client('s3', region_name=os.environ.get('AWS_REGION', 'ap-southeast-2'))
+
+# --- LUT Cache Configuration --- #
+# LUTs baked into the image are used directly; anything else (custom or admin-uploaded filters)
+# is fetched from S3 on first use and kept in a size-bounded, least-recently-used disk cache.
+LUT_CACHE_DIRECTORY = os.environ.get('LUT_CACHE_DIRECTORY', '/tmp/lut_cache')
+LUT_CACHE_MAX_BYTES = int(os.environ.get('LUT_CACHE_MAX_BYTES', str(512 * 1024 ** 2)))
+
+_lock = threading.Lock()
+# Cache entry name -> event set when the in-flight download (or generation) of that LUT finishes
+_downloads: Dict[str, threading.Event] = {}
+# Cached path -> number of jobs currently using it; pinned files are never evicted
+_pins: Dict[str, int] = {}
+
+
+def _cache_key(s3_filter_key: str, checksum: Optional[str]) -> str:
+    # Content-addressed when the checksum is known, so a re-uploaded filter never serves stale data
+    if checksum:
+        return checksum
+    return hashlib.sha256(s3_filter_key.encode('utf-8')).hexdigest()
+
+
+def file_checksum(path: str) -> str:
+    """SHA-256 of a file's contents, the same checksum the backend stores as a filter's content_hash."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _download_lut(bucket: str, s3_filter_key: str, checksum: Optional[str], cached_path: str,
+                  convert: Optional[Callable[[str, str], None]] = None) -> bool:
+    """
+    Downloads a LUT to a temporary file in the cache directory and renames it into place.
+    With `convert`, the download is first turned into the cached file by convert(downloaded, output).
+    """
+    fd, temp_path = tempfile.mkstemp(dir=LUT_CACHE_DIRECTORY, suffix='.part')
+    os.close(fd)
+    converted_path = f"{temp_path}.converted.part"
+    try:
+        s3_client.download_file(bucket, s3_filter_key, temp_path)
+        if convert is not None:
+            convert(temp_path, converted_path)
+            os.replace(converted_path, temp_path)
+        elif checksum and file_checksum(temp_path) != checksum:
+            logger.error(f"Checksum mismatch for LUT s3://{bucket}/{s3_filter_key}; not caching it.")
+            return False
+        # Atomic on the same filesystem: readers see either no file or the complete file
+        os.replace(temp_path, cached_path)
+        logger.info(f"Cached LUT s3://{bucket}/{s3_filter_key} at {cached_path}")
+        return True
+    except ClientError as e:
+        logger.error(f"Error downloading LUT {s3_filter_key} from S3: {e}")
+        return False
+    except ValueError as e:
+        logger.error(f"LUT s3://{bucket}/{s3_filter_key} could not be converted: {e}")
+        return False
+    finally:
+        for path in (temp_path, converted_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def _evict_if_needed():
+    """Removes least recently used, unpinned LUTs until the cache fits in LUT_CACHE_MAX_BYTES."""
+    entries = []
+    for name in os.listdir(LUT_CACHE_DIRECTORY):
+        if name.endswith('.part'):
+            continue
+        path = os.path.join(LUT_CACHE_DIRECTORY, name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    total_bytes = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total_bytes <= LUT_CACHE_MAX_BYTES:
+            break
+        if _pins.get(path):
+            continue
+        try:
+            os.remove(path)
+            total_bytes -= size
+            logger.info(f"Evicted {path} from the LUT cache")
+        except FileNotFoundError:
+            pass
+
+
+def _acquire_cached(cache_name: str, produce: Callable[[str], bool]) -> Optional[str]:
+    """
+    Returns the pinned path of cache entry `cache_name`, creating it with produce(path) if missing.
+    `produce` writes the entry to the given final path (see _download_lut); only one thread
+    produces a given entry at a time and the others wait for its result.
+    """
+    os.makedirs(LUT_CACHE_DIRECTORY, exist_ok=True)
+    cached_path = os.path.join(LUT_CACHE_DIRECTORY, cache_name)
+
+    while True:
+        with _lock:
+            if os.path.exists(cached_path):
+                _pins[cached_path] = _pins.get(cached_path, 0) + 1
+                os.utime(cached_path) # Mark as recently used
+                return cached_path
+            download_done = _downloads.get(cache_name)
+            if download_done is None:
+                # This thread produces the entry; others wait for it
+                download_done = threading.Event()
+                _downloads[cache_name] = download_done
+                is_producer = True
+            else:
+                is_producer = False
+
+        if not is_producer:
+            download_done.wait()
+            with _lock:
+                if not os.path.exists(cached_path):
+                    # The shared download failed; don't retry it once per waiting job
+                    return None
+            continue
+
+        produced = False
+        try:
+            produced = produce(cached_path)
+        finally:
+            with _lock:
+                del _downloads[cache_name]
+                if produced:
+                    # Pin before evicting so the new file can't be the one that goes
+                    _pins[cached_path] = _pins.get(cached_path, 0) + 1
+                    _evict_if_needed()
+                download_done.set()
+        return cached_path if produced else None
+
+
+def acquire_lut(bucket: str, s3_filter_key: str, checksum: Optional[str] = None,
+                convert: Optional[Callable[[str, str], None]] = None, suffix: Optional[str] = None) -> Optional[str]:
+    """
+    Returns a local path to the LUT stored at `s3_filter_key`, downloading it if it is not cached.
+    Concurrent jobs asking for the same LUT share one download. The returned path stays pinned
+    in the cache until release_lut() is called for it.
+    When `convert` is given the checksum only names the cache entry (it describes the source .cube,
+    not the downloaded object), and `suffix` sets the extension of the converted file.
+    """
+    key = _cache_key(s3_filter_key, checksum)
+    if convert is not None:
+        key = f"compiled-{key}"
+    suffix = suffix or os.path.splitext(s3_filter_key)[1] or '.cube'
+    return _acquire_cached(
+        f"{key}{suffix}",
+        lambda cached_path: _download_lut(bucket, s3_filter_key, checksum, cached_path, convert)
+    )
+
+
+def acquire_generated_lut(cache_name: str, generate: Callable[[str], None]) -> Optional[str]:
+    """
+    Like acquire_lut(), for LUTs built locally (e.g. composed chains): generate(path) writes the
+    LUT to a temporary path that is then renamed into the cache.
+    """
+    def produce(cached_path: str) -> bool:
+        temp_path = f"{cached_path}.{threading.get_ident()}.part"
+        try:
+            generate(temp_path)
+            os.replace(temp_path, cached_path)
+            logger.info(f"Cached generated LUT at {cached_path}")
+            return True
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not generate LUT {cache_name}: {e}")
+            return False
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    return _acquire_cached(cache_name, produce)
+
+
+def release_lut(cached_path: str):
+    """Unpins a path returned by acquire_lut() so it can be evicted again."""
+    with _lock:
+        if _pins.get(cached_path):
+            _pins[cached_path] -= 1
+            if not _pins[cached_path]:
+                del _pins[cached_path]
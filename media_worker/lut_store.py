@@ -0,0 +1,61 @@
+import os
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from lut_cache import acquire_generated_lut, release_lut, file_checksum
+from lut_utils import CompiledLut, read_cube, write_compiled_lut, map_compiled_lut, COMPILED_LUT_SUFFIX
+
+logger = logging.getLogger(__name__)
+
+# --- LUT Grid Store --- #
+# Decoded LUT grids are kept as compiled (binary float32) files in the LUT cache and memory-mapped
+# read-only, so the worker's own Python readers (LUT analysis, the 1D variants of separable LUTs and
+# chain composition) don't each parse the .cube text into a private copy.
+# The LUT cache is the single owner: it writes each grid once (atomically) and evicts it, while
+# readers only map it. All mappings of one file share the same pages of the OS page cache.
+# ffmpeg is not a reader: its lut3d/lut1d filters still parse the .cube file and hold their own copy
+# of the grid in every encode process (about 3 MB for a 65-point grid).
+# Grids mapped by this process, kept open for reuse; closing one only drops this process's mapping
+LUT_STORE_MAX_MAPPINGS = int(os.environ.get('LUT_STORE_MAX_MAPPINGS', '32'))
+
+_lock = threading.Lock()
+# LUT path -> mapped grid, least recently used first
+_mapped: "OrderedDict[str, CompiledLut]" = OrderedDict()
+
+
+def load_lut_grid(lut_path: str, checksum: Optional[str] = None) -> CompiledLut:
+    """
+    Returns the decoded grid of the .cube LUT at `lut_path` as a zero-copy view onto its compiled
+    file in the LUT cache, compiling it there on first use (by any process sharing the cache).
+    `checksum` is the LUT's content hash if known; it names the compiled entry.
+    Falls back to parsing the .cube into memory if the compiled entry can't be produced.
+    """
+    with _lock:
+        grid = _mapped.get(lut_path)
+        if grid is not None:
+            _mapped.move_to_end(lut_path)
+            return grid
+
+    checksum = checksum or file_checksum(lut_path)
+    compiled_path = acquire_generated_lut(
+        f"grid-{checksum}{COMPILED_LUT_SUFFIX}",
+        lambda temp_path: write_compiled_lut(read_cube(lut_path), temp_path)
+    )
+    if compiled_path is None:
+        logger.warning(f"Could not store a compiled grid for {lut_path}; reading it into memory instead.")
+        return read_cube(lut_path)
+
+    try:
+        grid = map_compiled_lut(compiled_path)
+    finally:
+        # The mapping stays valid after the cache evicts the file, so it doesn't need to stay pinned
+        release_lut(compiled_path)
+
+    with _lock:
+        _mapped[lut_path] = grid
+        while len(_mapped) > LUT_STORE_MAX_MAPPINGS:
+            # Not closed explicitly: jobs may still hold the view; the mapping goes once they drop it
+            _mapped.popitem(last=False)
+    return grid
@@ -0,0 +1,257 @@
+import os
+import sys
+import mmap
+import struct
+from array import array
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# --- Compiled LUT format (written by the backend's utils/lut_utils.py at upload) --- #
+# 32-byte header: magic, version, padding, grid size, domain min (3 x f32), domain max (3 x f32).
+# Then size^3 RGB triplets as little-endian float32 in .cube order (red changes fastest).
+COMPILED_LUT_MAGIC = b"LUT3"
+COMPILED_LUT_VERSION = 1
+COMPILED_LUT_HEADER = struct.Struct("<4sBxH3f3f")
+COMPILED_LUT_SUFFIX = ".lut3d"
+
+
+# Largest per-channel difference (in output units) still treated as "the same" when analyzing a LUT
+LUT_ANALYSIS_TOLERANCE = float(os.environ.get('LUT_ANALYSIS_TOLERANCE', str(1 / 255)))
+
+# LUT classes, as stored on the filter record by the backend
+LUT_CLASS_IDENTITY = "identity"
+LUT_CLASS_SEPARABLE = "separable"
+LUT_CLASS_3D = "3d"
+
+
+class CompiledLutError(ValueError):
+    """Raised when a compiled LUT sidecar is truncated or not in the expected format."""
+
+
+@dataclass
+class CompiledLut:
+    size: int
+    domain_min: Tuple[float, float, float]
+    domain_max: Tuple[float, float, float]
+    values: Sequence[float]  # float32, size^3 * 3 entries (an array, or a memoryview over a mapped file)
+
+
+def _check_compiled_header(data) -> Tuple[int, Tuple[float, ...]]:
+    if len(data) < COMPILED_LUT_HEADER.size:
+        raise CompiledLutError("Compiled LUT is shorter than its header.")
+    magic, version, size, *domain = COMPILED_LUT_HEADER.unpack_from(data)
+    if magic != COMPILED_LUT_MAGIC or version != COMPILED_LUT_VERSION:
+        raise CompiledLutError(f"Unsupported compiled LUT format {magic!r} v{version}.")
+
+    expected_bytes = COMPILED_LUT_HEADER.size + size ** 3 * 3 * 4
+    if len(data) != expected_bytes:
+        raise CompiledLutError(f"Compiled LUT has {len(data)} bytes, expected {expected_bytes}.")
+    return size, tuple(domain)
+
+
+def load_compiled_lut(data: bytes) -> CompiledLut:
+    """Loads a compiled LUT sidecar, checking its header and length."""
+    size, domain = _check_compiled_header(data)
+    values = array('f')
+    values.frombytes(data[COMPILED_LUT_HEADER.size:])
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return CompiledLut(size=size, domain_min=tuple(domain[:3]), domain_max=tuple(domain[3:]), values=values)
+
+
+def write_cube(lut: CompiledLut, path: str):
+    """Writes a LUT as a canonical .cube file that ffmpeg's lut3d filter can read."""
+    with open(path, 'w') as f:
+        f.write(f"LUT_3D_SIZE {lut.size}\n")
+        f.write("DOMAIN_MIN {:.6f} {:.6f} {:.6f}\n".format(*lut.domain_min))
+        f.write("DOMAIN_MAX {:.6f} {:.6f} {:.6f}\n".format(*lut.domain_max))
+        values = lut.values
+        f.writelines(
+            f"{values[i]:.6f} {values[i + 1]:.6f} {values[i + 2]:.6f}\n"
+            for i in range(0, len(values), 3)
+        )
+
+
+def write_compiled_lut(lut: CompiledLut, path: str):
+    """Writes a LUT in the compiled binary format (the same format as the upload sidecar)."""
+    values = array('f', lut.values)
+    if sys.byteorder == 'big':
+        values.byteswap() # The format is little-endian
+    with open(path, 'wb') as f:
+        f.write(COMPILED_LUT_HEADER.pack(COMPILED_LUT_MAGIC, COMPILED_LUT_VERSION, lut.size, *lut.domain_min, *lut.domain_max))
+        f.write(values.tobytes())
+
+
+def map_compiled_lut(path: str) -> CompiledLut:
+    """
+    Maps a compiled LUT file read-only. The grid is a view straight onto the mapping, so every
+    thread and worker process that maps the same file shares one copy in the page cache
+    (ffmpeg reads the .cube file instead, see lut_store.py).
+    The mapping stays valid even if the file is later deleted from the cache.
+    """
+    if sys.byteorder == 'big':
+        # The on-disk format is little-endian; a zero-copy view is only possible on little-endian hosts
+        with open(path, 'rb') as f:
+            return load_compiled_lut(f.read())
+    with open(path, 'rb') as f:
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    size, domain = _check_compiled_header(mapping)
+    values = memoryview(mapping)[COMPILED_LUT_HEADER.size:].cast('f')
+    return CompiledLut(size=size, domain_min=domain[:3], domain_max=domain[3:], values=values)
+
+
+def compiled_to_cube(compiled_path: str, cube_path: str):
+    """Converts a downloaded compiled sidecar into a .cube file, validating it on the way."""
+    with open(compiled_path, 'rb') as f:
+        lut = load_compiled_lut(f.read())
+    write_cube(lut, cube_path)
+
+
+def read_cube(path: str) -> CompiledLut:
+    """Reads a 3D .cube file (bundled or rendered by compiled_to_cube) into memory."""
+    size = None
+    domain_min = (0.0, 0.0, 0.0)
+    domain_max = (1.0, 1.0, 1.0)
+    values = array('f')
+    with open(path, 'r', errors='replace') as f:
+        for line in f:
+            parts = line.split()
+            if not parts or parts[0].startswith('#'):
+                continue
+            keyword = parts[0].upper()
+            if keyword == 'LUT_3D_SIZE':
+                size = int(parts[1])
+            elif keyword == 'DOMAIN_MIN':
+                domain_min = tuple(float(p) for p in parts[1:4])
+            elif keyword == 'DOMAIN_MAX':
+                domain_max = tuple(float(p) for p in parts[1:4])
+            elif keyword.isalpha() or '_' in keyword:
+                continue
+            else:
+                values.extend(float(p) for p in parts[:3])
+    if size is None or len(values) != size ** 3 * 3:
+        raise CompiledLutError(f"{path} is not a complete 3D .cube LUT.")
+    return CompiledLut(size=size, domain_min=domain_min, domain_max=domain_max, values=values)
+
+
+def separable_curves(lut: CompiledLut) -> List[List[float]]:
+    """
+    The three per-channel curves of a separable LUT, read along the cube's edges from black:
+    red varies with r at g=b=0, and so on. Only meaningful for LUTs classed as separable.
+    """
+    n = lut.size
+    values = lut.values
+    return [
+        [values[i * 3] for i in range(n)],
+        [values[(i * n) * 3 + 1] for i in range(n)],
+        [values[(i * n * n) * 3 + 2] for i in range(n)],
+    ]
+
+
+def analyze_lut(lut: CompiledLut, tolerance: float = LUT_ANALYSIS_TOLERANCE) -> Tuple[str, Optional[List[List[float]]]]:
+    """
+    Classifies a 3D LUT as identity, per-channel separable, or a true 3D LUT.
+    A LUT is separable when each output channel depends only on its own input channel, i.e. it is
+    three 1D curves stored as a cube. Returns the class and, for separable LUTs, the three curves.
+    Uploaded filters are classified by the backend instead; this is for LUTs without a stored class.
+    """
+    if lut.domain_min != (0.0, 0.0, 0.0) or lut.domain_max != (1.0, 1.0, 1.0):
+        return LUT_CLASS_3D, None
+
+    n = lut.size
+    values = lut.values
+    curves = separable_curves(lut)
+
+    is_identity = True
+    index = 0
+    for b in range(n):
+        for g in range(n):
+            for r in range(n):
+                red, green, blue = values[index], values[index + 1], values[index + 2]
+                index += 3
+                if (abs(red - curves[0][r]) > tolerance or abs(green - curves[1][g]) > tolerance
+                        or abs(blue - curves[2][b]) > tolerance):
+                    return LUT_CLASS_3D, None
+                if is_identity and (abs(red - r / (n - 1)) > tolerance or abs(green - g / (n - 1)) > tolerance
+                                    or abs(blue - b / (n - 1)) > tolerance):
+                    is_identity = False
+
+    if is_identity:
+        return LUT_CLASS_IDENTITY, None
+    return LUT_CLASS_SEPARABLE, curves
+
+
+def write_cube_1d(curves: List[List[float]], path: str):
+    """Writes three per-channel curves as a 1D .cube file for ffmpeg's lut1d filter."""
+    with open(path, 'w') as f:
+        f.write(f"LUT_1D_SIZE {len(curves[0])}\n")
+        f.writelines(
+            f"{red:.6f} {green:.6f} {blue:.6f}\n"
+            for red, green, blue in zip(*curves)
+        )
+
+
+def sample_lut(lut: CompiledLut, red: float, green: float, blue: float) -> Tuple[float, float, float]:
+    """Looks up one colour in a 3D LUT with trilinear interpolation, clamping to the LUT's domain."""
+    n = lut.size
+    values = lut.values
+    coords = []
+    for channel, value in enumerate((red, green, blue)):
+        low, high = lut.domain_min[channel], lut.domain_max[channel]
+        position = (min(max(value, low), high) - low) / (high - low) * (n - 1)
+        index = min(int(position), n - 2)
+        coords.append((index, position - index))
+    (r0, fr), (g0, fg), (b0, fb) = coords
+
+    result = [0.0, 0.0, 0.0]
+    for db, wb in ((0, 1 - fb), (1, fb)):
+        for dg, wg in ((0, 1 - fg), (1, fg)):
+            for dr, wr in ((0, 1 - fr), (1, fr)):
+                weight = wr * wg * wb
+                if not weight:
+                    continue
+                offset = (((b0 + db) * n + (g0 + dg)) * n + (r0 + dr)) * 3
+                result[0] += weight * values[offset]
+                result[1] += weight * values[offset + 1]
+                result[2] += weight * values[offset + 2]
+    return result[0], result[1], result[2]
+
+
+def _sample_lut_grid(lut: CompiledLut, colors: "np.ndarray") -> "np.ndarray":
+    """Vectorized sample_lut: looks up an (N, 3) array of colours at once."""
+    n = lut.size
+    # Zero-copy over the array or mapped view; .cube order indexes the grid as [blue][green][red]
+    grid = np.frombuffer(lut.values, dtype=np.float32).reshape(n, n, n, 3)
+    low, high = np.asarray(lut.domain_min), np.asarray(lut.domain_max)
+    position = (np.clip(colors, low, high) - low) / (high - low) * (n - 1)
+    index = np.minimum(position.astype(np.intp), n - 2)
+    fraction = position - index
+    (r0, g0, b0), (fr, fg, fb) = index.T, fraction.T
+
+    result = np.zeros_like(colors)
+    for db, wb in ((0, 1 - fb), (1, fb)):
+        for dg, wg in ((0, 1 - fg), (1, fg)):
+            for dr, wr in ((0, 1 - fr), (1, fr)):
+                result += (wr * wg * wb)[:, None] * grid[b0 + db, g0 + dg, r0 + dr]
+    return result
+
+
+def compose_luts(luts: List[CompiledLut], intensity: float = 1.0, size: Optional[int] = None) -> CompiledLut:
+    """
+    Folds an ordered chain of LUTs and a strength into a single 3D LUT:
+    output = input + intensity * (lutN(...lut1(input)) - input).
+    Applying the result costs one LUT pass per frame however many looks are stacked.
+    The whole grid is sampled with numpy at once, so a 65-point chain composes in well under a second.
+    """
+    size = size or max(lut.size for lut in luts)
+    axis = np.arange(size) / (size - 1)
+    blue, green, red = np.meshgrid(axis, axis, axis, indexing='ij')
+    source = np.stack((red, green, blue), axis=-1).reshape(-1, 3) # .cube order, red fastest
+    color = source
+    for lut in luts:
+        color = _sample_lut_grid(lut, color)
+    values = array('f')
+    values.frombytes((source + intensity * (color - source)).astype(np.float32).tobytes())
+    return CompiledLut(size=size, domain_min=(0.0, 0.0, 0.0), domain_max=(1.0, 1.0, 1.0), values=values)
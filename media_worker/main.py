@@ -3,12 +3,39 @@ import os
 import json
 import logging
 import time
+import shutil
+import hashlib
+import tempfile
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
 from botocore.exceptions import ClientError
 
-from process_logic import apply_lut_to_video, apply_lut_to_image
+from tracing import instrument_boto3, start_span, traceparent_from_message, TRACEPARENT
+instrument_boto3() # Before the modules below create their AWS clients
+
+from process_logic import apply_lut_to_video, apply_lut_to_image, copy_media
 from worker_schemas import MediaItemInDB
-from database_utils import add_media_item
-from uuid import UUID # Needed for MediaItemInDB
+from database_utils import add_media_item, record_job_attempt
+from uuid import UUID, uuid5, NAMESPACE_URL # Needed for MediaItemInDB
+from scheduling import SQS_QUEUE_URL, WORKER_CONCURRENCY, build_lanes, WeightedLaneSelector
+from scheduling import FairShareScheduler, make_buffered_job, MAX_BUFFERED_MESSAGES
+from pipeline import JobPipeline, WORK_DIRECTORY
+from lut_cache import acquire_lut, acquire_generated_lut, release_lut, file_checksum
+from lut_utils import compiled_to_cube, write_cube, compose_luts, CompiledLutError, LUT_CLASS_IDENTITY
+from lut_utils import LUT_CLASS_SEPARABLE
+from lut_analysis import plan_lut
+from lut_store import load_lut_grid
+from tiled_image import is_large_image, is_strip_output, apply_lut_to_large_image
+from output_formats import plan_image_output, ImageOutput
+from hls_output import apply_lut_to_video_hls, HLS_MASTER_PLAYLIST, HLS_MEDIA_TYPE
+from preview import render_preview
+from chunked_video import probe_duration, apply_lut_to_video_chunked, discard_chunks, CHUNKED_VIDEO_MIN_SECONDS
+from job_status import JobReporter, JOB_STATUS_DOWNLOADING, JOB_STATUS_ENCODING, JOB_STATUS_UPLOADING
+from job_status import JOB_STATUS_COMPLETED, JOB_STATUS_RETRYING, JOB_STATUS_FAILED
+from profiling import profile_job
+from preflight import preflight_input, PoisonMessage
+from visibility import VisibilityHeartbeat
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -21,11 +48,23 @@ logger.addHandler(handler)
 # AWS Clients
 sqs_client = boto3.client('sqs', region_name=os.environ.get('AWS_REGION', 'ap-southeast-2'))
 s3_client = boto3.client('s3', region_name=os.environ.get('AWS_REGION', 'ap-southeast-2'))
+# Keeps messages invisible while their jobs run, however long they take
+visibility_heartbeat = VisibilityHeartbeat(sqs_client)
 
 # Configuration from environment variables
-SQS_QUEUE_URL = "https://sqs.ap-southeast-2.amazonaws.com/901444280953/n11696630"# os.environ.get('SQS_QUEUE_URL')
 S3_BUCKET_NAME = "n11696630" #os.environ.get('S3_BUCKET_NAME')
 LUT_DIRECTORY = os.environ.get('LUT_DIRECTORY', '/app/assets/luts') # Default path inside container
+# Grid size of composed LUT chains; 0 uses the largest grid in the chain
+COMPOSED_LUT_SIZE = int(os.environ.get('COMPOSED_LUT_SIZE', '0'))
+# Long poll wait when polling a single lane; with several lanes a short wait keeps the others responsive
+SQS_WAIT_TIME_SECONDS = 20
+LANE_POLL_WAIT_SECONDS = int(os.environ.get('LANE_POLL_WAIT_SECONDS', '2'))
+# Delay before a message is offered again when its user's sub-queue in this worker is full
+BUFFER_FULL_RETRY_SECONDS = 10
+# A job that fails (or never finishes) this many attempts is dead-lettered instead of retried
+MAX_JOB_ATTEMPTS = int(os.environ.get('MAX_JOB_ATTEMPTS', '5'))
+# Dead-lettered messages are kept in S3 under this prefix, with the reason they were given up on
+DEAD_LETTER_PREFIX = "dead-letter"
 
 if not SQS_QUEUE_URL:
     logger.error("SQS_QUEUE_URL environment variable not set.")
@@ -54,75 +93,283 @@ def upload_to_s3(bucket: str, key: str, local_path: str) -> bool:
         logger.error(f"Error uploading {local_path} to S3: {e}")
         return False
 
-def process_message(message_body: dict):
-    """Processes a single SQS message."""
+@dataclass
+class JobContext:
+    """Everything the later stages of a job need once its input has been downloaded."""
+    message_body: dict
+    s3_input_key: str
+    s3_output_key: str
+    media_type: str
+    lut_path: str
+    local_input_path: str
+    local_output_path: str
+    work_directory: str # Holds this job's local files alone; removed with them when the job ends
+    crf: int = 23
+    quality: int = 2
+    lut_class: Optional[str] = None
+    pinned_luts: List[str] = field(default_factory=list) # LUT cache entries to release when done
+    streamed: bool = False # Output was uploaded progressively during the encode (HLS)
+    recorded: bool = False # The processed media item has been written to DynamoDB
+    job_type: str = "process" # or "preview": graded straight from S3, uploaded without a media item
+    chunked: bool = False # Encoded in chunks journaled in S3, which are deleted once the output is published
+    duration: Optional[float] = None # Seconds, probed for videos
+    on_progress: Optional[Callable[[float], None]] = None # Gets the encode's percent complete
+
+def cleanup_job_files(job: JobContext):
+    """Removes the job's work directory with its local input and output files, and unpins cached LUTs."""
+    shutil.rmtree(job.work_directory, ignore_errors=True)
+    release_job_luts(job)
+
+def release_job_luts(job: JobContext):
+    """Unpins the cached LUTs the job holds, letting the LUT cache evict them."""
+    while job.pinned_luts:
+        release_lut(job.pinned_luts.pop())
+
+def fetch_lut(lut_spec: dict) -> Tuple[Optional[str], bool]:
+    """
+    Finds one LUT of a job: a LUT bundled in LUT_DIRECTORY is used as is, any other
+    (custom or admin-uploaded) LUT is fetched from S3 through the local LUT cache.
+    Returns the local path (None on failure) and whether it is pinned in the cache.
+    """
+    bundled_path = os.path.join(LUT_DIRECTORY, lut_spec.get('lut_filename') or '')
+    if lut_spec.get('lut_filename') and os.path.exists(bundled_path):
+        return bundled_path, False
+
+    s3_filter_key = lut_spec.get('s3_filter_key')
+    s3_compiled_key = lut_spec.get('s3_compiled_key')
+    checksum = lut_spec.get('filter_checksum')
+    if s3_compiled_key:
+        # Prefer the sidecar compiled (and validated) at upload; it is rendered to a canonical .cube once
+        cached_path = acquire_lut(S3_BUCKET_NAME, s3_compiled_key, checksum, convert=compiled_to_cube, suffix='.cube')
+    elif s3_filter_key:
+        cached_path = acquire_lut(S3_BUCKET_NAME, s3_filter_key, checksum)
+    else:
+        logger.error(f"LUT file not found: {bundled_path}")
+        return None, False
+
+    if not cached_path:
+        logger.error(f"Could not fetch LUT {s3_compiled_key or s3_filter_key} from S3")
+        return None, False
+    return cached_path, True
+
+def compose_lut_chain(lut_paths: List[str], lut_checksums: List[Optional[str]], intensity: float) -> Optional[str]:
+    """
+    Folds a chain of LUTs and an intensity into one LUT in the LUT cache, keyed by
+    (LUT hashes, intensity, grid size), so every combination is built once and costs one pass per frame.
+    """
+    identities = [checksum or file_checksum(path) for path, checksum in zip(lut_paths, lut_checksums)]
+    chain_key = hashlib.sha256(json.dumps([identities, intensity, COMPOSED_LUT_SIZE]).encode('utf-8')).hexdigest()
+
+    def generate(temp_path: str):
+        luts = [load_lut_grid(path, checksum) for path, checksum in zip(lut_paths, identities)]
+        write_cube(compose_luts(luts, intensity, COMPOSED_LUT_SIZE or None), temp_path)
+
+    return acquire_generated_lut(f"chain-{chain_key}.cube", generate)
+
+def resolve_lut(job: JobContext, lut_filename: str) -> bool:
+    """
+    Points the job at the single LUT it applies. A chain of LUTs (`lut_chain`) and/or an
+    intensity below 1 are composed into one LUT first.
+    """
+    message_body = job.message_body
+    lut_chain = message_body.get('lut_chain') or [dict(message_body, lut_filename=lut_filename)]
+    intensity = round(min(max(float(message_body.get('intensity', 1.0)), 0.0), 1.0), 3)
+
+    lut_paths = []
+    for lut_spec in lut_chain:
+        lut_path, pinned = fetch_lut(lut_spec)
+        if lut_path is None:
+            return False
+        if pinned:
+            job.pinned_luts.append(lut_path)
+        lut_paths.append(lut_path)
+
+    if len(lut_paths) == 1 and intensity >= 1.0:
+        job.lut_path = lut_paths[0]
+        job.lut_class = lut_chain[0].get('lut_class')
+        return True
+
+    try:
+        composed_path = compose_lut_chain(lut_paths, [spec.get('filter_checksum') for spec in lut_chain], intensity)
+    except (CompiledLutError, OSError, ValueError) as e:
+        logger.error(f"Could not compose LUT chain {lut_paths}: {e}")
+        composed_path = None
+    # The individual LUTs are no longer needed once the composed one exists
+    release_job_luts(job)
+    if not composed_path:
+        return False
+    job.lut_path = composed_path
+    job.pinned_luts.append(composed_path)
+    return True
+
+def prepare_job(message_body: dict) -> Optional[JobContext]:
+    """
+    Stage 1 (network): validates the message, checks the input with a cheap probe of its head and
+    downloads it. Raises PoisonMessage for a message that can never be processed.
+    """
     s3_input_key = message_body.get('s3_input_key')
     s3_output_key = message_body.get('s3_output_key')
     lut_filename = message_body.get('lut_filename')
     media_type = message_body.get('media_type') # 'video' or 'image'
-    crf = message_body.get('crf', 23) # For video
-    quality = message_body.get('quality', 2) # For image
+    estimated_cost = message_body.get('estimated_cost') # pixel-seconds, when the API probed the media
 
     if not all([s3_input_key, s3_output_key, lut_filename, media_type]):
         logger.error(f"Invalid message body: {message_body}. Missing required fields.")
-        return False
+        raise PoisonMessage("The message is missing required fields")
+
+    # Reject inputs that can never be processed before fetching the LUT or downloading anything
+    rejection = preflight_input(S3_BUCKET_NAME, s3_input_key)
+    if rejection:
+        raise PoisonMessage(rejection)
 
-    # Construct local paths
-    local_input_path = f"/tmp/{os.path.basename(s3_input_key)}"
-    local_output_path = f"/tmp/{os.path.basename(s3_output_key)}"
-    lut_path = os.path.join(LUT_DIRECTORY, lut_filename)
+    if estimated_cost is not None:
+        logger.info(f"Job for {s3_input_key} has an estimated cost of {estimated_cost:.0f} pixel-seconds")
 
-    # Ensure LUT file exists
-    if not os.path.exists(lut_path):
-        logger.error(f"LUT file not found: {lut_path}")
+    # Jobs on the same input (a bulk request with several filters, or a preview next to a process
+    # job) can run or prefetch at the same time, so each one downloads and encodes in its own directory
+    work_directory = tempfile.mkdtemp(prefix=f"job-{message_body.get('job_id') or 'untracked'}-", dir=WORK_DIRECTORY)
+    job = JobContext(
+        message_body=message_body,
+        s3_input_key=s3_input_key,
+        s3_output_key=s3_output_key,
+        media_type=media_type,
+        lut_path=os.path.join(LUT_DIRECTORY, lut_filename),
+        local_input_path=os.path.join(work_directory, os.path.basename(s3_input_key)),
+        local_output_path=os.path.join(work_directory, os.path.basename(s3_output_key)),
+        work_directory=work_directory,
+        crf=message_body.get('crf', 23), # For video
+        quality=message_body.get('quality', 2), # For image
+        job_type=message_body.get('job_type', 'process'),
+    )
+
+    try:
+        # Ensure the LUT is available before spending bandwidth on the input
+        if not resolve_lut(job, lut_filename):
+            # LUTs fetched before a later one in the chain failed are still pinned
+            cleanup_job_files(job)
+            return None
+
+        if job.job_type == 'preview':
+            # Previews seek within the input in S3 instead of downloading it
+            return job
+
+        # Download input file from S3
+        if not download_from_s3(S3_BUCKET_NAME, s3_input_key, job.local_input_path):
+            cleanup_job_files(job)
+            return None
+    except BaseException:
+        cleanup_job_files(job)
+        raise
+
+    return job
+
+def select_image_output(job: JobContext) -> Optional[ImageOutput]:
+    """Switches the job's output to the image format it asked for, if any, and returns that format."""
+    image_output = plan_image_output(job.message_body, job.local_input_path)
+    if image_output is not None:
+        job.s3_output_key = f"{os.path.splitext(job.s3_output_key)[0]}{image_output.extension}"
+        job.local_output_path = f"{os.path.splitext(job.local_output_path)[0]}{image_output.extension}"
+        job.media_type = image_output.media_type
+        logger.info(f"Writing {job.s3_input_key} as {image_output.format}")
+    return image_output
+
+def select_video_output(job: JobContext) -> bool:
+    """Switches the job to progressive HLS output if it asked for it. Returns True when it did."""
+    if job.message_body.get('video_output') != 'hls':
         return False
+    # The master playlist and every rendition/segment share a prefix named after the output key
+    job.s3_output_key = f"{os.path.splitext(job.s3_output_key)[0]}/{HLS_MASTER_PLAYLIST}"
+    job.local_output_path = os.path.splitext(job.local_output_path)[0] # A directory from here on
+    job.media_type = HLS_MEDIA_TYPE
+    job.streamed = True
+    return True
 
-    # Download input file from S3
-    if not download_from_s3(S3_BUCKET_NAME, s3_input_key, local_input_path):
+def select_chunked_encode(job: JobContext) -> bool:
+    """Whether a video is long enough to be encoded in resumable chunks (see chunked_video.py)."""
+    job.duration = probe_duration(job.local_input_path)
+    job.chunked = job.duration is not None and job.duration >= CHUNKED_VIDEO_MIN_SECONDS
+    return job.chunked
+
+def encode_preview(job: JobContext, lut_path: str, lut_kind: str) -> bool:
+    """Renders a preview job from a pre-signed URL of its input, so ffmpeg only reads what it seeks to."""
+    try:
+        input_url = s3_client.generate_presigned_url(
+            'get_object', Params={'Bucket': S3_BUCKET_NAME, 'Key': job.s3_input_key}, ExpiresIn=600
+        )
+    except ClientError as e:
+        logger.error(f"Error creating a pre-signed URL for {job.s3_input_key}: {e}")
         return False
+    message_body = job.message_body
+    return render_preview(
+        input_url, lut_path, job.local_output_path, lut_kind,
+        mode=message_body.get('preview_mode', 'frames'),
+        start=float(message_body.get('preview_start') or 0.0),
+        duration=message_body.get('duration'),
+    )
 
-    # Process media
+def encode_job(job: JobContext, span=None) -> bool:
+    """Stage 2 (CPU): applies the LUT with ffmpeg. The encode path taken is noted on `span`, if given."""
     success = False
-    if 'video' in media_type: # Check if 'video' is in the MIME type
-        success = apply_lut_to_video(local_input_path, lut_path, local_output_path, crf)
-    elif 'image' in media_type: # Check if 'image' is in the MIME type
-        success = apply_lut_to_image(local_input_path, lut_path, local_output_path, quality)
-    else:
-        logger.error(f"Unsupported media type: {media_type}")
+    lut_kind, lut_path = plan_lut(job.lut_path, job.lut_class)
+    if lut_kind == LUT_CLASS_SEPARABLE:
+        job.pinned_luts.append(lut_path) # The 1D variant, pinned in the LUT cache until the job is done
+    if span is not None:
+        span.set(lut_kind=lut_kind, job_type=job.job_type)
+    if job.job_type == 'preview':
+        return encode_preview(job, lut_path, lut_kind)
+    image_output = select_image_output(job) if 'image' in job.media_type else None
+    encoder_args = image_output.encoder_args if image_output else None
+    if 'video' not in job.media_type and 'image' not in job.media_type:
+        logger.error(f"Unsupported media type: {job.media_type}")
+    elif 'video' in job.media_type and select_video_output(job):
+        # Segments are uploaded as they are encoded; the item is recorded as soon as it is playable
+        success = apply_lut_to_video_hls(
+            job.local_input_path, lut_path, job.local_output_path, S3_BUCKET_NAME,
+            job.s3_output_key[:-len(HLS_MASTER_PLAYLIST)], job.crf, lut_kind,
+            on_ready=lambda: record_processed_item(job)
+        )
+    elif lut_kind == LUT_CLASS_IDENTITY and image_output is None:
+        success = copy_media(job.local_input_path, job.local_output_path)
+    elif 'video' in job.media_type and select_chunked_encode(job):
+        # Long videos resume from their last committed chunk if this job is interrupted and retried
+        success = apply_lut_to_video_chunked(
+            job.local_input_path, lut_path, job.local_output_path, S3_BUCKET_NAME, job.s3_output_key,
+            job.duration, job.crf, lut_kind, on_progress=job.on_progress
+        )
+    elif 'video' in job.media_type: # Check if 'video' is in the MIME type
+        success = apply_lut_to_video(job.local_input_path, lut_path, job.local_output_path, job.crf, lut_kind,
+                                     duration=job.duration, on_progress=job.on_progress)
+    elif 'image' in job.media_type and is_strip_output(job.local_output_path) and is_large_image(job.local_input_path):
+        # Very large PNGs are graded in strips so grading stays within IMAGE_MEMORY_BUDGET_BYTES
+        success = apply_lut_to_large_image(job.local_input_path, lut_path, job.local_output_path, lut_kind)
+    elif 'image' in job.media_type: # Check if 'image' is in the MIME type
+        success = apply_lut_to_image(job.local_input_path, lut_path, job.local_output_path, job.quality, lut_kind,
+                                     encoder_args)
 
-    if not success:
-        logger.error(f"Media processing failed for {s3_input_key}")
-        # Clean up local files even if processing failed
-        if os.path.exists(local_input_path):
-            os.remove(local_input_path)
-        if os.path.exists(local_output_path):
-            os.remove(local_output_path)
-        return False
+    # The input is not needed any more, free the disk space for the next prefetch
+    if os.path.exists(job.local_input_path):
+        os.remove(job.local_input_path)
 
-    # Upload output file to S3
-    if not upload_to_s3(S3_BUCKET_NAME, s3_output_key, local_output_path):
-        # Clean up local files
-        if os.path.exists(local_input_path):
-            os.remove(local_input_path)
-        if os.path.exists(local_output_path):
-            os.remove(local_output_path)
-        return False
+    if not success:
+        logger.error(f"Media processing failed for {job.s3_input_key}")
+    return success
 
-    # Clean up local files
-    if os.path.exists(local_input_path):
-        os.remove(local_input_path)
-    if os.path.exists(local_output_path):
-        os.remove(local_output_path)
-    
-    logger.info(f"Successfully processed and uploaded {s3_input_key} to {s3_output_key}")
+def processed_item_id(job: JobContext) -> UUID:
+    """ID of the job's processed media item, derived from the output key so a retried message overwrites its item."""
+    return uuid5(NAMESPACE_URL, job.s3_output_key)
 
-    # --- 5. Save New Media Item to DynamoDB ---
+def record_processed_item(job: JobContext) -> bool:
+    """Saves the processed media item to DynamoDB (at most once per job)."""
+    if job.recorded:
+        return True
+    message_body = job.message_body
     try:
         processed_media_item = MediaItemInDB(
+            id=processed_item_id(job),
             owner_id=UUID(message_body["user_id"]),
-            original_filename=f"{os.path.splitext(message_body['original_filename'])[0]}_processed{os.path.splitext(s3_output_key)[1]}",
-            storage_path=s3_output_key,
-            media_type=media_type,
+            original_filename=f"{os.path.splitext(message_body['original_filename'])[0]}_processed{os.path.splitext(job.s3_output_key)[1]}",
+            storage_path=job.s3_output_key,
+            media_type=job.media_type,
             is_processed=True,
             original_media_id=UUID(message_body["media_id"])
         )
@@ -134,52 +381,261 @@ def process_message(message_body: dict):
         # so it can be retried.
         return False
 
+    job.recorded = True
     return True
 
-def main():
-    logger.info("Media Worker started. Polling SQS queue...")
-    while True:
+def publish_job_output(job: JobContext) -> bool:
+    """Stage 3 (network): uploads the result and records the processed media item."""
+    # Streamed (HLS) output is already in S3
+    if not job.streamed and not upload_to_s3(S3_BUCKET_NAME, job.s3_output_key, job.local_output_path):
+        return False
+
+    logger.info(f"Successfully processed and uploaded {job.s3_input_key} to {job.s3_output_key}")
+
+    if job.job_type == 'preview':
+        # Previews are cached by their key and not listed as media items
+        return True
+
+    # --- Save New Media Item to DynamoDB ---
+    if not record_processed_item(job):
+        return False
+    if job.chunked:
+        discard_chunks(S3_BUCKET_NAME, job.s3_output_key)
+    return True
+
+def process_message(message_body: dict, pipeline: Optional[JobPipeline] = None, lane_name: str = "default",
+                    reporter: Optional[JobReporter] = None) -> bool:
+    """
+    Processes a single SQS message: download, encode, then upload and record.
+    With a pipeline, the encode stage waits for one of the pipeline's CPU slots and releases it
+    before uploading, so the next (already downloaded) job can start encoding meanwhile.
+    Each stage is recorded on the job's record in the jobs table as it starts.
+    """
+    reporter = reporter or JobReporter(message_body.get('job_id'))
+    reporter.stage(JOB_STATUS_DOWNLOADING, progress=0, error=None)
+    with start_span('prepare', media_type=message_body.get('media_type', '')):
+        job = prepare_job(message_body)
+    if job is None:
+        reporter.stage(JOB_STATUS_RETRYING, error="Could not fetch the input or its LUT")
+        return False
+
+    try:
+        job.on_progress = reporter.progress
+        if pipeline is not None:
+            with pipeline.encode_slot(lane_name):
+                reporter.stage(JOB_STATUS_ENCODING)
+                with start_span('encode') as span:
+                    success = encode_job(job, span)
+        else:
+            reporter.stage(JOB_STATUS_ENCODING)
+            with start_span('encode') as span:
+                success = encode_job(job, span)
+        if not success:
+            reporter.stage(JOB_STATUS_RETRYING, error="Encoding failed")
+            return False
+
+        reporter.stage(JOB_STATUS_UPLOADING, progress=100)
+        with start_span('publish', streamed=job.streamed):
+            published = publish_job_output(job)
+        if not published:
+            reporter.stage(JOB_STATUS_RETRYING, error="Could not publish the output")
+            return False
+        # Previews are not media items, so their jobs complete without one
+        output_media_id = processed_item_id(job) if job.job_type != 'preview' else None
+        reporter.stage(JOB_STATUS_COMPLETED, output_media_id=output_media_id, error=None)
+        return True
+    finally:
+        cleanup_job_files(job)
+
+def handle_message(queue_url: str, message: dict, pipeline: Optional[JobPipeline] = None, lane_name: str = "default"):
+    """Processes one received SQS message and deletes it from its queue on success."""
+    try:
+        sent_timestamp = (message.get('Attributes') or {}).get('SentTimestamp')
+        # Continues the trace the API started when it sent the message
+        with start_span('process_message', traceparent_from_message(message), lane=lane_name,
+                        message_id=message.get('MessageId', '')) as span:
+            if sent_timestamp:
+                span.set(queue_wait_ms=int(time.time() * 1000) - int(sent_timestamp))
+            span.set(succeeded=receive_message_body(queue_url, message, pipeline, lane_name))
+    finally:
+        # A message that was not deleted becomes visible again once its last extension runs out
+        visibility_heartbeat.release(message)
+        if pipeline is not None:
+            pipeline.job_done(lane_name)
+
+def count_attempt(message: dict, message_body: dict) -> int:
+    """
+    Which attempt at its job a message is. Counted on the job record, because SQS's
+    ApproximateReceiveCount also counts every time the scheduler handed the message back unstarted;
+    messages without a job record fall back to the receive count.
+    """
+    job_id = message_body.get('job_id')
+    if job_id:
         try:
-            response = sqs_client.receive_message(
-                QueueUrl=SQS_QUEUE_URL,
-                MaxNumberOfMessages=1,
-                WaitTimeSeconds=20 # Long polling
+            return record_job_attempt(job_id)
+        except Exception as e:
+            logger.warning(f"Could not count an attempt of job {job_id}: {e}")
+    return int((message.get('Attributes') or {}).get('ApproximateReceiveCount', 1))
+
+def dead_letter_message(queue_url: str, message: dict, reason: str):
+    """
+    Takes a message that will not be processed out of its queue: the message and the reason are
+    kept under DEAD_LETTER_PREFIX in S3, its job is marked failed, then the message is deleted.
+    If the record cannot be written, the message stays queued and is dead-lettered on a later receive.
+    """
+    message_id = message.get('MessageId', 'unknown')
+    try:
+        job_id = json.loads(message['Body']).get('job_id')
+    except (json.JSONDecodeError, AttributeError):
+        job_id = None
+    record = {
+        'message_id': message_id,
+        'queue_url': queue_url,
+        'job_id': job_id,
+        'reason': reason,
+        'receive_count': int((message.get('Attributes') or {}).get('ApproximateReceiveCount', 1)),
+        'dead_lettered_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'body': message['Body'],
+    }
+    key = f"{DEAD_LETTER_PREFIX}/{time.strftime('%Y-%m-%d', time.gmtime())}/{message_id}.json"
+    try:
+        s3_client.put_object(Bucket=S3_BUCKET_NAME, Key=key, Body=json.dumps(record).encode('utf-8'),
+                             ContentType='application/json')
+    except ClientError as e:
+        logger.error(f"Could not dead-letter message {message_id}: {e}")
+        return
+    JobReporter(job_id).stage(JOB_STATUS_FAILED, error=reason)
+    visibility_heartbeat.release(message)
+    sqs_client.delete_message(QueueUrl=queue_url, ReceiptHandle=message['ReceiptHandle'])
+    logger.warning(f"Message {message_id} dead-lettered to s3://{S3_BUCKET_NAME}/{key}: {reason}")
+
+def receive_message_body(queue_url: str, message: dict, pipeline: Optional[JobPipeline], lane_name: str) -> bool:
+    """
+    Decodes and processes a message, deleting it once done. Returns True if it was processed.
+    Messages that can never be processed, or that used up MAX_JOB_ATTEMPTS, are dead-lettered.
+    """
+    receipt_handle = message['ReceiptHandle']
+    try:
+        message_body = json.loads(message['Body'])
+        logger.info(f"Received message: {message_body}")
+
+        attempt = count_attempt(message, message_body)
+        if attempt > MAX_JOB_ATTEMPTS:
+            # The earlier attempts never finished, e.g. the worker was killed mid-encode each time
+            dead_letter_message(queue_url, message, f"Gave up after {MAX_JOB_ATTEMPTS} attempts")
+            return False
+
+        reporter = JobReporter(message_body.get('job_id'))
+        with profile_job(message_body):
+            processed = process_message(message_body, pipeline, lane_name, reporter)
+        if processed:
+            visibility_heartbeat.release(message)
+            sqs_client.delete_message(
+                QueueUrl=queue_url,
+                ReceiptHandle=receipt_handle
             )
+            logger.info(f"Message {message['MessageId']} deleted from queue.")
+            return True
+        if attempt >= MAX_JOB_ATTEMPTS:
+            dead_letter_message(queue_url, message, f"Failed on all {attempt} attempts: {reporter.last_error or 'unknown error'}")
+            return False
+        logger.warning(f"Failed to process message {message['MessageId']} (attempt {attempt}). It will become visible again.")
+    except json.JSONDecodeError:
+        logger.error(f"Invalid JSON in message body: {message['Body']}.")
+        dead_letter_message(queue_url, message, "The message body is not valid JSON")
+    except PoisonMessage as e:
+        logger.error(f"Message {message.get('MessageId', 'N/A')} can never be processed: {e}")
+        dead_letter_message(queue_url, message, str(e))
+    except Exception as e:
+        logger.error(f"An unexpected error occurred while processing message {message.get('MessageId', 'N/A')}: {e}", exc_info=True)
+        # Message will become visible again once its visibility timeout runs out
+    return False
+
+def release_message(queue_url: str, message: dict, delay: int = 0):
+    """Hands a buffered message back to SQS so it becomes visible again after `delay` seconds."""
+    visibility_heartbeat.release(message)
+    try:
+        sqs_client.change_message_visibility(
+            QueueUrl=queue_url,
+            ReceiptHandle=message['ReceiptHandle'],
+            VisibilityTimeout=delay
+        )
+    except ClientError as e:
+        logger.warning(f"Could not release message {message.get('MessageId', 'N/A')}: {e}")
 
-            messages = response.get('Messages', [])
-            if not messages:
-                logger.info("No messages in queue. Waiting...")
-                continue
-
-            for message in messages:
-                receipt_handle = message['ReceiptHandle']
-                try:
-                    message_body = json.loads(message['Body'])
-                    logger.info(f"Received message: {message_body}")
-                    
-                    if process_message(message_body):
-                        sqs_client.delete_message(
-                            QueueUrl=SQS_QUEUE_URL,
-                            ReceiptHandle=receipt_handle
-                        )
-                        logger.info(f"Message {message['MessageId']} deleted from queue.")
+def main():
+    lanes = build_lanes()
+    selector = WeightedLaneSelector(lanes)
+    scheduler = FairShareScheduler()
+    pipeline = JobPipeline(lanes)
+    poll_wait = SQS_WAIT_TIME_SECONDS if len(lanes) == 1 else LANE_POLL_WAIT_SECONDS
+    running = {} # future -> BufferedJob
+
+    def can_run_lane(lane) -> bool:
+        return pipeline.can_admit(lane)
+
+    visibility_heartbeat.start()
+    logger.info(f"Media Worker started with {WORKER_CONCURRENCY} slots. Polling lanes: {[lane.name for lane in lanes]}")
+    with ThreadPoolExecutor(max_workers=pipeline.max_threads) as executor:
+        while True:
+            try:
+                # Forget jobs that have finished
+                for future in [f for f in running if f.done()]:
+                    scheduler.job_finished(running.pop(future).user_id)
+
+                # Give back messages that waited too long in the buffer, so other workers can run them
+                for job in scheduler.pop_expired(time.time()):
+                    release_message(job.lane.queue_url, job.message)
+
+                # --- 1. Top up the buffer so the scheduler can see every user's waiting jobs ---
+                lane = selector.next_lane(lanes) if scheduler.has_room() else None
+                if lane is not None:
+                    # Don't sit in a long poll while a buffered job could be started or a running one may finish
+                    if scheduler.has_runnable(can_run_lane):
+                        wait_time = 0
+                    elif running or scheduler.buffered_count():
+                        wait_time = LANE_POLL_WAIT_SECONDS
                     else:
-                        logger.warning(f"Failed to process message {message['MessageId']}. It will become visible again.")
-                except json.JSONDecodeError:
-                    logger.error(f"Invalid JSON in message body: {message['Body']}. Deleting message to prevent reprocessing.")
-                    sqs_client.delete_message(
-                        QueueUrl=SQS_QUEUE_URL,
-                        ReceiptHandle=receipt_handle
+                        wait_time = poll_wait
+                    response = sqs_client.receive_message(
+                        QueueUrl=lane.queue_url,
+                        MaxNumberOfMessages=max(1, min(10, MAX_BUFFERED_MESSAGES - scheduler.buffered_count())),
+                        WaitTimeSeconds=wait_time,
+                        AttributeNames=['SentTimestamp', 'ApproximateReceiveCount'],
+                        MessageAttributeNames=[TRACEPARENT]
                     )
-                except Exception as e:
-                    logger.error(f"An unexpected error occurred while processing message {message.get('MessageId', 'N/A')}: {e}", exc_info=True)
-                    # Message will become visible again after VisibilityTimeout
-        except ClientError as e:
-            logger.error(f"AWS Client Error: {e}")
-            time.sleep(60) # Wait before retrying to avoid hammering AWS
-        except Exception as e:
-            logger.error(f"An unexpected error occurred in main loop: {e}", exc_info=True)
-            time.sleep(60) # Wait before retrying
+
+                    messages = response.get('Messages', [])
+                    if not messages and not running and not scheduler.buffered_count() and len(lanes) == 1:
+                        logger.info("No messages in queue. Waiting...")
+
+                    for message in messages:
+                        if scheduler.add(make_buffered_job(message, lane, time.time())):
+                            # Buffered messages are kept invisible too, however long they wait for a slot
+                            visibility_heartbeat.hold(lane.queue_url, message)
+                        else:
+                            # This user already has a full sub-queue here; let another worker or a later poll take it
+                            release_message(lane.queue_url, message, delay=BUFFER_FULL_RETRY_SECONDS)
+
+                # --- 2. Start jobs in fair-share order while there are free slots ---
+                while True:
+                    job = scheduler.next_job(can_run_lane)
+                    if job is None:
+                        break
+                    pipeline.admit(job.lane)
+                    visibility_heartbeat.hold(job.lane.queue_url, job.message)
+                    future = executor.submit(handle_message, job.lane.queue_url, job.message, pipeline, job.lane.name)
+                    running[future] = job
+
+                if lane is None or (scheduler.buffered_count() and not scheduler.has_runnable(can_run_lane)):
+                    # Buffer is full or the pipeline is saturated: wait for a job to move on instead of spinning
+                    pipeline.wait_for_change(timeout=LANE_POLL_WAIT_SECONDS)
+            except ClientError as e:
+                logger.error(f"AWS Client Error: {e}")
+                time.sleep(60) # Wait before retrying to avoid hammering AWS
+            except Exception as e:
+                logger.error(f"An unexpected error occurred in main loop: {e}", exc_info=True)
+                time.sleep(60) # Wait before retrying
 
 if __name__ == "__main__":
     main()
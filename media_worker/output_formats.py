@@ -0,0 +1,104 @@
+import logging
+import subprocess
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Optional
+
+from tiled_image import probe_image, pix_fmt_has_alpha
+
+logger = logging.getLogger(__name__)
+
+# --- Image Output Formats --- #
+# extension, MIME type, and the ffmpeg encoder (and muxer, if not image2) each format needs
+IMAGE_FORMATS = {
+    "jpeg": (".jpg", "image/jpeg", "mjpeg", None),
+    "png": (".png", "image/png", "png", None),
+    "webp": (".webp", "image/webp", "libwebp", "webp"),
+    "avif": (".avif", "image/avif", "libaom-av1", "avif"),
+}
+# Quality (1-100, higher is better) used when the request doesn't give one
+DEFAULT_QUALITY = {"jpeg": 85, "webp": 80, "avif": 60}
+
+
+@dataclass
+class ImageOutput:
+    format: str
+    extension: str
+    media_type: str
+    encoder_args: List[str]
+
+
+@lru_cache(maxsize=None)
+def _ffmpeg_capabilities(kind: str) -> str:
+    """Output of `ffmpeg -encoders` or `ffmpeg -muxers`, read once per process."""
+    try:
+        result = subprocess.run(['ffmpeg', '-hide_banner', f"-{kind}"], check=True, capture_output=True, text=True)
+        return result.stdout
+    except (FileNotFoundError, subprocess.CalledProcessError) as e:
+        logger.warning(f"Could not list ffmpeg {kind}: {e}")
+        return ""
+
+
+def is_format_available(output_format: str) -> bool:
+    """Whether this worker's ffmpeg build can write the format (AVIF needs ffmpeg 5.1+ with libaom)."""
+    _, _, encoder, muxer = IMAGE_FORMATS[output_format]
+    encoders = _ffmpeg_capabilities('encoders').split()
+    muxers = _ffmpeg_capabilities('muxers').split()
+    return encoder in encoders and (muxer is None or muxer in muxers)
+
+
+def encoder_args(output_format: str, quality: int) -> List[str]:
+    """ffmpeg output options that encode one still in the given format at quality 1-100."""
+    if output_format == "jpeg":
+        # -q:v runs from 2 (best) to 31 (worst)
+        return ['-c:v', 'mjpeg', '-q:v', str(round(2 + (100 - quality) * 29 / 99)), '-pix_fmt', 'yuvj420p']
+    if output_format == "webp":
+        return ['-c:v', 'libwebp', '-quality', str(quality), '-lossless', '0', '-compression_level', '4']
+    if output_format == "avif":
+        # Alpha is not carried into AVIF; "auto" never picks it for images with transparency
+        return ['-c:v', 'libaom-av1', '-still-picture', '1', '-crf', str(round(63 * (100 - quality) / 100)),
+                '-b:v', '0', '-cpu-used', '6', '-pix_fmt', 'yuv420p']
+    return ['-c:v', 'png']
+
+
+def resolve_output_format(requested: str, accepted_formats: List[str], has_alpha: bool) -> Optional[str]:
+    """
+    Turns the requested format into the one to write, or None to keep the input's format.
+    "auto" takes the first modern format the client accepts (the API lists them smallest first)
+    that this worker can encode, else JPEG, or PNG for images with transparency.
+    """
+    if requested == "auto":
+        for output_format in accepted_formats:
+            if output_format not in IMAGE_FORMATS or (output_format == "avif" and has_alpha):
+                continue
+            if is_format_available(output_format):
+                return output_format
+        return "png" if has_alpha else "jpeg"
+    if requested not in IMAGE_FORMATS:
+        return None
+    if not is_format_available(requested):
+        logger.warning(f"ffmpeg cannot write {requested} here; keeping the original format.")
+        return None
+    return requested
+
+
+def plan_image_output(message_body: dict, input_path: str) -> Optional[ImageOutput]:
+    """Works out the output format of an image job from its message, or None to keep the input's format."""
+    requested = message_body.get('output_format')
+    if not requested or requested == "original":
+        return None
+
+    probe = probe_image(input_path)
+    has_alpha = probe is not None and pix_fmt_has_alpha(probe[2])
+    output_format = resolve_output_format(requested, message_body.get('accepted_formats') or [], has_alpha)
+    if output_format is None:
+        return None
+
+    quality = message_body.get('output_quality') or DEFAULT_QUALITY.get(output_format, 100)
+    extension, media_type, _, _ = IMAGE_FORMATS[output_format]
+    return ImageOutput(
+        format=output_format,
+        extension=extension,
+        media_type=media_type,
+        encoder_args=encoder_args(output_format, quality),
+    )
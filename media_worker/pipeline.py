@@ -0,0 +1,123 @@
+import os
+import shutil
+import logging
+import threading
+from contextlib import contextmanager
+from typing import List, Optional
+
+from scheduling import Lane, WORKER_CONCURRENCY
+
+logger = logging.getLogger(__name__)
+
+# --- Pipeline Configuration --- #
+# Jobs are split into download -> encode -> upload/commit stages. Only the encode stage holds one
+# of the WORKER_CONCURRENCY CPU slots, so downloads of upcoming jobs and uploads of finished ones
+# overlap with encoding instead of leaving the CPU idle during network transfers.
+WORK_DIRECTORY = os.environ.get('WORK_DIRECTORY', '/tmp')
+# Jobs allowed to download (or wait with their input on disk) beyond the encode slots
+PREFETCH_DEPTH = int(os.environ.get('PREFETCH_DEPTH', '1'))
+# Finished encodes allowed to be uploading at once; admission stops while this is reached
+UPLOAD_QUEUE_DEPTH = int(os.environ.get('UPLOAD_QUEUE_DEPTH', '2'))
+# Don't start another download unless this much disk / memory is still free
+MIN_FREE_DISK_BYTES = int(os.environ.get('MIN_FREE_DISK_BYTES', str(2 * 1024 ** 3)))
+MIN_FREE_MEMORY_BYTES = int(os.environ.get('MIN_FREE_MEMORY_BYTES', str(512 * 1024 ** 2)))
+
+
+def _available_memory_bytes() -> Optional[int]:
+    """Reads MemAvailable from /proc/meminfo. Returns None where that is not available."""
+    try:
+        with open('/proc/meminfo') as meminfo:
+            for line in meminfo:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def _free_disk_bytes() -> Optional[int]:
+    try:
+        return shutil.disk_usage(WORK_DIRECTORY).free
+    except OSError:
+        return None
+
+
+class JobPipeline:
+    """
+    Tracks how many jobs are in each stage and gates them:
+    - admission (download) is bounded by encode slots + PREFETCH_DEPTH, per lane and overall,
+      by UPLOAD_QUEUE_DEPTH, and by free disk and memory;
+    - encoding is bounded by WORKER_CONCURRENCY and each lane's max_slots.
+    """
+
+    def __init__(self, lanes: List[Lane]):
+        self.lanes = {lane.name: lane for lane in lanes}
+        self._encode_slots = threading.Semaphore(WORKER_CONCURRENCY)
+        self._lane_slots = {lane.name: threading.Semaphore(lane.max_slots) for lane in lanes}
+        self._changed = threading.Condition()
+        # Jobs not yet past the encode stage, per lane, and jobs uploading overall
+        self._pre_upload = {lane.name: 0 for lane in lanes}
+        self._uploading = 0
+        # A job runs start to finish on one thread; this remembers whether it got past encoding
+        self._thread_state = threading.local()
+
+    @property
+    def max_threads(self) -> int:
+        # Jobs before upload plus the uploads that may still be finishing when admission stops
+        return WORKER_CONCURRENCY + PREFETCH_DEPTH + UPLOAD_QUEUE_DEPTH + WORKER_CONCURRENCY
+
+    def can_admit(self, lane: Lane) -> bool:
+        with self._changed:
+            if sum(self._pre_upload.values()) >= WORKER_CONCURRENCY + PREFETCH_DEPTH:
+                return False
+            if self._pre_upload[lane.name] >= lane.max_slots + PREFETCH_DEPTH:
+                return False
+            if self._uploading >= UPLOAD_QUEUE_DEPTH:
+                return False
+
+        free_disk = _free_disk_bytes()
+        if free_disk is not None and free_disk < MIN_FREE_DISK_BYTES:
+            logger.warning(f"Only {free_disk} bytes free in {WORK_DIRECTORY}; holding back new downloads.")
+            return False
+        free_memory = _available_memory_bytes()
+        if free_memory is not None and free_memory < MIN_FREE_MEMORY_BYTES:
+            logger.warning(f"Only {free_memory} bytes of memory available; holding back new downloads.")
+            return False
+        return True
+
+    def admit(self, lane: Lane):
+        with self._changed:
+            self._pre_upload[lane.name] += 1
+
+    @contextmanager
+    def encode_slot(self, lane_name: str):
+        """Holds a CPU slot for the duration of the encode; the job moves on to the upload stage afterwards."""
+        lane_slots = self._lane_slots[lane_name]
+        lane_slots.acquire()
+        self._encode_slots.acquire()
+        try:
+            yield
+        finally:
+            self._encode_slots.release()
+            lane_slots.release()
+            self._thread_state.encoded = True
+            with self._changed:
+                self._pre_upload[lane_name] -= 1
+                self._uploading += 1
+                self._changed.notify_all()
+
+    def job_done(self, lane_name: str):
+        """Called once per admitted job when it has fully finished, whichever stage it stopped at."""
+        encoded = getattr(self._thread_state, 'encoded', False)
+        self._thread_state.encoded = False
+        with self._changed:
+            if encoded:
+                self._uploading -= 1
+            else:
+                self._pre_upload[lane_name] -= 1
+            self._changed.notify_all()
+
+    def wait_for_change(self, timeout: float):
+        """Blocks until a job moves between stages, or the timeout passes."""
+        with self._changed:
+            self._changed.wait(timeout)
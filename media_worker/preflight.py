@@ -0,0 +1,130 @@
+import os
+import json
+import logging
+import tempfile
+import subprocess
+from typing import Optional
+
+import boto3
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger(__name__)
+
+s3_client = boto3.client('s3', region_name=os.environ.get('AWS_REGION', 'ap-southeast-2'))
+
+# --- Pre-flight Configuration --- #
+# Before a job downloads its input, the first PREFLIGHT_PROBE_BYTES are fetched with a ranged GET
+# and probed, so inputs that are gone, empty, truncated, not media at all, or in a codec ffmpeg
+# cannot decode are rejected for the cost of one small request. Only definite verdicts reject a
+# job: when the probe itself cannot run (ffprobe missing, S3 throttling) the job goes ahead.
+PREFLIGHT_PROBE_BYTES = int(os.environ.get('PREFLIGHT_PROBE_BYTES', str(1024 * 1024)))
+PREFLIGHT_TIMEOUT_SECONDS = 15
+PRESIGNED_URL_EXPIRY_SECONDS = 300
+# ffprobe errors that mean the data itself is unreadable; any other failure (network, protocol) is no verdict
+INVALID_INPUT_ERRORS = ("Invalid data found when processing input", "moov atom not found")
+
+
+class PoisonMessage(Exception):
+    """A message that can never be processed. It is dead-lettered with this reason instead of retried."""
+
+
+class _ProbeUnavailable(Exception):
+    """ffprobe could not give a verdict (not installed, timed out, or could not read the source)."""
+
+
+def _ffprobe(source: str, data: Optional[bytes] = None) -> Optional[dict]:
+    """Streams and format of a path/URL (or of `data` piped to stdin), or None if the data is not readable media."""
+    command = [
+        'ffprobe', '-v', 'error',
+        '-print_format', 'json',
+        '-show_format', '-show_streams',
+        source
+    ]
+    try:
+        result = subprocess.run(command, input=data, check=True, capture_output=True, timeout=PREFLIGHT_TIMEOUT_SECONDS)
+        return json.loads(result.stdout.decode('utf-8'))
+    except (FileNotFoundError, subprocess.TimeoutExpired) as e:
+        raise _ProbeUnavailable(str(e))
+    except subprocess.CalledProcessError as e:
+        error = e.stderr.decode('utf-8', errors='replace')
+        if any(message in error for message in INVALID_INPUT_ERRORS):
+            return None
+        raise _ProbeUnavailable(error.strip() or f"ffprobe exited with {e.returncode}")
+    except json.JSONDecodeError:
+        return None
+
+
+def _ffprobe_file(data: bytes) -> Optional[dict]:
+    """Probes `data` from a temporary file, which ffprobe can seek in unlike a pipe."""
+    with tempfile.NamedTemporaryFile(suffix='.probe') as temp_file:
+        temp_file.write(data)
+        temp_file.flush()
+        return _ffprobe(temp_file.name)
+
+
+def _object_size(response: dict) -> Optional[int]:
+    """Full size of an object from a ranged GET's Content-Range (`bytes 0-1023/4096`)."""
+    content_range = response.get('ContentRange') or ''
+    try:
+        return int(content_range.rsplit('/', 1)[1])
+    except (IndexError, ValueError):
+        return response.get('ContentLength')
+
+
+def _check_streams(probe: dict) -> Optional[str]:
+    """Why a probed input cannot be graded, or None if it can."""
+    pictures = [
+        stream for stream in probe.get('streams') or []
+        if stream.get('codec_type') == 'video' and stream.get('width') and stream.get('height')
+    ]
+    if not pictures:
+        return "The input has no picture stream"
+    codec = pictures[0].get('codec_name')
+    if not codec or codec == 'none':
+        return f"The input's codec ({pictures[0].get('codec_tag_string') or 'unknown'}) is not supported"
+    return None
+
+
+def preflight_input(bucket: str, key: str) -> Optional[str]:
+    """
+    Probes an input from a ranged GET of its head. Returns why it can never be processed, or None
+    when it looks processable or could not be judged. A pipe cannot be seeked, so when the head does
+    not probe (MP4 files with the `moov` atom at the end) it is probed again seekably: from a temporary
+    file when the head is the whole file, otherwise through a pre-signed URL, from which ffprobe fetches
+    only the byte ranges it needs. A file that is still unreadable then is truncated or not media.
+    """
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=key, Range=f"bytes=0-{PREFLIGHT_PROBE_BYTES - 1}")
+        head = response['Body'].read()
+    except ClientError as e:
+        code = e.response.get('Error', {}).get('Code')
+        if code in ('NoSuchKey', '404'):
+            return "The input file no longer exists"
+        if code == 'InvalidRange':
+            return "The input file is empty"
+        logger.warning(f"Skipping pre-flight of {key}: {e}")
+        return None
+    if not head:
+        return "The input file is empty"
+
+    try:
+        probe = _ffprobe('pipe:0', data=head)
+        if probe is None:
+            size = _object_size(response)
+            if size is not None and size <= len(head):
+                probe = _ffprobe_file(head)
+            else:
+                url = s3_client.generate_presigned_url(
+                    'get_object', Params={'Bucket': bucket, 'Key': key}, ExpiresIn=PRESIGNED_URL_EXPIRY_SECONDS
+                )
+                probe = _ffprobe(url)
+    except (_ProbeUnavailable, ClientError, OSError) as e:
+        logger.warning(f"Skipping pre-flight of {key}: {e}")
+        return None
+
+    if probe is None:
+        return "The input is not a readable media file (truncated or in an unsupported format)"
+    reason = _check_streams(probe)
+    if reason is None:
+        logger.info(f"Pre-flight passed for {key} ({len(head)} bytes read)")
+    return reason
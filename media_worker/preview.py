@@ -0,0 +1,98 @@
+import os
+import logging
+import subprocess
+from typing import List, Optional
+
+from process_logic import build_lut_filter
+
+logger = logging.getLogger(__name__)
+
+# --- Preview Configuration --- #
+# Previews grade a few reduced-resolution frames (or a short clip) so users can judge a LUT
+# on their footage in a couple of seconds. Inputs are read with input seeking (-ss before -i),
+# so only the previewed parts of the file are fetched and decoded.
+PREVIEW_FRAME_COUNT = int(os.environ.get('PREVIEW_FRAME_COUNT', '6'))
+PREVIEW_FRAME_HEIGHT = int(os.environ.get('PREVIEW_FRAME_HEIGHT', '180'))
+PREVIEW_WINDOW_SECONDS = float(os.environ.get('PREVIEW_WINDOW_SECONDS', '3'))
+PREVIEW_HEIGHT = int(os.environ.get('PREVIEW_HEIGHT', '360'))
+PREVIEW_TIMEOUT_SECONDS = 60
+
+
+def preview_frame_times(duration: Optional[float], start: float = 0.0, count: int = PREVIEW_FRAME_COUNT) -> List[float]:
+    """Timestamps of frames spread evenly across the clip (the middle of each of `count` slices)."""
+    if not duration or duration <= 0:
+        return [start]
+    return [round(duration * (i + 0.5) / count, 3) for i in range(count)]
+
+
+def build_frames_command(input_url: str, lut_filter: str, output_path: str, times: List[float]) -> List[str]:
+    """Seeks to each timestamp separately and grades the frames side by side as one still."""
+    command = ['ffmpeg', '-y', '-v', 'error']
+    for timestamp in times:
+        command += ['-ss', f"{timestamp:.3f}", '-i', input_url]
+    # Scale first so the LUT only touches the preview's pixels
+    graph = [
+        f"[{i}:v]trim=end_frame=1,scale=-2:{PREVIEW_FRAME_HEIGHT},setsar=1[f{i}]" for i in range(len(times))
+    ]
+    frames = ''.join(f"[f{i}]" for i in range(len(times)))
+    if len(times) > 1:
+        graph.append(f"{frames}hstack=inputs={len(times)},{lut_filter}")
+    else:
+        graph.append(f"{frames}{lut_filter}")
+    command += ['-filter_complex', ';'.join(graph), '-frames:v', '1', '-q:v', '3', output_path]
+    return command
+
+
+def build_window_command(input_url: str, lut_filter: str, output_path: str, start: float) -> List[str]:
+    """Grades PREVIEW_WINDOW_SECONDS of video from `start` at PREVIEW_HEIGHT, without audio."""
+    return [
+        'ffmpeg', '-y', '-v', 'error',
+        '-ss', f"{start:.3f}",
+        '-t', str(PREVIEW_WINDOW_SECONDS),
+        '-i', input_url,
+        '-vf', f"scale=-2:{PREVIEW_HEIGHT},{lut_filter}",
+        '-c:v', 'libx264',
+        '-preset', 'veryfast',
+        '-crf', '28',
+        '-pix_fmt', 'yuv420p',
+        '-an',
+        '-movflags', '+faststart',
+        output_path
+    ]
+
+
+def render_preview(input_url: str, lut_path: str, output_path: str, lut_kind: str = "3d", mode: str = "frames",
+                   start: float = 0.0, duration: Optional[float] = None) -> bool:
+    """
+    Renders a preview of a LUT on a media file, read straight from `input_url` (e.g. a pre-signed URL).
+    Modes: "frames" (frames sampled across the video), "window" (a short clip) and "still" (an image).
+
+    Returns:
+        bool: True if successful, False otherwise.
+    """
+    lut_filter = build_lut_filter(lut_path, lut_kind)
+    if mode == "window":
+        if duration:
+            # Keep the window inside the clip
+            start = max(0.0, min(start, duration - PREVIEW_WINDOW_SECONDS))
+        command = build_window_command(input_url, lut_filter, output_path, start)
+    elif mode == "still":
+        command = build_frames_command(input_url, lut_filter, output_path, [0.0])
+    else:
+        command = build_frames_command(input_url, lut_filter, output_path, preview_frame_times(duration, start))
+
+    logger.info(f"Rendering {mode} preview with LUT: {lut_path}")
+    try:
+        subprocess.run(command, check=True, capture_output=True, text=True, timeout=PREVIEW_TIMEOUT_SECONDS)
+        logger.info(f"Preview rendered to: {output_path}")
+        return True
+    except FileNotFoundError:
+        logger.error("Error: 'ffmpeg' command not found. Please ensure FFmpeg is installed and in your system's PATH.")
+        return False
+    except subprocess.TimeoutExpired:
+        logger.error(f"Preview rendering timed out after {PREVIEW_TIMEOUT_SECONDS}s.")
+        return False
+    except subprocess.CalledProcessError as e:
+        logger.error("An error occurred while rendering a preview.")
+        logger.error(f"Error message:\n{e.stderr}")
+        return False
@@ -1,6 +1,11 @@
 import subprocess
 import os
+import shutil
 import logging
+import tempfile
+from typing import Callable, List, Optional
+
+from tracing import start_span
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -9,7 +14,73 @@ formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(messag
 handler.setFormatter(formatter)
 logger.addHandler(handler)
 
-def apply_lut_to_video(input_video_path: str, lut_path: str, output_video_path: str, crf: int = 23):
+# lut3d interpolation: "tetrahedral" is the most accurate; "trilinear" and "nearest" are cheaper per pixel
+LUT3D_INTERPOLATION = os.environ.get('LUT3D_INTERPOLATION', 'tetrahedral')
+
+def build_lut_filter(lut_path: str, lut_kind: str = "3d") -> str:
+    """
+    Returns the ffmpeg video filter that applies a LUT.
+    Separable LUTs use lut1d (three per-channel lookups), which is much cheaper per pixel
+    than lut3d's tetrahedral interpolation.
+    """
+    sanitized_lut_path = lut_path.replace('\\', '/')
+    if lut_kind == "identity":
+        return "null" # Nothing to grade, e.g. an identity LUT re-encoded to another format
+    if lut_kind == "separable":
+        return f"lut1d=file='{sanitized_lut_path}':interp=linear"
+    return f"lut3d=file='{sanitized_lut_path}':interp={LUT3D_INTERPOLATION}"
+
+def run_ffmpeg(command: List[str], duration: Optional[float] = None,
+               on_progress: Optional[Callable[[float], None]] = None):
+    """
+    Runs an ffmpeg command like subprocess.run(check=True), recorded as an "ffmpeg" span. Given the
+    input's duration and an `on_progress` callback, also reads ffmpeg's -progress output and reports
+    percent complete.
+
+    Raises:
+        FileNotFoundError: ffmpeg is not installed.
+        subprocess.CalledProcessError: ffmpeg failed; its stderr is attached.
+    """
+    with start_span('ffmpeg', output=os.path.basename(command[-1])):
+        if on_progress is None or not duration:
+            subprocess.run(command, check=True, capture_output=True, text=True, encoding='utf-8')
+            return
+        _run_ffmpeg_with_progress(command, duration, on_progress)
+
+def _run_ffmpeg_with_progress(command: List[str], duration: float, on_progress: Callable[[float], None]):
+    command = command[:1] + ['-progress', 'pipe:1', '-nostats'] + command[1:]
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr, text=True, encoding='utf-8')
+        for line in process.stdout:
+            key, _, value = line.strip().partition('=')
+            # out_time_ms is in microseconds despite its name (and is the key older ffmpeg builds have)
+            if key == 'out_time_ms' and value.isdigit():
+                on_progress(min(100.0, int(value) / 1e6 / duration * 100))
+        returncode = process.wait()
+        if returncode != 0:
+            stderr.seek(0)
+            raise subprocess.CalledProcessError(
+                returncode, command, stderr=stderr.read().decode('utf-8', errors='replace')[-4000:]
+            )
+
+def copy_media(input_path: str, output_path: str):
+    """
+    Copies the input unchanged, for LUTs that turned out to be an identity.
+
+    Returns:
+        bool: True if successful, False otherwise.
+    """
+    try:
+        shutil.copyfile(input_path, output_path)
+        logger.info(f"Identity LUT, copied {input_path} to {output_path} without re-encoding")
+        return True
+    except OSError as e:
+        logger.error(f"Error copying {input_path} to {output_path}: {e}")
+        return False
+
+def apply_lut_to_video(input_video_path: str, lut_path: str, output_video_path: str, crf: int = 23, lut_kind: str = "3d",
+                       duration: Optional[float] = None, on_progress: Optional[Callable[[float], None]] = None,
+                       preset: Optional[str] = None):
     """
     Applies a 3D LUT to a video file using FFmpeg, copying the original audio track.
 
@@ -18,19 +89,22 @@ def apply_lut_to_video(input_video_path: str, lut_path: str, output_video_path:
         lut_path (str): Path to the .cube LUT file.
         output_video_path (str): Path to save the processed video file.
         crf (int): Constant Rate Factor for H.264 encoding (0-51). Lower is better quality. Defaults to 23.
+        lut_kind (str): "3d", or "separable" when lut_path is a 1D .cube. Defaults to "3d".
+        duration (float): Duration of the input in seconds, needed to report progress.
+        on_progress (callable): Called with the percentage encoded so far.
+        preset (str): x264 speed preset (e.g. "veryfast"); ffmpeg's default ("medium") when omitted.
     
     Returns:
         bool: True if successful, False otherwise.
     """
-    sanitized_lut_path = lut_path.replace('\\', '/')
-    
     command = [
         'ffmpeg',
         '-y',  # Overwrite output file if it exists
         '-i', input_video_path,
-        '-vf', f"lut3d=file='{sanitized_lut_path}':interp=tetrahedral",
+        '-vf', build_lut_filter(lut_path, lut_kind),
         '-c:v', 'libx264',
         '-crf', str(crf),
+        *(['-preset', preset] if preset else []),
         '-pix_fmt', 'yuv420p',  # For maximum player compatibility
         '-c:a', 'copy',          # Copy audio stream without re-encoding
         output_video_path
@@ -40,13 +114,7 @@ def apply_lut_to_video(input_video_path: str, lut_path: str, output_video_path:
     logger.info(f"Executing command: {' '.join(command)}")
 
     try:
-        subprocess.run(
-            command,
-            check=True,
-            capture_output=True,
-            text=True,
-            encoding='utf-8'
-        )
+        run_ffmpeg(command, duration, on_progress)
         logger.info(f"Video processing successful! Saved to: {output_video_path}")
         return True
     except FileNotFoundError:
@@ -57,7 +125,8 @@ def apply_lut_to_video(input_video_path: str, lut_path: str, output_video_path:
         logger.error(f"Error message:\n{e.stderr}")
         return False
 
-def apply_lut_to_image(input_image_path: str, lut_path: str, output_image_path: str, quality: int = 2):
+def apply_lut_to_image(input_image_path: str, lut_path: str, output_image_path: str, quality: int = 2, lut_kind: str = "3d",
+                       encoder_args: Optional[List[str]] = None):
     """
     Applies a 3D LUT to a single image file using FFmpeg.
 
@@ -66,18 +135,18 @@ def apply_lut_to_image(input_image_path: str, lut_path: str, output_image_path:
         lut_path (str): Path to the .cube LUT file.
         output_image_path (str): Path to save the processed image file.
         quality (int): Quality for JPEG output (1-31). Lower is better quality. Defaults to 2.
+        lut_kind (str): "3d", or "separable" when lut_path is a 1D .cube. Defaults to "3d".
+        encoder_args (list): ffmpeg output options for a specific output format; replace `-q:v quality`.
 
     Returns:
         bool: True if successful, False otherwise.
     """
-    sanitized_lut_path = lut_path.replace('\\', '/')
-    
     command = [
         'ffmpeg',
         '-y',  # Overwrite output file if it exists
         '-i', input_image_path,
-        '-vf', f"lut3d=file='{sanitized_lut_path}':interp=tetrahedral",
-        '-q:v', str(quality),  # Set output quality
+        '-vf', build_lut_filter(lut_path, lut_kind),
+        *(encoder_args or ['-q:v', str(quality)]),  # Set output format and quality
         output_image_path
     ]
 
@@ -85,12 +154,7 @@ def apply_lut_to_image(input_image_path: str, lut_path: str, output_image_path:
     logger.info(f"Executing command: {' '.join(command)}")
 
     try:
-        subprocess.run(
-            command,
-            check=True,
-            capture_output=True,
-            text=True
-        )
+        run_ffmpeg(command)
         logger.info(f"Image processing successful! Saved to: {output_image_path}")
         return True
     except FileNotFoundError:
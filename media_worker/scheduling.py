@@ -0,0 +1,194 @@
+import os
+import json
+import math
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Deque, Dict, List, Optional
+
+# --- Lane Configuration --- #
+# The fast lane carries short image jobs, the slow lane carries long video encodes.
+# When no fast lane queue is configured, the worker runs a single lane as before.
+SQS_QUEUE_URL = os.environ.get('SQS_QUEUE_URL', "https://sqs.ap-southeast-2.amazonaws.com/901444280953/n11696630")
+SQS_FAST_QUEUE_URL = os.environ.get('SQS_FAST_QUEUE_URL')
+
+FAST_LANE_WEIGHT = int(os.environ.get('FAST_LANE_WEIGHT', '3'))
+SLOW_LANE_WEIGHT = int(os.environ.get('SLOW_LANE_WEIGHT', '1'))
+
+# Number of jobs this worker runs at the same time
+WORKER_CONCURRENCY = max(1, int(os.environ.get('WORKER_CONCURRENCY', '2')))
+# Slots the slow lane may never occupy, so image jobs always have somewhere to run
+FAST_LANE_RESERVED_SLOTS = int(os.environ.get('FAST_LANE_RESERVED_SLOTS', '1'))
+
+
+@dataclass
+class Lane:
+    name: str
+    queue_url: str
+    weight: int
+    max_slots: int
+    current_weight: int = 0
+
+
+def build_lanes() -> List[Lane]:
+    """Builds the list of lanes this worker polls from the environment configuration."""
+    if not SQS_FAST_QUEUE_URL:
+        return [Lane(name="default", queue_url=SQS_QUEUE_URL, weight=1, max_slots=WORKER_CONCURRENCY)]
+
+    reserved = min(max(FAST_LANE_RESERVED_SLOTS, 0), WORKER_CONCURRENCY - 1)
+    return [
+        Lane(name="fast", queue_url=SQS_FAST_QUEUE_URL, weight=FAST_LANE_WEIGHT, max_slots=WORKER_CONCURRENCY),
+        Lane(name="slow", queue_url=SQS_QUEUE_URL, weight=SLOW_LANE_WEIGHT, max_slots=WORKER_CONCURRENCY - reserved),
+    ]
+
+
+class WeightedLaneSelector:
+    """
+    Picks the next lane to poll using smooth weighted round robin.
+    With weights 3:1 the fast lane is polled three times for every slow lane poll,
+    interleaved rather than in bursts.
+    """
+
+    def __init__(self, lanes: List[Lane]):
+        self.lanes = lanes
+
+    def next_lane(self, eligible: List[Lane]) -> Optional[Lane]:
+        if not eligible:
+            return None
+        total_weight = sum(lane.weight for lane in eligible)
+        for lane in eligible:
+            lane.current_weight += lane.weight
+        chosen = max(eligible, key=lambda lane: lane.current_weight)
+        chosen.current_weight -= total_weight
+        return chosen
+
+
+# --- Fair-Share Configuration --- #
+# Cost credited to each user per round. Jobs carry their estimated cost in pixel-seconds;
+# jobs without one are charged DEFAULT_JOB_COST.
+FAIR_SHARE_QUANTUM = float(os.environ.get('FAIR_SHARE_QUANTUM', '10000000'))
+DEFAULT_JOB_COST = float(os.environ.get('DEFAULT_JOB_COST', '10000000'))
+# Most jobs one user may have running on this worker at once
+MAX_JOBS_PER_USER = max(1, int(os.environ.get('MAX_JOBS_PER_USER', str(WORKER_CONCURRENCY))))
+# Messages held in the worker waiting for a slot, overall and per user
+MAX_BUFFERED_MESSAGES = int(os.environ.get('MAX_BUFFERED_MESSAGES', '20'))
+MAX_BUFFERED_PER_USER = int(os.environ.get('MAX_BUFFERED_PER_USER', '5'))
+# Buffered messages older than this are handed back to SQS for other workers. The visibility
+# heartbeat (visibility.py) keeps messages invisible from the moment they are buffered, so this may
+# exceed the queue's visibility timeout (assumed to be the SQS default of 30 seconds).
+MESSAGE_BUFFER_TTL_SECONDS = int(os.environ.get('MESSAGE_BUFFER_TTL_SECONDS', '120'))
+
+
+@dataclass
+class BufferedJob:
+    message: dict
+    lane: Lane
+    user_id: str
+    cost: float
+    received_at: float
+
+
+class FairShareScheduler:
+    """
+    Deficit round robin over per-user sub-queues.
+    Each round every user with waiting jobs is credited FAIR_SHARE_QUANTUM; a user's next job
+    runs once their credit covers its cost. A user submitting hundreds of jobs therefore gets
+    the same share of the worker as a user submitting one, instead of the FIFO order of the queue.
+    """
+
+    def __init__(self, quantum: float = FAIR_SHARE_QUANTUM, max_jobs_per_user: int = MAX_JOBS_PER_USER):
+        self.quantum = quantum
+        self.max_jobs_per_user = max_jobs_per_user
+        self.queues: Dict[str, Deque[BufferedJob]] = {}
+        self.deficits: Dict[str, float] = {}
+        self.active_users: Deque[str] = deque()
+        self.running: Dict[str, int] = {}
+
+    def buffered_count(self, user_id: Optional[str] = None) -> int:
+        if user_id is not None:
+            return len(self.queues.get(user_id, ()))
+        return sum(len(queue) for queue in self.queues.values())
+
+    def has_room(self) -> bool:
+        return self.buffered_count() < MAX_BUFFERED_MESSAGES
+
+    def add(self, job: BufferedJob) -> bool:
+        """Buffers a job. Returns False if the user's sub-queue is full and the job should go back to SQS."""
+        if self.buffered_count(job.user_id) >= MAX_BUFFERED_PER_USER:
+            return False
+        if job.user_id not in self.queues or not self.queues[job.user_id]:
+            self.queues[job.user_id] = deque()
+            self.deficits.setdefault(job.user_id, 0.0)
+            self.active_users.append(job.user_id)
+        self.queues[job.user_id].append(job)
+        return True
+
+    def pop_expired(self, now: float) -> List[BufferedJob]:
+        """Removes and returns jobs that have been buffered for longer than MESSAGE_BUFFER_TTL_SECONDS."""
+        expired = []
+        for user_id, queue in self.queues.items():
+            while queue and now - queue[0].received_at > MESSAGE_BUFFER_TTL_SECONDS:
+                expired.append(queue.popleft())
+        self._drop_idle_users()
+        return expired
+
+    def has_runnable(self, can_run_lane: Callable[[Lane], bool]) -> bool:
+        return bool(self._runnable_users(can_run_lane))
+
+    def next_job(self, can_run_lane: Callable[[Lane], bool]) -> Optional[BufferedJob]:
+        """Picks the next job to run, or None if no buffered job can run right now."""
+        runnable = self._runnable_users(can_run_lane)
+        if not runnable:
+            return None
+
+        # Skip whole rounds at once: credit enough quanta for the cheapest runnable head to fit
+        shortfall = min(self._head_cost(user_id) - self.deficits[user_id] for user_id in runnable)
+        if shortfall > 0:
+            rounds = math.ceil(shortfall / self.quantum)
+            for user_id in runnable:
+                self.deficits[user_id] += rounds * self.quantum
+
+        for _ in range(len(self.active_users)):
+            user_id = self.active_users[0]
+            self.active_users.rotate(-1)
+            if user_id in runnable and self.deficits[user_id] >= self._head_cost(user_id):
+                job = self.queues[user_id].popleft()
+                self.deficits[user_id] -= job.cost
+                self.running[user_id] = self.running.get(user_id, 0) + 1
+                self._drop_idle_users()
+                return job
+        return None
+
+    def job_finished(self, user_id: str):
+        self.running[user_id] = max(0, self.running.get(user_id, 0) - 1)
+        if not self.running[user_id]:
+            del self.running[user_id]
+
+    def _runnable_users(self, can_run_lane: Callable[[Lane], bool]) -> List[str]:
+        # Users under their concurrency cap whose next job's lane has a free slot
+        return [
+            user_id for user_id in self.active_users
+            if self.running.get(user_id, 0) < self.max_jobs_per_user
+            and can_run_lane(self.queues[user_id][0].lane)
+        ]
+
+    def _head_cost(self, user_id: str) -> float:
+        return self.queues[user_id][0].cost
+
+    def _drop_idle_users(self):
+        # A user whose sub-queue empties leaves the rotation and forfeits leftover credit, as in classic DRR
+        for user_id in [u for u, queue in self.queues.items() if not queue]:
+            del self.queues[user_id]
+            self.deficits.pop(user_id, None)
+            self.active_users.remove(user_id)
+
+
+def make_buffered_job(message: dict, lane: Lane, now: float) -> BufferedJob:
+    """Wraps a received SQS message with the user and cost the scheduler needs."""
+    try:
+        body = json.loads(message['Body'])
+    except (json.JSONDecodeError, KeyError):
+        body = {}
+    user_id = str(body.get('user_id') or 'unknown')
+    cost = body.get('estimated_cost')
+    cost = float(cost) if cost is not None else DEFAULT_JOB_COST
+    return BufferedJob(message=message, lane=lane, user_id=user_id, cost=max(cost, 1.0), received_at=now)
@@ -0,0 +1,53 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import main
+
+SHARED_INPUT_KEY = "uploads/user1/shared-input.jpg"
+
+@pytest.fixture
+def stub_job_inputs(tmp_path, monkeypatch):
+    """Stubs the network stages of prepare_job, with downloads that overlap across jobs."""
+    monkeypatch.setattr(main, "WORK_DIRECTORY", str(tmp_path))
+    monkeypatch.setattr(main, "preflight_input", lambda bucket, key: None)
+    monkeypatch.setattr(main, "resolve_lut", lambda job, lut_filename: True)
+    both_downloading = threading.Barrier(2, timeout=5)
+
+    def download(bucket, key, local_path):
+        both_downloading.wait()
+        with open(local_path, "w") as f:
+            f.write(local_path)
+        return True
+
+    monkeypatch.setattr(main, "download_from_s3", download)
+    return tmp_path
+
+def _message(job_id: str) -> dict:
+    return {
+        "job_id": job_id,
+        "s3_input_key": SHARED_INPUT_KEY,
+        "s3_output_key": f"processed/user1/{job_id}.jpg",
+        "lut_filename": "Warm.cube",
+        "media_type": "image",
+    }
+
+def test_concurrent_jobs_on_one_input_keep_separate_files(stub_job_inputs):
+    """Test that two jobs prefetching the same input each get, and clean up, their own copy."""
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        first, second = executor.map(main.prepare_job, [_message("job-a"), _message("job-b")])
+
+    assert first.work_directory != second.work_directory
+    assert first.local_input_path != second.local_input_path
+    for job in (first, second):
+        assert os.path.dirname(job.local_input_path) == job.work_directory
+        assert open(job.local_input_path).read() == job.local_input_path
+
+    main.cleanup_job_files(first)
+    assert not os.path.exists(first.work_directory)
+    assert open(second.local_input_path).read() == second.local_input_path
+
+    main.cleanup_job_files(second)
+    assert list(stub_job_inputs.iterdir()) == []
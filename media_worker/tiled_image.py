@@ -0,0 +1,213 @@
+import os
+import json
+import zlib
+import struct
+import logging
+import threading
+import subprocess
+from typing import Optional, Tuple
+
+from process_logic import build_lut_filter
+
+logger = logging.getLogger(__name__)
+
+# --- Tiled Image Configuration --- #
+# Stills at or above this many pixels are graded in horizontal strips instead of as one frame.
+# Only PNG output is graded in strips: it is compressed here row by row, while ffmpeg's encoders for
+# the other formats need the whole frame in memory anyway, so those take the regular path.
+TILED_IMAGE_MIN_PIXELS = int(os.environ.get('TILED_IMAGE_MIN_PIXELS', str(50 * 1000 ** 2)))
+# Memory the grading stage may use for strips in flight; sets the strip height
+IMAGE_MEMORY_BUDGET_BYTES = int(os.environ.get('IMAGE_MEMORY_BUDGET_BYTES', str(256 * 1024 ** 2)))
+# Copies of a strip alive at once: our buffer, the grader's input and output frames, the pipe backlog.
+# Sized for the ffmpeg 4 CLI in the worker image, which passes frames along one at a time; the threaded
+# ffmpeg 7 CLI queues far more (20+ strips were measured), so calibrate it with benchmark_tiled_image.py
+STRIP_COPIES = int(os.environ.get('STRIP_COPIES', '4'))
+PNG_IDAT_CHUNK_BYTES = 1024 * 1024
+
+
+def probe_image(input_path: str) -> Optional[Tuple[int, int, str]]:
+    """Returns (width, height, pix_fmt) of the first video stream of an image, or None."""
+    command = [
+        'ffprobe', '-v', 'error',
+        '-select_streams', 'v:0',
+        '-show_entries', 'stream=width,height,pix_fmt',
+        '-of', 'json',
+        input_path
+    ]
+    try:
+        result = subprocess.run(command, check=True, capture_output=True, text=True)
+        stream = json.loads(result.stdout)['streams'][0]
+        return int(stream['width']), int(stream['height']), stream.get('pix_fmt') or ''
+    except (FileNotFoundError, subprocess.CalledProcessError, json.JSONDecodeError, KeyError, IndexError, ValueError) as e:
+        logger.warning(f"Could not probe {input_path}: {e}")
+        return None
+
+
+def pix_fmt_has_alpha(pix_fmt: str) -> bool:
+    # 'gray' formats contain an 'a' but no alpha; pal8 may carry transparency in its palette
+    return 'a' in pix_fmt.replace('gray', '')
+
+
+def is_large_image(input_path: str) -> bool:
+    """Whether an image is big enough to be graded in strips."""
+    probe = probe_image(input_path)
+    return probe is not None and probe[0] * probe[1] >= TILED_IMAGE_MIN_PIXELS
+
+
+def is_strip_output(output_image_path: str) -> bool:
+    """Whether an output can be written strip by strip (only PNG, see TILED_IMAGE_MIN_PIXELS)."""
+    return os.path.splitext(output_image_path)[1].lower() == '.png'
+
+
+def strip_rows_for_budget(width: int, bytes_per_pixel: int, memory_budget: int = IMAGE_MEMORY_BUDGET_BYTES) -> int:
+    """Height of the strips graded at a time so that STRIP_COPIES of them fit in the budget."""
+    return max(1, memory_budget // (width * bytes_per_pixel * STRIP_COPIES))
+
+
+class StreamingPngWriter:
+    """Writes an 8-bit RGB/RGBA PNG row by row; only the compressor's window is kept in memory."""
+
+    def __init__(self, path: str, width: int, height: int, has_alpha: bool):
+        self._file = open(path, 'wb')
+        self._compressor = zlib.compressobj(6)
+        self._pending = []
+        self._pending_bytes = 0
+        self._file.write(b'\x89PNG\r\n\x1a\n')
+        color_type = 6 if has_alpha else 2
+        self._write_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, color_type, 0, 0, 0))
+
+    def _write_chunk(self, chunk_type: bytes, data: bytes):
+        self._file.write(struct.pack('>I', len(data)))
+        self._file.write(chunk_type)
+        self._file.write(data)
+        self._file.write(struct.pack('>I', zlib.crc32(data, zlib.crc32(chunk_type))))
+
+    def _queue(self, compressed: bytes):
+        if compressed:
+            self._pending.append(compressed)
+            self._pending_bytes += len(compressed)
+        if self._pending_bytes >= PNG_IDAT_CHUNK_BYTES:
+            self._write_chunk(b'IDAT', b''.join(self._pending))
+            self._pending, self._pending_bytes = [], 0
+
+    def write_rows(self, rows: bytes, row_bytes: int):
+        for offset in range(0, len(rows), row_bytes):
+            # Filter type 0 (None) per row; zlib does the compression work in C
+            self._queue(self._compressor.compress(b'\x00' + rows[offset:offset + row_bytes]))
+
+    def close(self):
+        self._queue(self._compressor.flush())
+        if self._pending:
+            self._write_chunk(b'IDAT', b''.join(self._pending))
+        self._write_chunk(b'IEND', b'')
+        self._file.close()
+
+
+def _read_exactly(stream, size: int) -> bytes:
+    chunks = []
+    remaining = size
+    while remaining:
+        chunk = stream.read(remaining)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b''.join(chunks)
+
+
+def _feed_strips(decoder: subprocess.Popen, grader: subprocess.Popen, strip_bytes: int, errors: list):
+    """Copies decoded rows into the grader one strip at a time, padding the last strip."""
+    try:
+        while True:
+            strip = _read_exactly(decoder.stdout, strip_bytes)
+            if not strip:
+                break
+            grader.stdin.write(strip.ljust(strip_bytes, b'\x00'))
+    except (BrokenPipeError, OSError) as e:
+        errors.append(e)
+    finally:
+        try:
+            grader.stdin.close()
+        except OSError:
+            pass
+
+
+def apply_lut_to_large_image(input_image_path: str, lut_path: str, output_image_path: str,
+                             lut_kind: str = "3d", memory_budget: int = IMAGE_MEMORY_BUDGET_BYTES) -> bool:
+    """
+    Applies a LUT to a very large still in horizontal strips and writes it as a PNG, streaming the
+    pixels through three stages instead of holding the whole image in one ffmpeg process:
+    - decode:  ffmpeg decodes the input to raw 8-bit RGB(A) rows on a pipe;
+    - grade:   a second ffmpeg applies the LUT to each strip as a separate frame, so its memory
+               is bounded by `memory_budget` whatever the image size;
+    - encode:  the graded rows are compressed into the PNG here, one strip at a time.
+    Only the decoder is not bounded: ffmpeg decodes stills whole, so it holds one decoded frame.
+    Output is 8 bits per channel. Other output formats are rejected (see is_strip_output).
+
+    Returns:
+        bool: True if successful, False otherwise.
+    """
+    if not is_strip_output(output_image_path):
+        logger.error(f"Strip grading only writes PNG, not {output_image_path}")
+        return False
+    probe = probe_image(input_image_path)
+    if probe is None:
+        return False
+    width, height, pix_fmt = probe
+    # Any alpha channel is carried through the LUT untouched
+    has_alpha = pix_fmt_has_alpha(pix_fmt)
+    raw_format, bytes_per_pixel = ('rgba', 4) if has_alpha else ('rgb24', 3)
+    row_bytes = width * bytes_per_pixel
+    strip_rows = min(height, strip_rows_for_budget(width, bytes_per_pixel, memory_budget))
+    strip_bytes = strip_rows * row_bytes
+
+    logger.info(f"Grading {width}x{height} image {input_image_path} in strips of {strip_rows} rows")
+    decoder = grader = None
+    feed_errors = []
+    try:
+        decoder = subprocess.Popen(
+            ['ffmpeg', '-v', 'error', '-i', input_image_path, '-frames:v', '1',
+             '-f', 'rawvideo', '-pix_fmt', raw_format, 'pipe:1'],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+        grader = subprocess.Popen(
+            ['ffmpeg', '-v', 'error', '-f', 'rawvideo', '-pix_fmt', raw_format, '-s', f"{width}x{strip_rows}",
+             '-i', 'pipe:0', '-vf', build_lut_filter(lut_path, lut_kind),
+             '-f', 'rawvideo', '-pix_fmt', raw_format, 'pipe:1'],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+        feeder = threading.Thread(target=_feed_strips, args=(decoder, grader, strip_bytes, feed_errors), daemon=True)
+        feeder.start()
+
+        sink = StreamingPngWriter(output_image_path, width, height, has_alpha)
+        rows_left = height
+        try:
+            while rows_left > 0:
+                strip = _read_exactly(grader.stdout, strip_bytes)
+                if len(strip) != strip_bytes:
+                    break
+                # Drop the padding of the last strip
+                sink.write_rows(strip[:min(strip_rows, rows_left) * row_bytes], row_bytes)
+                rows_left -= strip_rows
+        finally:
+            sink.close()
+        if rows_left > 0:
+            # The grader stopped early; the processes still running are killed below
+            logger.error(f"Strip grading failed for {input_image_path}")
+            return False
+        feeder.join()
+
+        if decoder.wait() != 0 or grader.wait() != 0 or feed_errors:
+            logger.error(f"Strip grading failed for {input_image_path}")
+            return False
+
+        logger.info(f"Image processing successful! Saved to: {output_image_path}")
+        return True
+    except FileNotFoundError:
+        logger.error("Error: 'ffmpeg' command not found. Please ensure FFmpeg is installed and in your system's PATH.")
+        return False
+    finally:
+        for process in (decoder, grader):
+            if process is not None and process.poll() is None:
+                process.kill()
+                process.wait()
@@ -0,0 +1,73 @@
+"""
+Per-job latency breakdown from exported trace spans (TRACE_EXPORT_PATH files of the API and the worker).
+
+For every trace that reached the worker, prints the end-to-end time from the API request to the end
+of the job, the time the message spent in SQS, and the time spent in each stage (prepare, encode,
+publish, ffmpeg) and in AWS calls, grouped by span name.
+
+Usage:
+    python trace_report.py api-spans.jsonl worker-spans.jsonl [--limit 20]
+"""
+import json
+import argparse
+from collections import defaultdict
+from typing import Dict, List
+
+# Spans whose time is reported per job, in this order; AWS call spans are added after them
+STAGE_SPANS = ('prepare', 'encode', 'ffmpeg', 'publish')
+
+
+def load_spans(paths: List[str]) -> Dict[str, List[dict]]:
+    """Spans from JSON-lines files, grouped by trace ID."""
+    traces = defaultdict(list)
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    span = json.loads(line)
+                    traces[span['trace_id']].append(span)
+    return traces
+
+
+def breakdown(spans: List[dict]) -> Dict[str, float]:
+    """Milliseconds per stage of one trace: total, queue wait and the summed duration of each span name."""
+    start = min(span['start_time_unix_nano'] for span in spans)
+    end = max(span['end_time_unix_nano'] for span in spans)
+    result = {'total': (end - start) / 1e6}
+    jobs = [span for span in spans if span['name'] == 'process_message']
+    waits = [job['attributes']['queue_wait_ms'] for job in jobs if 'queue_wait_ms' in job['attributes']]
+    if waits:
+        result['sqs wait'] = float(sum(waits))
+    durations = defaultdict(float)
+    for span in spans:
+        if span['name'] in STAGE_SPANS or 'aws.operation' in span['attributes']:
+            durations[span['name']] += span['duration_ms']
+    for name in STAGE_SPANS:
+        if name in durations:
+            result[name] = durations.pop(name)
+    result.update(sorted(durations.items(), key=lambda item: -item[1]))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('paths', nargs='+', help="JSON-lines span files")
+    parser.add_argument('--limit', type=int, default=20, help="Show the slowest N jobs")
+    args = parser.parse_args()
+
+    traces = load_spans(args.paths)
+    jobs = [
+        (trace_id, breakdown(spans)) for trace_id, spans in traces.items()
+        if any(span['name'] == 'process_message' for span in spans)
+    ]
+    jobs.sort(key=lambda job: -job[1]['total'])
+    for trace_id, stages in jobs[:args.limit]:
+        print(f"trace {trace_id}")
+        for name, milliseconds in stages.items():
+            print(f"  {name:<28} {milliseconds:10.1f} ms")
+    print(f"{len(jobs)} jobs in {len(traces)} traces")
+
+
+if __name__ == '__main__':
+    main()
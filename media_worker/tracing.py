@@ -0,0 +1,272 @@
+import os
+import json
+import time
+import queue
+import atexit
+import logging
+import secrets
+import threading
+import urllib.request
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import boto3
+
+logger = logging.getLogger(__name__)
+
+# --- Tracing Configuration --- #
+# The API starts a trace per request and passes its context to the worker as the W3C `traceparent`
+# SQS message attribute; the worker continues it, so one trace covers a job end to end.
+# Spans are recorded only when an export target is set:
+#   TRACE_EXPORT_PATH   - append spans to this file as JSON lines (one span per line)
+#   TRACE_OTLP_ENDPOINT - POST them as OTLP/HTTP JSON, e.g. http://localhost:4318/v1/traces
+SERVICE_NAME = os.environ.get('TRACE_SERVICE_NAME', 'media-worker')
+TRACE_EXPORT_PATH = os.environ.get('TRACE_EXPORT_PATH')
+TRACE_OTLP_ENDPOINT = os.environ.get('TRACE_OTLP_ENDPOINT')
+TRACE_FLUSH_SECONDS = float(os.environ.get('TRACE_FLUSH_SECONDS', '2'))
+TRACING_ENABLED = bool(TRACE_EXPORT_PATH or TRACE_OTLP_ENDPOINT)
+TRACEPARENT = "traceparent"
+
+
+@dataclass
+class Span:
+    trace_id: str
+    span_id: str
+    parent_span_id: Optional[str]
+    name: str
+    start_ns: int
+    end_ns: int = 0
+    attributes: Dict[str, object] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> dict:
+        return {
+            'service': SERVICE_NAME,
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_span_id': self.parent_span_id,
+            'name': self.name,
+            'start_time_unix_nano': self.start_ns,
+            'end_time_unix_nano': self.end_ns,
+            'duration_ms': round((self.end_ns - self.start_ns) / 1e6, 3),
+            'attributes': self.attributes,
+            'error': self.error,
+        }
+
+
+class _NoopSpan:
+    """Stands in for a span while tracing is disabled."""
+
+    def set(self, **attributes):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+_current_span: ContextVar[Optional[Span]] = ContextVar('current_span', default=None)
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def to_otlp(spans: List[Span]) -> dict:
+    """Wraps spans in an OTLP/HTTP JSON ExportTraceServiceRequest."""
+    otlp_spans = []
+    for span in spans:
+        otlp_span = {
+            'traceId': span.trace_id,
+            'spanId': span.span_id,
+            'name': span.name,
+            'kind': 1, # SPAN_KIND_INTERNAL
+            'startTimeUnixNano': str(span.start_ns),
+            'endTimeUnixNano': str(span.end_ns),
+            'attributes': [{'key': key, 'value': _otlp_value(value)} for key, value in span.attributes.items()],
+            'status': {'code': 2, 'message': span.error} if span.error else {'code': 1},
+        }
+        if span.parent_span_id:
+            otlp_span['parentSpanId'] = span.parent_span_id
+        otlp_spans.append(otlp_span)
+    return {'resourceSpans': [{
+        'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': SERVICE_NAME}}]},
+        'scopeSpans': [{'scope': {'name': 'filter_app'}, 'spans': otlp_spans}],
+    }]}
+
+
+class SpanExporter:
+    """Exports finished spans in batches from a background thread, so recording a span never waits on I/O."""
+
+    def __init__(self):
+        self._queue: "queue.Queue[Span]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+                    self._thread.start()
+                    atexit.register(self.flush)
+        self._queue.put(span)
+
+    def _run(self):
+        while True:
+            time.sleep(TRACE_FLUSH_SECONDS)
+            self.flush()
+
+    def flush(self):
+        spans = []
+        while True:
+            try:
+                spans.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if not spans:
+            return
+        try:
+            if TRACE_EXPORT_PATH:
+                with open(TRACE_EXPORT_PATH, 'a') as f:
+                    f.writelines(json.dumps(span.to_dict(), default=str) + '\n' for span in spans)
+            if TRACE_OTLP_ENDPOINT:
+                request = urllib.request.Request(
+                    TRACE_OTLP_ENDPOINT, data=json.dumps(to_otlp(spans)).encode('utf-8'),
+                    headers={'Content-Type': 'application/json'}, method='POST'
+                )
+                urllib.request.urlopen(request, timeout=5).close()
+        except Exception as e:
+            # Losing spans must never affect jobs
+            logger.warning(f"Could not export {len(spans)} spans: {e}")
+
+
+_exporter = SpanExporter()
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[Tuple[str, str]]:
+    """(trace_id, parent span_id) from a W3C traceparent value, or None if it is missing or malformed."""
+    parts = (value or '').strip().split('-')
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        int(parts[1], 16)
+        int(parts[2], 16)
+    except ValueError:
+        return None
+    return parts[1], parts[2]
+
+
+def _begin_span(name: str, traceparent: Optional[str], attributes: dict):
+    parent = _current_span.get()
+    remote = parse_traceparent(traceparent) if traceparent else None
+    if remote is not None:
+        trace_id, parent_span_id = remote
+    elif parent is not None:
+        trace_id, parent_span_id = parent.trace_id, parent.span_id
+    else:
+        trace_id, parent_span_id = secrets.token_hex(16), None
+    span = Span(trace_id, secrets.token_hex(8), parent_span_id, name, time.time_ns(), attributes=dict(attributes))
+    return span, _current_span.set(span)
+
+
+def _end_span(span: Span, token, error: Optional[BaseException] = None):
+    span.end_ns = time.time_ns()
+    if error is not None:
+        span.error = f"{type(error).__name__}: {error}"
+    _current_span.reset(token)
+    _exporter.export(span)
+
+
+@contextmanager
+def start_span(name: str, traceparent: Optional[str] = None, **attributes):
+    """
+    Records a span around a block, as a child of the current span. With `traceparent`
+    (from another service) it continues that trace instead.
+    """
+    if not TRACING_ENABLED:
+        yield _NOOP_SPAN
+        return
+    span, token = _begin_span(name, traceparent, attributes)
+    try:
+        yield span
+    except BaseException as e:
+        _end_span(span, token, e)
+        raise
+    _end_span(span, token)
+
+
+def current_traceparent() -> Optional[str]:
+    span = _current_span.get()
+    if span is None:
+        return None
+    return f"00-{span.trace_id}-{span.span_id}-01"
+
+
+def sqs_message_attributes() -> dict:
+    """MessageAttributes that carry the current trace context to whoever receives the message."""
+    traceparent = current_traceparent()
+    if traceparent is None:
+        return {}
+    return {TRACEPARENT: {'DataType': 'String', 'StringValue': traceparent}}
+
+
+def traceparent_from_message(message: dict) -> Optional[str]:
+    """The traceparent of a received SQS message (received with MessageAttributeNames)."""
+    attribute = (message.get('MessageAttributes') or {}).get(TRACEPARENT) or {}
+    return attribute.get('StringValue')
+
+
+# --- AWS call spans --- #
+
+_AWS_TARGET_PARAMS = ('TableName', 'Bucket', 'Key', 'QueueUrl')
+
+
+def _before_aws_call(model, params, context, **kwargs):
+    # Only calls made inside a trace are recorded; s3transfer's worker threads have no current span
+    if _current_span.get() is None:
+        return
+    attributes = {'aws.service': model.service_model.service_name, 'aws.operation': model.name}
+    for param in _AWS_TARGET_PARAMS:
+        if isinstance(params, dict) and param in params:
+            attributes[f"aws.{param.lower()}"] = params[param]
+    context['trace_span'] = _begin_span(f"{model.service_model.service_name}.{model.name}", None, attributes)
+
+
+def _after_aws_call(context, http_response=None, parsed=None, **kwargs):
+    started = context.pop('trace_span', None)
+    if started is None:
+        return
+    span, token = started
+    metadata = (parsed or {}).get('ResponseMetadata', {})
+    span.set(**{'http.status_code': metadata.get('HTTPStatusCode', 0), 'aws.retries': metadata.get('RetryAttempts', 0)})
+    _end_span(span, token)
+
+
+def _after_aws_call_error(context, exception=None, **kwargs):
+    started = context.pop('trace_span', None)
+    if started is not None:
+        _end_span(started[0], started[1], exception)
+
+
+def instrument_boto3():
+    """
+    Records a span for every DynamoDB/S3/SQS call made inside a trace. Clients copy the session's
+    event handlers when they are created, so call this before any client is created.
+    """
+    if not TRACING_ENABLED:
+        return
+    if boto3.DEFAULT_SESSION is None:
+        boto3.setup_default_session()
+    events = boto3.DEFAULT_SESSION.events
+    events.register('before-call', _before_aws_call)
+    events.register('after-call', _after_aws_call)
+    events.register('after-call-error', _after_aws_call_error)
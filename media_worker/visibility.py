@@ -0,0 +1,71 @@
+import os
+import time
+import logging
+import threading
+from typing import Dict, Tuple
+
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger(__name__)
+
+# --- Visibility Heartbeat Configuration --- #
+# A received message stays invisible to other workers only for the queue's visibility timeout.
+# Jobs can take far longer than that (chunked encodes start at five minutes of video), so every
+# message this worker holds is kept invisible by extending its timeout to VISIBILITY_EXTENSION_SECONDS
+# as soon as it is held and then every VISIBILITY_HEARTBEAT_SECONDS until it is released or deleted.
+# A worker that dies stops extending, and its messages reappear within VISIBILITY_EXTENSION_SECONDS.
+# Messages are held right after they are received, so the queue's own visibility timeout (assumed
+# to be the SQS default of 30 seconds) only has to cover the time between receiving and holding them.
+VISIBILITY_EXTENSION_SECONDS = int(os.environ.get('VISIBILITY_EXTENSION_SECONDS', '90'))
+VISIBILITY_HEARTBEAT_SECONDS = max(1, int(os.environ.get('VISIBILITY_HEARTBEAT_SECONDS', '30')))
+
+
+class VisibilityHeartbeat:
+    """Keeps the messages this worker holds (buffered or running) invisible on their queues."""
+
+    def __init__(self, sqs_client):
+        self.sqs_client = sqs_client
+        self._lock = threading.Lock()
+        self._held: Dict[str, Tuple[str, str]] = {} # MessageId -> (queue URL, receipt handle)
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='visibility-heartbeat', daemon=True)
+        self._thread.start()
+
+    def hold(self, queue_url: str, message: dict):
+        """Starts keeping a message invisible, extending its timeout right away. Holding it again does nothing."""
+        with self._lock:
+            if message['MessageId'] in self._held:
+                return
+            self._held[message['MessageId']] = (queue_url, message['ReceiptHandle'])
+            self._extend(message['MessageId'])
+
+    def release(self, message: dict):
+        """
+        Stops extending a message's timeout. Call before deleting the message or changing its
+        visibility, so a heartbeat cannot extend it afterwards.
+        """
+        with self._lock:
+            self._held.pop(message['MessageId'], None)
+
+    def _extend(self, message_id: str):
+        # Called with the lock held, so a message is never extended after it was released
+        queue_url, receipt_handle = self._held[message_id]
+        try:
+            self.sqs_client.change_message_visibility(
+                QueueUrl=queue_url,
+                ReceiptHandle=receipt_handle,
+                VisibilityTimeout=VISIBILITY_EXTENSION_SECONDS
+            )
+        except ClientError as e:
+            # Most likely deleted, or its timeout ran out before it was held and another worker has it
+            logger.warning(f"Stopped extending the visibility of message {message_id}: {e}")
+            del self._held[message_id]
+
+    def _run(self):
+        while True:
+            time.sleep(VISIBILITY_HEARTBEAT_SECONDS)
+            with self._lock:
+                for message_id in list(self._held):
+                    self._extend(message_id)